@@ -1,16 +1,85 @@
+import gc
+import hashlib
+import hmac
+import os
+import threading
+import time
 from io import BytesIO
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
 
-from flask import Flask, render_template, request, send_file
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+import click
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    stream_with_context,
+)
+from PIL import Image
+
+from asset_cache import IconCache
+from asset_watcher import DirectoryWatcher
+from catalog import (
+    build_catalog,
+    icon_sizes,
+    load_catalog,
+    scan_signs,
+    signs_from_catalog,
+    write_catalog,
+)
+from metrics import (
+    SIZE_BUCKETS,
+    Counter,
+    Histogram,
+    Registry,
+    stage,
+    timed_stages,
+)
+from icon_variants import EncodedImage, VariantStore, variant_name
+from jobs import JobQueue
+from layout import MAX_SIGNS, CaptionPlacement, LayoutPlan, plan_layout
+from pdf_cache import PdfCache, file_version, make_key
+from profiling import Profiler, ProfileStore
+from preview import fit_icon, rasterize_pdf, render_png, render_svg
+from render_pool import PoolBusy, RenderPool, RenderTimeout
+from selection_log import SelectionLog, rank_selections, read_log
+from single_flight import SingleFlight, WaitTimeout
+from template_registry import TemplateEntry, TemplateRegistry
+from thumbnails import build_thumbnails, is_fresh, load_manifest
+from vector_icons import VectorIcon, VectorIconCache, vector_source
+
+if TYPE_CHECKING:
+    # PyPDF2 is imported by the functions that render, on first use.
+    from PyPDF2._page import PageObject
 
 app = Flask(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent
 TEMPLATE_PATH = BASE_DIR / "door_sheet_template.pdf"
+STATIC_DIR = BASE_DIR / "static"
+THUMBS_DIR = STATIC_DIR / "thumbs"
+PREVIEW_THUMBS_DIR = THUMBS_DIR / "preview"
+INDEX_THUMB_SIZE = 48
+PREVIEW_THUMB_SIZE = 160
 
 HAZARDS = {
     "electrical": {
@@ -155,32 +224,11 @@ HAZARD_INFO = {
     ),
 }
 
+HAZARD_DIR = BASE_DIR / "static" / "hazards"
 OBLIGATION_DIR = BASE_DIR / "static" / "obligation_signs"
 PROHIBITION_DIR = BASE_DIR / "static" / "prohibition_signs"
+RISK_DIR = BASE_DIR / "static" / "risks"
 
-
-def load_obligations() -> Dict[str, dict]:
-    obligations: Dict[str, dict] = {}
-    if not OBLIGATION_DIR.exists():
-        return obligations
-    for path in sorted(OBLIGATION_DIR.glob("*.png")):
-        key = path.stem.lower().replace("-", "_")
-        label = (
-            path.stem.replace("_", " ")
-            .replace("-", " ")
-            .replace("  ", " ")
-            .title()
-        )
-        obligations[key] = {
-            "label": label,
-            "caption": label,
-            "icon_path": path,
-        }
-    return obligations
-
-
-OBLIGATIONS = load_obligations()
-PROHIBITIONS = {}
 PROHIBITION_INFO = {
     "no_access_to_unauthorised_personnel": "No access to unauthorised personnel.",
     "no_food_or_drink_allowed": "No food or drink allowed.",
@@ -192,21 +240,6 @@ PROHIBITION_INFO = {
     "no_active_mobile_phones": "No active mobile phones.",
     "no_metallic_articles_or_watches": "No metallic articles or watches.",
 }
-if PROHIBITION_DIR.exists():
-    for path in sorted(PROHIBITION_DIR.glob("*.png")):
-        key = path.stem.lower().replace("-", "_")
-        label = (
-            path.stem.replace("_", " ")
-            .replace("-", " ")
-            .replace("  ", " ")
-            .title()
-        )
-        PROHIBITIONS[key] = {
-            "label": label,
-            "caption": label,
-            "icon_path": path,
-        }
-
 RISK_TEMPLATES = {
     "minimal": {
         "label": "Minimal Risk",
@@ -233,16 +266,264 @@ RISK_INFO = {
     ),
 }
 
+# Sign keys, labels and icon sizes, precomputed by `flask build-catalog` so
+# start-up neither scans the sign directories nor opens any image.
+CATALOG_PATH = Path(os.environ.get("DOOR_SHEET_CATALOG", str(BASE_DIR / "catalog.json")))
+SIGN_DIRS = {"obligations": OBLIGATION_DIR, "prohibitions": PROHIBITION_DIR}
+CATALOG = load_catalog(CATALOG_PATH, BASE_DIR)
+if CATALOG is not None:
+    OBLIGATIONS = signs_from_catalog(CATALOG, "obligations", BASE_DIR)
+    PROHIBITIONS = signs_from_catalog(CATALOG, "prohibitions", BASE_DIR)
+else:
+    OBLIGATIONS = scan_signs(OBLIGATION_DIR)
+    PROHIBITIONS = scan_signs(PROHIBITION_DIR)
+for _hazard in HAZARDS.values():
+    _hazard["vector_path"] = vector_source(_hazard["icon_path"])
 
-def generate_hazard_pdf(
+TEMPLATES = TemplateRegistry(
+    {key: value["template_path"] for key, value in RISK_TEMPLATES.items()}
+)
+# "rewrite" writes a new file with the template page as a form XObject;
+# "incremental" appends the overlay to the untouched template bytes as a PDF
+# incremental update; "optimized" is "rewrite" written for size (object and
+# cross-reference streams, shared identical objects, unused resources dropped).
+PDF_OUTPUT_MODE = os.environ.get("DOOR_SHEET_OUTPUT_MODE", "rewrite")
+
+# Decoded pictograms, shared by all requests in this process.
+ICON_CACHE_MAX_BYTES = int(os.environ.get("DOOR_SHEET_ICON_CACHE_MB", "128")) * 1024 * 1024
+ICON_DPI = int(os.environ.get("DOOR_SHEET_ICON_DPI", "300"))
+# Encoded variants per draw size, written by `flask build-icons` or on first use.
+ICON_VARIANT_DIR = os.environ.get(
+    "DOOR_SHEET_ICON_VARIANT_DIR", str(BASE_DIR / ".cache" / "icons")
+)
+ICONS = IconCache(
+    max_bytes=ICON_CACHE_MAX_BYTES,
+    dpi=ICON_DPI,
+    store=VariantStore(Path(ICON_VARIANT_DIR) if ICON_VARIANT_DIR else None),
+)
+if CATALOG is not None:
+    ICONS.seed_sizes(icon_sizes(CATALOG, BASE_DIR))
+# Pictograms with a PDF or SVG version next to their PNG are drawn from it as
+# a form XObject; the PNG stays for the web pages and as a fallback.
+VECTOR_ICONS = os.environ.get("DOOR_SHEET_VECTOR_ICONS", "1") != "0"
+VECTORS = VectorIconCache()
+_VECTOR_FAILED: Set[Path] = set()
+
+
+def index_vector_sources() -> Dict[Path, Path]:
+    """Map the PNG of every pictogram with a vector version to that version."""
+    if not VECTOR_ICONS:
+        return {}
+    return {
+        entry["icon_path"]: entry["vector_path"]
+        for entry in chain(HAZARDS.values(), OBLIGATIONS.values(), PROHIBITIONS.values())
+        if entry.get("vector_path") is not None
+    }
+
+
+VECTOR_SOURCES = index_vector_sources()
+
+
+def drawn_source(icon_path: Path) -> Path:
+    """The file a pictogram is drawn from in PDFs: its vector version if usable."""
+    vector = VECTOR_SOURCES.get(icon_path)
+    return icon_path if vector is None or vector in _VECTOR_FAILED else vector
+
+
+def vector_icon(icon_path: Path) -> Optional[VectorIcon]:
+    """The loaded vector version of a pictogram, or None to draw its PNG.
+
+    A vector file that fails to load is not tried again until it changes.
+    """
+    source = drawn_source(icon_path)
+    if source == icon_path:
+        return None
+    try:
+        return VECTORS.get(source)
+    except Exception as exc:  # pylint: disable=broad-except
+        _VECTOR_FAILED.add(source)
+        app.logger.warning("Drawing %s from its PNG instead: %s", icon_path, exc)
+        return None
+
+# Largest size (in points) each kind of pictogram is drawn at on the sheet.
+HAZARD_DRAW_SIZE = 220.0
+SIGN_DRAW_SIZE = 80.0
+_WARM_LOCK = threading.Lock()
+
+
+def warm_caches() -> None:
+    """Parse every risk template and load every pictogram's usual variant before serving."""
+    # Serialised, so a worker initializer waits for a background warm-up
+    # instead of decoding the same icons alongside it.
+    with _WARM_LOCK:
+        TEMPLATES.load_all()
+        sized = (
+            [(hazard["icon_path"], HAZARD_DRAW_SIZE) for hazard in HAZARDS.values()]
+            + [(sign["icon_path"], SIGN_DRAW_SIZE) for sign in OBLIGATIONS.values()]
+            + [(sign["icon_path"], SIGN_DRAW_SIZE) for sign in PROHIBITIONS.values()]
+        )
+        for path, points in sized:
+            if drawn_source(path) != path:
+                icon_variant(path, points, points)
+        ICONS.warm([(path, points) for path, points in sized if drawn_source(path) == path])
+
+
+# "1" warms before the import returns, "background" in a thread while the
+# process already serves, "0" leaves everything to first use. Off by default:
+# gunicorn's preload, the render pool and job workers warm explicitly.
+WARM_CACHES = os.environ.get("DOOR_SHEET_WARM_CACHES", "0")
+_WARM_THREAD: Optional[threading.Thread] = None
+if WARM_CACHES == "background":
+    _WARM_THREAD = threading.Thread(target=warm_caches, name="warm-caches", daemon=True)
+    _WARM_THREAD.start()
+elif WARM_CACHES != "0":
+    warm_caches()
+
+# Rendered sheets, shared on disk by every worker process.
+PDF_CACHE_MAX_BYTES = int(os.environ.get("DOOR_SHEET_PDF_CACHE_MB", "64")) * 1024 * 1024
+PDF_CACHE_DIR = os.environ.get("DOOR_SHEET_PDF_CACHE_DIR", str(BASE_DIR / ".cache" / "pdf"))
+# Disk budget and lifetime of unused sheets (0: no limit); see PdfCache.prune_disk.
+PDF_CACHE_DISK_MB = int(os.environ.get("DOOR_SHEET_PDF_CACHE_DISK_MB", "1024"))
+PDF_CACHE_DISK_MAX_AGE = float(os.environ.get("DOOR_SHEET_PDF_CACHE_DISK_MAX_AGE", str(30 * 86400)))
+PDF_CACHE = PdfCache(
+    PDF_CACHE_MAX_BYTES,
+    Path(PDF_CACHE_DIR) if PDF_CACHE_DIR else None,
+    max_disk_bytes=PDF_CACHE_DISK_MB * 1024 * 1024 or None,
+    max_disk_age=PDF_CACHE_DISK_MAX_AGE or None,
+)
+# Bump when a change to the renderer changes the bytes of existing sheets: the
+# sheet key doubles as a strong ETag, and cached copies must not outlive it.
+SHEET_FORMAT = 4
+# Cache-Control max-age of GET /generate responses (0: revalidate every time).
+SHEET_MAX_AGE = int(os.environ.get("DOOR_SHEET_SHEET_MAX_AGE", "0"))
+BATCH_MAX_ROOMS = int(os.environ.get("DOOR_SHEET_BATCH_MAX_ROOMS", "1000"))
+# Send /generate responses chunk by chunk from the shared template and icon
+# data (or the cached file) instead of assembling each sheet in memory.
+STREAM_RESPONSES = os.environ.get("DOOR_SHEET_STREAM_RESPONSES", "1") != "0"
+
+# Per-process metrics, exposed in Prometheus text format at /metrics.
+METRICS = Registry()
+STAGE_SECONDS = METRICS.register(
+    Histogram("door_sheet_stage_seconds", "Time spent in each rendering stage.", ["stage"])
+)
+REQUEST_SECONDS = METRICS.register(
+    Histogram("door_sheet_request_seconds", "Request duration.", ["endpoint"])
+)
+REQUESTS = METRICS.register(
+    Counter("door_sheet_requests_total", "Requests by status code.", ["endpoint", "status"])
+)
+ERRORS = METRICS.register(
+    Counter("door_sheet_errors_total", "Requests that failed with a 5xx.", ["endpoint"])
+)
+OUTPUT_BYTES = METRICS.register(
+    Histogram(
+        "door_sheet_output_bytes",
+        "Size of generated sheets by hazard count and risk level.",
+        ["hazards", "risk"],
+        SIZE_BUCKETS,
+    )
+)
+
+JOB_DIR = Path(os.environ.get("DOOR_SHEET_JOB_DIR", str(BASE_DIR / ".cache" / "jobs")))
+JOB_WORKERS = int(os.environ.get("DOOR_SHEET_JOB_WORKERS", "2"))
+JOB_MAX_ROOMS = int(os.environ.get("DOOR_SHEET_JOB_MAX_ROOMS", "20000"))
+# Seconds finished jobs and their archives are kept (0 keeps them).
+JOB_TTL = float(os.environ.get("DOOR_SHEET_JOB_TTL", str(7 * 86400)))
+
+PREVIEW_SCALE = float(os.environ.get("DOOR_SHEET_PREVIEW_SCALE", "0.75"))
+
+# Optional pool of warm worker processes for rendering (0 renders in-process).
+RENDER_WORKERS = int(os.environ.get("DOOR_SHEET_RENDER_WORKERS", "0"))
+RENDER_POOL: Optional[RenderPool] = None
+if RENDER_WORKERS > 0:
+    RENDER_POOL = RenderPool(
+        "app:render_sheet_bytes",
+        size=RENDER_WORKERS,
+        max_queue=int(os.environ.get("DOOR_SHEET_RENDER_QUEUE", str(RENDER_WORKERS * 2))),
+        timeout=float(os.environ.get("DOOR_SHEET_RENDER_TIMEOUT", "30")),
+        initializer="app:warm_caches",
+    )
+
+# Identical renders requested at the same time are done once and shared.
+RENDERS_IN_FLIGHT = SingleFlight(
+    timeout=float(os.environ.get("DOOR_SHEET_COALESCE_TIMEOUT", "30"))
+)
+COALESCED = METRICS.register(
+    Counter(
+        "door_sheet_coalesced_renders_total",
+        "Renders saved by waiting for an identical render already in progress.",
+    )
+)
+
+# Opt-in profiling: renders requested with the admin token, and automatically
+# one render (per interval and process) of a request slower than the threshold.
+PROFILE_TOKEN = os.environ.get("DOOR_SHEET_PROFILE_TOKEN", "")
+PROFILE_SLOW_MS = os.environ.get("DOOR_SHEET_PROFILE_SLOW_MS", "")
+PROFILER = Profiler(
+    ProfileStore(
+        Path(os.environ.get("DOOR_SHEET_PROFILE_DIR", str(BASE_DIR / ".cache" / "profiles"))),
+        keep=int(os.environ.get("DOOR_SHEET_PROFILE_KEEP", "50")),
+    ),
+    slow_seconds=float(PROFILE_SLOW_MS) / 1000 if PROFILE_SLOW_MS else None,
+    min_interval=float(os.environ.get("DOOR_SHEET_PROFILE_INTERVAL", "60")),
+)
+# Every selection /generate serves, for `flask prewarm` (empty disables the log).
+SELECTION_LOG_PATH = os.environ.get(
+    "DOOR_SHEET_SELECTION_LOG", str(BASE_DIR / ".cache" / "selections.log")
+)
+SELECTION_LOG = SelectionLog(Path(SELECTION_LOG_PATH)) if SELECTION_LOG_PATH else None
+
+PROFILES = METRICS.register(
+    Counter("door_sheet_profiles_total", "Renders profiled, by trigger.", ["reason"])
+)
+PROFILED_STAGE_SECONDS = METRICS.register(
+    Histogram(
+        "door_sheet_profiled_stage_seconds",
+        "Stage times of profiled renders (kept out of door_sheet_stage_seconds).",
+        ["stage"],
+    )
+)
+
+
+def init_job_worker() -> None:
+    """Job workers are render processes themselves and never use the render pool."""
+    global RENDER_POOL  # pylint: disable=global-statement
+    RENDER_POOL = None
+    warm_caches()
+
+
+# Large batches rendered in the background; workers start with the first job request.
+# Only one app process (or `flask run-jobs`) runs the workers; see JobQueue.
+JOBS = JobQueue(
+    JOB_DIR,
+    "app:render_door_sheet",
+    JOB_WORKERS,
+    initializer="app:init_job_worker",
+    max_age=JOB_TTL or None,
+)
+
+
+def icon_variant(path: Path, width: float, height: float) -> Union[EncodedImage, VectorIcon]:
+    """Return what an icon is drawn from: its vector version, or the encoded variant for a draw size."""
+    with stage("decode"):
+        vector = vector_icon(path)
+        if vector is not None:
+            return vector
+        return ICONS.variant(path, width, height)
+
+
+def plan_selection(
     hazard_keys: List[str],
     obligation_keys: List[str],
     prohibition_keys: List[str],
     risk_key: str,
-) -> Tuple[BytesIO, str]:
-    """Overlay selected hazard icons, obligation signs, and captions onto the chosen risk template."""
+) -> Tuple[LayoutPlan, TemplateEntry, str]:
+    """Work out where every icon and caption of a selection goes.
+
+    A hazard listed more than once is drawn once, where it first appears.
+    """
     unique_hazards = []
-    for key in hazard_keys:
+    for key in dict.fromkeys(hazard_keys):
         hazard = HAZARDS.get(key)
         if hazard:
             unique_hazards.append((key, hazard))
@@ -263,357 +544,309 @@ def generate_hazard_pdf(
         first_key = next(iter(HAZARDS))
         unique_hazards.append((first_key, HAZARDS[first_key]))
 
-    risk = RISK_TEMPLATES.get(risk_key)
-    if risk is None:
-        raise ValueError(f"Unsupported risk type: {risk_key}")
+    # Parsed once per process and shared by every request.
+    with stage("template"):
+        template = TEMPLATES.entry(risk_key)
+
+    with stage("plan"):
+        plan = plan_layout(
+            [hazard for _, hazard in unique_hazards],
+            [sign for _, sign in unique_obligations + unique_prohibitions],
+            template.width,
+            template.height,
+            ICONS.size,
+        )
+
+    first_hazard = unique_hazards[0][0] if unique_hazards else "hazard"
+    return plan, template, f"{first_hazard}.pdf"
+
+
+def build_overlay(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+) -> Tuple["PageObject", TemplateEntry, str]:
+    """Draw the selection on a blank page sized like the chosen risk template."""
+    from PyPDF2 import PdfReader
 
-    template_path = risk["template_path"]
-    if not template_path.exists():
-        raise FileNotFoundError(f"Template PDF not found at: {template_path}")
-
-    reader = PdfReader(str(template_path))
-    if not reader.pages:
-        raise ValueError("Template PDF has no pages")
-
-    template_page = reader.pages[0]
-    page_width = float(template_page.mediabox.width)
-    page_height = float(template_page.mediabox.height)
-
-    # Tune these values if the MAIN Hazards box changes position/size in the template.
-    main_box_x = 40
-    main_box_y = 80
-    main_box_width = page_width * 0.45
-    main_box_height = page_height * 0.45
-    center_x = main_box_x + (main_box_width / 2) - 15  # slight left shift for alignment
-    obligation_box_width = main_box_width
-    obligation_box_height = main_box_height
-    obligation_box_x = min(
-        page_width - obligation_box_width - 20, main_box_x + main_box_width + 20
+    from pdf_assembly import SheetAssembler
+
+    plan, template, download_name = plan_selection(
+        hazard_keys, obligation_keys, prohibition_keys, risk_key
     )
-    obligation_box_y = main_box_y
-
-    # Create the overlay with the icons and captions.
-    overlay_stream = BytesIO()
-    overlay_canvas = canvas.Canvas(overlay_stream, pagesize=(page_width, page_height))
-
-    count = len(unique_hazards)
-    caption_gap = 12
-    caption_height = 14
-    spacing = 0  # vertical spacing between entries
-
-    def scaled_size(
-        path: Path, max_w: float, max_h: float
-    ) -> Tuple[float, float, ImageReader]:
-        reader_img = ImageReader(str(path))
-        img_w, img_h = reader_img.getSize()
-        target_w = max_w
-        scale = target_w / float(img_w)
-        target_h = img_h * scale
-        if target_h > max_h:
-            scale = max_h / float(img_h)
-            target_w = img_w * scale
-            target_h = max_h
-        return target_w, target_h, reader_img
-
-    def draw_caption_lines(x: float, base_y: float, hazard: dict) -> float:
-        """Draw one or multiple caption lines centered at x, starting at base_y."""
-        lines = hazard.get("lines") or [hazard["caption"]]
-        line_height = 10.4  # 20% smaller
-        start_y = max(base_y, main_box_y + 10 + (len(lines) - 1) * line_height)
-        overlay_canvas.setFont("Helvetica-Bold", 10.4)
-        for idx_line, line in enumerate(lines):
-            overlay_canvas.drawCentredString(x, start_y - idx_line * line_height, line)
-        # Return the y of the last drawn line
-        return start_y - (len(lines) - 1) * line_height
-
-    if count == 4:
-        # Grid 2x2 layout.
-        cell_w = main_box_width / 2
-        cell_h = main_box_height / 2
-        max_w = min(cell_w - 40.0, 180.0)
-        max_h = cell_h - 50.0
-
-        icon_sizes = []
-        for hazard_key, hazard in unique_hazards:
-            w, h, reader_icon = scaled_size(
-                hazard["icon_path"],
-                max_w=max_w,
-                max_h=max_h,
-            )
-            icon_sizes.append((hazard, reader_icon, w, h))
+    with stage("draw"):
+        assembler = SheetAssembler()
+        overlay = assembler.add_page(template, plan, icon_variant, background=False)
+        overlay += assembler.close()
+        overlay_page = PdfReader(BytesIO(b"".join(overlay))).pages[0]
+    return overlay_page, template, download_name
 
-        col_centers = [
-            center_x - (cell_w / 2),
-            center_x + (cell_w / 2),
-        ]
-        row_tops = [
-            main_box_y + main_box_height - 50.0,
-            main_box_y + cell_h - 0.0,  # raise bottom row by 20 pts
-        ]
 
-        positions = [
-            (0, 0),  # top-left
-            (0, 1),  # top-right
-            (1, 0),  # bottom-left
-            (1, 1),  # bottom-right
-        ]
+def generate_hazard_pdf(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+    output_mode: Optional[str] = None,
+) -> Tuple[BytesIO, str]:
+    """Overlay selected hazard icons, obligation signs, and captions onto the chosen risk template."""
+    chunks, download_name = sheet_chunks(
+        hazard_keys, obligation_keys, prohibition_keys, risk_key, output_mode
+    )
+    return BytesIO(b"".join(chunks)), download_name
 
-        for (row_idx, col_idx), (hazard, reader_icon, w, h) in zip(
-            positions, icon_sizes
-        ):
-            # Scale up for 4-item layout.
-            w *= 1.3
-            h *= 1.3
-            icon_x = col_centers[col_idx] - (w / 2)
-            icon_y = row_tops[row_idx] - h + 10  # raise icons and captions by 10 pts
-            overlay_canvas.drawImage(
-                reader_icon,
-                icon_x,
-                icon_y,
-                width=w,
-                height=h,
-                preserveAspectRatio=True,
-                mask="auto",
-            )
-            # Give captions more breathing room under each icon.
-            text_y = max(icon_y - (caption_gap), main_box_y)
-            draw_caption_lines(col_centers[col_idx], text_y, hazard)
-
-    elif count == 3:
-        # Special layout: one large icon on top, two smaller side-by-side (like the reference image).
-        top_hazard = unique_hazards[0][1]
-        bottom_hazards = [h[1] for h in unique_hazards[1:3]]
-
-        top_icon_w, top_icon_h, top_reader = scaled_size(
-            top_hazard["icon_path"],
-            max_w=min(220.0, main_box_width - 40.0),
-            max_h=main_box_height * 0.45,
-        )
 
-        bottom_left_w, bottom_left_h, bottom_left_reader = scaled_size(
-            bottom_hazards[0]["icon_path"],
-            max_w=min(150.0, (main_box_width / 2) - 30.0),
-            max_h=main_box_height * 0.22,
-        )
-        bottom_right_w, bottom_right_h, bottom_right_reader = scaled_size(
-            bottom_hazards[1]["icon_path"],
-            max_w=min(150.0, (main_box_width / 2) - 30.0),
-            max_h=main_box_height * 0.22,
-        )
+def sheet_chunks(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+    output_mode: Optional[str] = None,
+) -> Tuple[List[bytes], str]:
+    """Render a sheet as the list of chunks it is written in.
 
-        # Optional gentle shrink for the pair.
-        bottom_left_w *= 0.9
-        bottom_left_h *= 0.9
-        bottom_right_w *= 0.9
-        bottom_right_h *= 0.9
-
-        # Top icon centered near upper area.
-        top_center_x = center_x
-        top_icon_y = main_box_y + main_box_height - 40 - top_icon_h + 30
-        overlay_canvas.drawImage(
-            top_reader,
-            top_center_x - (top_icon_w / 2),
-            top_icon_y,
-            width=top_icon_w,
-            height=top_icon_h,
-            preserveAspectRatio=True,
-            mask="auto",
-        )
-        draw_caption_lines(
-            center_x, max(top_icon_y - caption_gap, main_box_y + 14), top_hazard
-        )
+    The template and icon data in it are the cached objects themselves, so
+    a response that sends the chunks one by one never holds its own copy of
+    the document.
+    """
+    from pdf_assembly import SheetAssembler
+    from pdf_incremental import append_overlay
 
-        # Bottom row positions.
-        row_y = main_box_y + 60 + max(bottom_left_h, bottom_right_h) + 30
-        # Slightly widen horizontal spacing between the two bottom icons.
-        x_offset = main_box_width * 0.22 + 7
-        left_x = center_x - x_offset - (bottom_left_w / 2)
-        right_x = center_x + x_offset - (bottom_right_w / 2)
-
-        overlay_canvas.drawImage(
-            bottom_left_reader,
-            left_x,
-            row_y - bottom_left_h,
-            width=bottom_left_w,
-            height=bottom_left_h,
-            preserveAspectRatio=True,
-            mask="auto",
-        )
-        draw_caption_lines(
-            left_x + (bottom_left_w / 2),
-            max(row_y - bottom_left_h - caption_gap, main_box_y + 10),
-            bottom_hazards[0],
-        )
+    output_mode = output_mode or PDF_OUTPUT_MODE
+    with timed_stages(STAGE_SECONDS):
+        if output_mode == "incremental":
+            # Keep the template bytes as they are and append only the overlay.
+            with stage("layout"):
+                overlay_page, template, download_name = build_overlay(
+                    hazard_keys, obligation_keys, prohibition_keys, risk_key
+                )
+            with stage("write"):
+                chunks = append_overlay(template.incremental, overlay_page)
+            return chunks, download_name
+        if output_mode not in ("rewrite", "optimized"):
+            raise ValueError(f"Unsupported output mode: {output_mode}")
 
-        overlay_canvas.drawImage(
-            bottom_right_reader,
-            right_x,
-            row_y - bottom_right_h,
-            width=bottom_right_w,
-            height=bottom_right_h,
-            preserveAspectRatio=True,
-            mask="auto",
-        )
-        draw_caption_lines(
-            right_x + (bottom_right_w / 2),
-            max(row_y - bottom_right_h - caption_gap, main_box_y + 10),
-            bottom_hazards[1],
-        )
-    else:
-        # Centered vertical stack for other counts.
-        icon_entries = []
-        effective_spacing = (
-            -10 if count == 2 else spacing
-        )  # tighten gap for two hazards
-        slot_height = (main_box_height - 40 - (count - 1) * effective_spacing) / count
-        slot_height = max(60, slot_height)
-
-        for hazard_key, hazard in unique_hazards:
-            icon_path = hazard["icon_path"]
-            if not icon_path.exists():
-                raise FileNotFoundError(f"Hazard icon not found at: {icon_path}")
-
-            target_icon_width, target_icon_height, icon_reader = scaled_size(
-                icon_path,
-                max_w=min(160.0, main_box_width - 36.0),
-                max_h=max(50.0, slot_height - caption_gap - caption_height),
+        with stage("layout"):
+            plan, template, download_name = plan_selection(
+                hazard_keys, obligation_keys, prohibition_keys, risk_key
             )
+        assembler = SheetAssembler(optimize=output_mode == "optimized")
+        with stage("draw"):
+            chunks = assembler.add_page(template, plan, icon_variant)
+        with stage("write"):
+            chunks += assembler.close()
+        return chunks, download_name
 
-            if count == 2:
-                target_icon_width *= 0.9
-                target_icon_height *= 0.9
-
-            icon_entries.append(
-                {
-                    "hazard": hazard,
-                    "reader": icon_reader,
-                    "width": target_icon_width,
-                    "height": target_icon_height,
-                }
-            )
 
-        total_height = (
-            sum(
-                entry["height"] + caption_gap + caption_height for entry in icon_entries
+def render_sheet_bytes(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+) -> Tuple[bytes, str]:
+    """Render a sheet to bytes; this is what the render workers run."""
+    refresh_assets()
+    pdf_buffer, download_name = generate_hazard_pdf(
+        hazard_keys, obligation_keys, prohibition_keys, risk_key
+    )
+    return pdf_buffer.getvalue(), download_name
+
+
+def normalize_selection(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+) -> Tuple[List[str], List[str], List[str], str]:
+    """Reduce a selection to what generate_hazard_pdf actually draws.
+
+    A hazard listed more than once is kept where it first appears.
+    """
+    hazards = list(dict.fromkeys(key for key in hazard_keys if key in HAZARDS))
+    hazards = hazards or [next(iter(HAZARDS))]
+    obligations = [key for key in obligation_keys if key in OBLIGATIONS][:MAX_SIGNS]
+    prohibitions = [key for key in prohibition_keys if key in PROHIBITIONS]
+    prohibitions = prohibitions[: MAX_SIGNS - len(obligations)]
+    return hazards, obligations, prohibitions, risk_key
+
+
+def selection_icon_paths(
+    hazard_keys: List[str], obligation_keys: List[str], prohibition_keys: List[str]
+) -> List[Path]:
+    """PNG paths of the pictograms of a normalized selection.
+
+    A sign removed from the catalog since the selection was normalized is
+    skipped, as plan_selection skips it.
+    """
+    obligations, prohibitions = OBLIGATIONS, PROHIBITIONS
+    return (
+        [HAZARDS[key]["icon_path"] for key in hazard_keys]
+        + [obligations[key]["icon_path"] for key in obligation_keys if key in obligations]
+        + [prohibitions[key]["icon_path"] for key in prohibition_keys if key in prohibitions]
+    )
+
+
+def sheet_sources(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+) -> List[Path]:
+    """The files a normalized selection's sheet is drawn from, to discard it when one changes.
+
+    A pictogram drawn from its vector version is listed by its PNG's path.
+    """
+    return [RISK_TEMPLATES[risk_key]["template_path"]] + selection_icon_paths(
+        hazard_keys, obligation_keys, prohibition_keys
+    )
+
+
+def sheet_cache_key(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+) -> str:
+    """Content key of a normalized selection and the files it is drawn from.
+
+    Rendering is deterministic, so equal keys mean byte-identical sheets and
+    the key is also the sheet's ETag. Vector pictograms are loaded here, so
+    one that fails is keyed by the PNG it is then drawn from.
+    """
+    icon_paths = selection_icon_paths(hazard_keys, obligation_keys, prohibition_keys)
+    return make_key(
+        {
+            "risk": risk_key,
+            "hazards": hazard_keys,
+            "obligations": obligation_keys,
+            "prohibitions": prohibition_keys,
+            "template": file_version(RISK_TEMPLATES[risk_key]["template_path"]),
+            "output_mode": PDF_OUTPUT_MODE,
+            "format": SHEET_FORMAT,
+            "icon_dpi": ICON_DPI,
+            "icons": [
+                file_version(path if vector_icon(path) is None else drawn_source(path))
+                for path in icon_paths
+            ],
+        }
+    )
+
+
+def render_door_sheet(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+) -> Tuple[bytes, str]:
+    """Return the door sheet bytes and download name, from the cache if possible."""
+    refresh_assets()
+    hazards, obligations, prohibitions, risk_key = normalize_selection(
+        hazard_keys, obligation_keys, prohibition_keys, risk_key
+    )
+    if risk_key not in RISK_TEMPLATES:
+        raise ValueError(f"Unsupported risk type: {risk_key}")
+    download_name = f"{hazards[0]}.pdf"
+    with stage("cache"):
+        key = sheet_cache_key(hazards, obligations, prohibitions, risk_key)
+        data = PDF_CACHE.get(key)
+    if data is None:
+
+        def render() -> bytes:
+            if RENDER_POOL is not None:
+                # Stage timings of pooled renders stay in the worker process.
+                with stage("render_pool"):
+                    rendered, _ = RENDER_POOL.run(hazards, obligations, prohibitions, risk_key)
+            else:
+                rendered, _ = render_sheet_bytes(hazards, obligations, prohibitions, risk_key)
+            PDF_CACHE.put(
+                key, rendered, sheet_sources(hazards, obligations, prohibitions, risk_key)
             )
-            + (count - 1) * effective_spacing
-        )
-        group_bottom = main_box_y + (main_box_height - total_height) / 2
-        current_y = group_bottom + total_height
-        has_multiline = any(
-            len(e["hazard"].get("lines") or [e["hazard"]["caption"]]) > 1
-            for e in icon_entries
+            return rendered
+
+        data, shared = RENDERS_IN_FLIGHT.run(key, render)
+        if shared:
+            COALESCED.inc()
+    return data, download_name
+
+
+def open_door_sheet(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+) -> Tuple[Union[bytes, BinaryIO, List[bytes]], str]:
+    """Like render_door_sheet, but without a copy of the whole sheet per request.
+
+    Returns the cached bytes, the cached file opened for reading, or the
+    chunks of a new render (which is stored on disk as it is).
+    """
+    hazards, obligations, prohibitions, risk_key = normalize_selection(
+        hazard_keys, obligation_keys, prohibition_keys, risk_key
+    )
+    if risk_key not in RISK_TEMPLATES:
+        raise ValueError(f"Unsupported risk type: {risk_key}")
+    download_name = f"{hazards[0]}.pdf"
+    with stage("cache"):
+        key = sheet_cache_key(hazards, obligations, prohibitions, risk_key)
+        cached = PDF_CACHE.open(key)
+    if cached is not None:
+        return cached, download_name
+
+    def render() -> List[bytes]:
+        chunks, _ = sheet_chunks(hazards, obligations, prohibitions, risk_key)
+        PDF_CACHE.put_chunks(
+            key, chunks, sheet_sources(hazards, obligations, prohibitions, risk_key)
         )
+        return chunks
 
-        for idx, entry in enumerate(icon_entries):
-            icon_w = entry["width"]
-            icon_h = entry["height"]
-            hazard = entry["hazard"]
-            icon_reader = entry["reader"]
-
-            icon_x = center_x - (icon_w / 2)
-            icon_y = current_y - icon_h
-
-            if count == 1:
-                icon_y = min(icon_y + 30, main_box_y + main_box_height - icon_h - 4)
-            elif count == 2:
-                if idx == 0:
-                    icon_y = min(icon_y + 40, main_box_y + main_box_height - icon_h - 4)
-                else:
-                    icon_y = max(main_box_y + 4, icon_y - 30)
-                    if has_multiline:
-                        icon_y = min(
-                            icon_y + 10, main_box_y + main_box_height - icon_h - 4
-                        )
-
-            overlay_canvas.drawImage(
-                icon_reader,
-                icon_x,
-                icon_y,
-                width=icon_w,
-                height=icon_h,
-                preserveAspectRatio=True,
-                mask="auto",
-            )
+    # Its own flight key: render_door_sheet callers expect bytes, not chunks.
+    chunks, shared = RENDERS_IN_FLIGHT.run(f"{key}:chunks", render)
+    if shared:
+        COALESCED.inc()
+    return chunks, download_name
 
-            text_y = max(icon_y - caption_gap, main_box_y + 10)
-            last_line_y = draw_caption_lines(center_x, text_y, hazard)
-
-            current_y = last_line_y - effective_spacing
-
-    # Draw obligation and prohibition signs (icons only) in a 2-column grid to the right box.
-    combined_signs = unique_obligations + unique_prohibitions
-    if combined_signs:
-        combined_signs = combined_signs[:6]  # enforce max 6 total
-        cols = 2
-        margin_x = 12
-        margin_y = 12
-        cell_w = (obligation_box_width - margin_x * (cols + 1)) / cols
-        target_size = min(80.0, cell_w)  # fixed size ~80pt
-        rows = max(1, (len(combined_signs) + cols - 1) // cols)
-        start_y = obligation_box_y + obligation_box_height - margin_y - target_size
-        idx = 0
-        for row in range(rows):
-            y = start_y - row * (target_size + margin_y)
-            for col in range(cols):
-                if idx >= len(combined_signs):
-                    break
-                _, sign = combined_signs[idx]
-                icon_path = sign["icon_path"]
-                if not icon_path.exists():
-                    idx += 1
-                    continue
-                icon_reader = ImageReader(str(icon_path))
-                img_w, img_h = icon_reader.getSize()
-                scale = target_size / max(img_w, img_h)
-                draw_w = img_w * scale
-                draw_h = img_h * scale
-                x = (
-                    obligation_box_x
-                    + margin_x
-                    + col * (cell_w + margin_x)
-                    + (cell_w - draw_w) / 2
-                )
-                overlay_canvas.drawImage(
-                    icon_reader,
-                    x,
-                    y,
-                    width=draw_w,
-                    height=draw_h,
-                    preserveAspectRatio=True,
-                    mask="auto",
-                )
-                idx += 1
 
-    overlay_canvas.save()
-    overlay_stream.seek(0)
+def _icon_url(path: Path, thumbs: Dict[str, dict]) -> str:
+    """URL of the small, content-hashed thumbnail for an icon, if one was built."""
+    rel = path.relative_to(STATIC_DIR).as_posix()
+    entry = thumbs.get(rel)
+    if entry is not None and entry["source_version"] == file_version(path):
+        return f"/static/{entry['thumb']}"
+    return f"/static/{rel}"
 
-    overlay_pdf = PdfReader(overlay_stream)
-    overlay_page = overlay_pdf.pages[0]
 
-    template_page.merge_page(overlay_page)
+def _all_icon_paths() -> List[Path]:
+    return [
+        item["icon_path"]
+        for catalog in (HAZARDS, OBLIGATIONS, PROHIBITIONS)
+        for item in catalog.values()
+        if item["icon_path"].exists()
+    ]
 
-    writer = PdfWriter()
-    writer.add_page(template_page)
 
-    output_stream = BytesIO()
-    writer.write(output_stream)
-    output_stream.seek(0)
-    first_hazard = unique_hazards[0][0] if unique_hazards else "hazard"
-    download_name = f"{first_hazard}.pdf"
-    return output_stream, download_name
+def icon_thumbnails(out_dir: Path, size: int) -> Dict[str, dict]:
+    """Thumbnail manifest for every catalog icon, rebuilt when out of date."""
+    thumbs = load_manifest(out_dir)
+    if not is_fresh(thumbs, _all_icon_paths(), STATIC_DIR):
+        try:
+            thumbs = build_thumbnails(_all_icon_paths(), STATIC_DIR, out_dir, size=size)
+        except OSError:
+            # Read-only deployments fall back to the full-size icons.
+            app.logger.warning("Could not build thumbnails in %s", out_dir)
+    return thumbs
 
 
-@app.route("/")
-def index():
+def build_index_options() -> Dict[str, list]:
+    """Sorted option lists shown on the index page."""
+    thumbs = icon_thumbnails(THUMBS_DIR, INDEX_THUMB_SIZE)
     hazard_options = []
     for key, value in sorted(HAZARDS.items(), key=lambda kv: kv[1]["label"].lower()):
-        icon_name = value["icon_path"].name
         hazard_options.append(
             {
                 "key": key,
                 "label": value["label"],
-                "icon": f"/static/hazards/{icon_name}",
+                "icon": _icon_url(value["icon_path"], thumbs),
                 "info": HAZARD_INFO.get(key, value["caption"]),
             }
         )
@@ -621,12 +854,11 @@ def index():
     for key, value in sorted(
         OBLIGATIONS.items(), key=lambda kv: kv[1]["label"].lower()
     ):
-        icon_name = value["icon_path"].name
         obligation_options.append(
             {
                 "key": key,
                 "label": value["label"],
-                "icon": f"/static/obligation_signs/{icon_name}",
+                "icon": _icon_url(value["icon_path"], thumbs),
                 "info": value["caption"],
             }
         )
@@ -634,12 +866,11 @@ def index():
     for key, value in sorted(
         PROHIBITIONS.items(), key=lambda kv: kv[1]["label"].lower()
     ):
-        icon_name = value["icon_path"].name
         prohibition_options.append(
             {
                 "key": key,
                 "label": value["label"],
-                "icon": f"/static/prohibition_signs/{icon_name}",
+                "icon": _icon_url(value["icon_path"], thumbs),
                 "info": PROHIBITION_INFO.get(key, value["caption"]),
             }
         )
@@ -647,50 +878,818 @@ def index():
         {"key": key, "label": value["label"], "info": RISK_INFO.get(key, value["label"])}
         for key, value in RISK_TEMPLATES.items()
     ]
-    return render_template(
-        "index.html",
-        hazards=hazard_options,
-        obligations=obligation_options,
-        prohibitions=prohibition_options,
-        risks=risk_options,
+    return {
+        "hazards": hazard_options,
+        "obligations": obligation_options,
+        "prohibitions": prohibition_options,
+        "risks": risk_options,
+    }
+
+
+# The rendered index page and its ETag; reset by invalidate_index_page().
+_INDEX_PAGE: Dict[str, str] = {}
+
+
+def invalidate_index_page() -> None:
+    _INDEX_PAGE.clear()
+
+
+@app.route("/")
+def index():
+    if not _INDEX_PAGE:
+        html = render_template("index.html", **build_index_options())
+        _INDEX_PAGE.update(
+            html=html, etag=hashlib.sha256(html.encode("utf-8")).hexdigest()[:32]
+        )
+    response = make_response(_INDEX_PAGE["html"])
+    response.set_etag(_INDEX_PAGE["etag"])
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+@app.after_request
+def cache_static_thumbnails(response: Response) -> Response:
+    # Thumbnail names contain their content hash, so they never change.
+    if request.path.startswith("/static/thumbs/") and response.status_code == 200:
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@app.cli.command("build-thumbnails")
+def build_thumbnails_command() -> None:
+    """Write the content-hashed icon thumbnails used by the index page and previews."""
+    original = sum(path.stat().st_size for path in _all_icon_paths())
+    for out_dir, size in ((THUMBS_DIR, INDEX_THUMB_SIZE), (PREVIEW_THUMBS_DIR, PREVIEW_THUMB_SIZE)):
+        manifest = build_thumbnails(_all_icon_paths(), STATIC_DIR, out_dir, size=size)
+        total = sum(entry["bytes"] for entry in manifest.values())
+        click.echo(
+            f"{len(manifest)} thumbnails of {size} px, {total / 1024:.0f} KiB "
+            f"(icons: {original / 1024:.0f} KiB)"
+        )
+
+
+@app.cli.command("build-catalog")
+def build_catalog_command() -> None:
+    """Write the catalog manifest read at start-up (keys, labels, sizes, hashes)."""
+    catalog = build_catalog(BASE_DIR, HAZARDS, RISK_TEMPLATES, SIGN_DIRS)
+    write_catalog(CATALOG_PATH, catalog)
+    click.echo(
+        f"{CATALOG_PATH}: {len(catalog['hazards'])} hazards, "
+        f"{len(catalog['obligations'])} obligations, {len(catalog['prohibitions'])} prohibitions, "
+        f"{len(catalog['risks'])} risk templates"
+    )
+
+
+def drawn_icon_boxes() -> Dict[Path, Set[Tuple[float, float]]]:
+    """Every box (width, height in points) the layouts draw each pictogram in."""
+    risk = next(iter(RISK_TEMPLATES))
+    # Each hazard in every position of the layouts for 1 to 4 hazards.
+    hazards = list(HAZARDS)
+    selections = [
+        ([hazards[(start + offset) % len(hazards)] for offset in range(count)], [], [])
+        for start in range(len(hazards))
+        for count in range(1, 5)
+    ]
+    for count in range(1, MAX_SIGNS + 1):
+        selections += [([], [key] * count, []) for key in OBLIGATIONS]
+        selections += [([], [], [key] * count) for key in PROHIBITIONS]
+    boxes: Dict[Path, Set[Tuple[float, float]]] = {}
+    for hazard_keys, obligation_keys, prohibition_keys in selections:
+        plan, _, _ = plan_selection(hazard_keys, obligation_keys, prohibition_keys, risk)
+        for item in plan.items:
+            if not isinstance(item, CaptionPlacement):
+                boxes.setdefault(item.path, set()).add((item.width, item.height))
+    return boxes
+
+
+@app.cli.command("build-icons")
+def build_icons_command() -> None:
+    """Encode every pictogram at each size the layouts draw it and drop stale variants."""
+    sizes = drawn_icon_boxes()
+    keep = set()
+    total = 0
+    for path, boxes in sorted(sizes.items()):
+        asset = ICONS.get(path)
+        for longest_px in sorted({ICONS.longest_px(asset, width, height) for width, height in boxes}):
+            keep.add(variant_name(path, asset.digest, longest_px))
+            total += asset.encode_variant(longest_px, ICONS.store).nbytes
+    removed = ICONS.store.prune(keep)
+    click.echo(
+        f"{len(keep)} variants of {len(sizes)} icons, {total / 1024:.0f} KiB "
+        f"in {ICON_VARIANT_DIR or '(memory)'}; {removed} stale files removed"
     )
 
 
-@app.route("/generate", methods=["POST"])
-def generate():
-    order_str = request.form.get("hazards_order", "")
-    if order_str:
-        hazard_keys = [h for h in order_str.split(",") if h]
-    else:
-        hazard_keys = [h.lower() for h in request.form.getlist("hazards") if h]
+@app.cli.command("prewarm")
+@click.option("--top", default=200, show_default=True, help="Number of selections to render.")
+@click.option(
+    "--workers", default=os.cpu_count() or 1, show_default=True, help="Render processes."
+)
+@click.option(
+    "--half-life",
+    default=30.0,
+    show_default=True,
+    help="Days after which a logged request counts half as much.",
+)
+@click.option("--log", "log_path", default=SELECTION_LOG_PATH, help="Selection log to read.")
+def prewarm_command(top: int, workers: int, half_life: float, log_path: str) -> None:
+    """Render the most requested selections from the log into the disk sheet cache."""
+    if PDF_CACHE.directory is None:
+        raise click.UsageError("DOOR_SHEET_PDF_CACHE_DIR is empty: there is no cache to warm")
+    if not log_path or not Path(log_path).exists():
+        raise click.UsageError(f"No selection log at {log_path!r}")
+    ranked = rank_selections(read_log(Path(log_path)), half_life * 86400)
+    todo = []
+    skipped = cached = 0
+    for entry in ranked:
+        if len(todo) + cached >= top:
+            break
+        # The catalog may have changed since: unknown keys are dropped as on /generate.
+        selection = normalize_selection(*parse_selection(dict(parse_qsl(entry.query))))
+        if selection[3] not in RISK_TEMPLATES or canonical_query(*selection) != entry.query:
+            skipped += 1
+            continue
+        key = sheet_cache_key(*selection)
+        if PDF_CACHE.on_disk(key):
+            cached += 1
+        else:
+            todo.append((key, selection))
+    click.echo(
+        f"{len(ranked)} distinct selections in {log_path}; top {len(todo) + cached}: "
+        f"{cached} already cached, {len(todo)} to render ({skipped} no longer valid)"
+    )
+    if not todo:
+        return
+    pool = RenderPool(
+        "app:render_sheet_bytes",
+        size=max(1, workers),
+        max_queue=len(todo),
+        timeout=float(os.environ.get("DOOR_SHEET_RENDER_TIMEOUT", "30")),
+        initializer="app:init_job_worker",
+    )
+
+    def render(item: Tuple[str, tuple]) -> Optional[str]:
+        key, selection = item
+        try:
+            data, _ = pool.run(*selection)
+        except Exception as exc:  # pylint: disable=broad-except
+            return f"{canonical_query(*selection)}: {exc}"
+        PDF_CACHE.put_chunks(key, [data], sheet_sources(*selection))
+        return None
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(pool.size) as threads:
+            errors = [error for error in threads.map(render, todo) if error]
+    finally:
+        pool.close()
+    for error in errors:
+        click.echo(f"failed: {error}", err=True)
+    click.echo(
+        f"rendered {len(todo) - len(errors)} sheets with {pool.size} workers "
+        f"in {time.perf_counter() - started:.1f} s into {PDF_CACHE.directory}"
+    )
+
+
+@app.cli.command("prune-cache")
+def prune_cache_command() -> None:
+    """Delete cached sheets over DOOR_SHEET_PDF_CACHE_DISK_MB or unused for too long."""
+    if PDF_CACHE.directory is None:
+        raise click.UsageError("DOOR_SHEET_PDF_CACHE_DIR is empty: there is no cache to prune")
+    result = PDF_CACHE.prune_disk()
+    click.echo(
+        f"removed {result['removed']} sheets ({result['removed_bytes'] / 1048576:.1f} MiB), "
+        f"kept {result['kept']} ({result['kept_bytes'] / 1048576:.1f} MiB) "
+        f"in {PDF_CACHE.directory}"
+    )
+
+
+def preload_for_fork() -> None:
+    """Load everything the workers of a prefork server share, in the master.
+
+    Called by gunicorn.conf.py before any worker is forked. The template and
+    icon files are read, and every icon variant, parsed template, preview
+    background and the index page are built once here, so the workers
+    inherit them copy-on-write instead of each building its own. `gc.freeze`
+    then moves all of it out of the collector's reach: a collection in a
+    worker would otherwise write to every object it scans and un-share its
+    page.
+    """
+    warm_caches()
+    # No thread may be running when the master forks: a background warm-up
+    # is finished by now, so wait for it to exit.
+    if _WARM_THREAD is not None:
+        _WARM_THREAD.join()
+    for path, boxes in drawn_icon_boxes().items():
+        for width, height in boxes:
+            icon_variant(path, width, height)
+    for key in TEMPLATES.keys():
+        template = TEMPLATES.entry(key)
+        preview_background(template)
+        if PDF_OUTPUT_MODE == "incremental":
+            template.incremental  # pylint: disable=pointless-statement
+    with app.test_request_context("/"):
+        index()
+    gc.collect()
+    gc.freeze()
+
+
+def parse_rooms(payload, max_rooms: int) -> Tuple[List[Mapping], List[tuple]]:
+    """Validate a list of room selections; raise ValueError with a message for the client."""
+    if not isinstance(payload, list) or not payload:
+        raise ValueError("Expected a JSON list of room selections")
+    if len(payload) > max_rooms:
+        raise ValueError(f"At most {max_rooms} rooms per request")
+    rooms = []
+    selections = []
+    for index, room in enumerate(payload):
+        if not isinstance(room, dict):
+            raise ValueError(f"Room {index + 1} is not an object")
+        selection = parse_selection(room)
+        if selection[3] not in RISK_TEMPLATES:
+            raise ValueError(f"Room {index + 1}: unsupported risk type: {selection[3]}")
+        rooms.append(room)
+        selections.append(normalize_selection(*selection))
+    return rooms, selections
+
+
+def _order_list(value) -> List[str]:
+    """Accept a comma separated string (form posts) or a list (JSON)."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(item) for item in value if item]
+
+
+def parse_selection(
+    data: Mapping, listed_hazards: Optional[List[str]] = None
+) -> Tuple[List[str], List[str], List[str], str]:
+    """Read hazards, obligations, prohibitions and risk the way the form sends them."""
+    hazard_keys = _order_list(data.get("hazards_order", ""))
+    if not hazard_keys:
+        if listed_hazards is None:
+            listed_hazards = _order_list(data.get("hazards"))
+        hazard_keys = [h.lower() for h in listed_hazards if h]
     if not hazard_keys:
         # Fallback to the first configured hazard if none was chosen.
         hazard_keys = [next(iter(HAZARDS))]
-    obligations_order = request.form.get("obligations_order", "")
-    obligation_keys = (
-        [o for o in obligations_order.split(",") if o] if obligations_order else []
-    )
-    prohibitions_order = request.form.get("prohibitions_order", "")
-    prohibition_keys = (
-        [p for p in prohibitions_order.split(",") if p] if prohibitions_order else []
-    )
-    risk_key = (request.form.get("risk") or "").strip().lower()
+    obligation_keys = _order_list(data.get("obligations_order", ""))
+    prohibition_keys = _order_list(data.get("prohibitions_order", ""))
+    risk_key = str(data.get("risk") or "").strip().lower()
     if not risk_key:
         # Fallback to the first configured risk if none was chosen.
         risk_key = next(iter(RISK_TEMPLATES))
+    return hazard_keys, obligation_keys, prohibition_keys, risk_key
+
+
+def canonical_query(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+) -> str:
+    """The one query string GET /generate serves a normalized selection under."""
+    fields = [("hazards_order", ",".join(hazard_keys))]
+    if obligation_keys:
+        fields.append(("obligations_order", ",".join(obligation_keys)))
+    if prohibition_keys:
+        fields.append(("prohibitions_order", ",".join(prohibition_keys)))
+    fields.append(("risk", risk_key))
+    return urlencode(fields, safe=",")
+
+
+@app.route("/generate", methods=["GET", "POST"])
+def generate():
+    """Render a door sheet from the index page's form or the same query fields.
+
+    GET requests whose query is not in canonical form are redirected to the
+    canonical URL, so each sheet has a single URL for caches to key on.
+    """
+    started = time.perf_counter()
+    data = request.form if request.method == "POST" else request.args
+    hazard_keys, obligation_keys, prohibition_keys, risk_key = parse_selection(
+        data, data.getlist("hazards")
+    )
+    selection = normalize_selection(hazard_keys, obligation_keys, prohibition_keys, risk_key)
+    query = canonical_query(*selection)
+    with timed_stages(STAGE_SECONDS) as timer:
+        if request.method == "GET" and request.query_string != query.encode("ascii"):
+            response = redirect(f"{request.path}?{query}")
+        else:
+            response = _generate_response(*selection)
+            response.headers["Content-Location"] = f"{request.path}?{query}"
+    elapsed = time.perf_counter() - started
+    REQUEST_SECONDS.observe(elapsed, endpoint="generate")
+    REQUESTS.inc(endpoint="generate", status=response.status_code)
+    if response.status_code >= 500:
+        ERRORS.inc(endpoint="generate")
+    elif response.status_code == 200:
+        OUTPUT_BYTES.observe(
+            response.content_length or 0, hazards=len(selection[0]), risk=selection[3]
+        )
+    response.headers["Server-Timing"] = timer.server_timing(elapsed)
+    if SELECTION_LOG is not None and response.status_code in (200, 304):
+        SELECTION_LOG.record(query)
+    if response.status_code == 200:
+        if request.headers.get("X-Profile") == "1" and _profile_admin():
+            name = profile_sheet("requested", selection, elapsed)
+            if name is not None:
+                response.headers["X-Profile-Name"] = name
+        elif PROFILER.due(elapsed):
+            response.call_on_close(lambda: profile_sheet("slow", selection, elapsed, wait=False))
+    return response
+
+
+def _profile_admin() -> bool:
+    """Whether the request carries the profiling token (never, without one configured)."""
+    token = request.headers.get("X-Profile-Token", "")
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def profile_sheet(
+    reason: str,
+    selection: Tuple[List[str], List[str], List[str], str],
+    request_seconds: float,
+    wait: bool = True,
+) -> Optional[str]:
+    """Render a selection again under cProfile, bypassing the sheet cache.
+
+    Returns the stored profile's name, or None if it was skipped because
+    another profile is running (`wait` false) or the render failed.
+    """
+    hazards, obligations, prohibitions, risk_key = selection
+    info: Dict[str, object] = {
+        "selection": {
+            "hazards": hazards,
+            "obligations": obligations,
+            "prohibitions": prohibitions,
+            "risk": risk_key,
+        },
+        "output_mode": PDF_OUTPUT_MODE,
+        "request_ms": request_seconds * 1000,
+    }
+
+    def render() -> None:
+        # The outermost timer: profiled stages go to their own histogram.
+        with timed_stages(PROFILED_STAGE_SECONDS) as timer:
+            pdf_buffer, _ = generate_hazard_pdf(*selection)
+        info["output_bytes"] = pdf_buffer.getbuffer().nbytes
+        info["stages_ms"] = {name: seconds * 1000 for name, seconds in timer.durations.items()}
+
     try:
-        pdf_buffer, download_name = generate_hazard_pdf(
-            hazard_keys, obligation_keys, prohibition_keys, risk_key
+        _, name = PROFILER.run(reason, info, render, wait=wait)
+    except Exception:  # pylint: disable=broad-except
+        app.logger.exception("Profiling a %s render failed", reason)
+        return None
+    if name is not None:
+        PROFILES.inc(reason=reason)
+        app.logger.info("Profiled a %s render of %s: %s", reason, info["selection"], name)
+    return name
+
+
+def _generate_response(
+    hazard_keys: List[str],
+    obligation_keys: List[str],
+    prohibition_keys: List[str],
+    risk_key: str,
+) -> Response:
+    if risk_key not in RISK_TEMPLATES:
+        return make_response((f"Unsupported risk type: {risk_key}", 400))
+    etag = sheet_cache_key(hazard_keys, obligation_keys, prohibition_keys, risk_key)
+    # Same key, same bytes: a client that has them needs no render at all.
+    if request.method == "GET" and etag in request.if_none_match:
+        response = make_response(("", 304))
+    else:
+        try:
+            if STREAM_RESPONSES and RENDER_POOL is None:
+                body, download_name = open_door_sheet(
+                    hazard_keys, obligation_keys, prohibition_keys, risk_key
+                )
+            else:
+                body, download_name = render_door_sheet(
+                    hazard_keys, obligation_keys, prohibition_keys, risk_key
+                )
+        except PoolBusy:
+            return make_response(
+                (
+                    "The server is busy generating other sheets, please retry shortly.",
+                    503,
+                    {"Retry-After": "2"},
+                )
+            )
+        except (RenderTimeout, WaitTimeout) as exc:
+            app.logger.warning("PDF generation timed out: %s", exc)
+            return make_response((f"Error generating PDF: {exc}", 504))
+        except Exception as exc:  # pylint: disable=broad-except
+            app.logger.exception("Failed to generate PDF")
+            return make_response((f"Error generating PDF: {exc}", 500))
+        response = _pdf_response(body, download_name)
+    response.set_etag(etag)
+    if request.method == "GET":
+        response.headers["Cache-Control"] = (
+            f"public, max-age={SHEET_MAX_AGE}" if SHEET_MAX_AGE > 0 else "public, no-cache"
         )
-    except Exception as exc:  # pylint: disable=broad-except
-        app.logger.exception("Failed to generate PDF")
-        return f"Error generating PDF: {exc}", 500
+    return response
 
-    return send_file(
-        pdf_buffer,
+
+def _pdf_response(body: Union[bytes, BinaryIO, List[bytes]], download_name: str) -> Response:
+    """A PDF download with a Content-Length, streamed unless `body` is bytes."""
+    if isinstance(body, list):
+        # The WSGI server sends the chunks one by one; none is copied.
+        response = Response(body, mimetype="application/pdf")
+        response.headers.set("Content-Disposition", "attachment", filename=download_name)
+        response.content_length = sum(len(chunk) for chunk in body)
+        return response
+    length = len(body) if isinstance(body, bytes) else os.fstat(body.fileno()).st_size
+    response = send_file(
+        BytesIO(body) if isinstance(body, bytes) else body,
         mimetype="application/pdf",
         as_attachment=True,
         download_name=download_name,
+        conditional=False,
+    )
+    response.content_length = length
+    return response
+
+
+# Template pages rasterized at PREVIEW_SCALE, keyed by risk and template version.
+_PREVIEW_BACKGROUNDS: Dict[Tuple[str, str], Tuple[Optional[Image.Image], bytes]] = {}
+_PREVIEW_ICONS: Dict[str, Dict[str, dict]] = {}
+# Icons fitted to the pixel boxes previews draw them in.
+_PREVIEW_IMAGES: Dict[Tuple[str, str, Tuple[int, int]], Image.Image] = {}
+
+
+def preview_background(template: TemplateEntry) -> Tuple[Optional[Image.Image], bytes]:
+    """Return the rasterized template page and its PNG encoding (empty if unavailable)."""
+    key = (template.key, template.version)
+    cached = _PREVIEW_BACKGROUNDS.get(key)
+    if cached is None:
+        image = rasterize_pdf(template.data, PREVIEW_SCALE)
+        png = BytesIO()
+        if image is not None:
+            image.save(png, format="PNG", optimize=True)
+        for stale in [k for k in _PREVIEW_BACKGROUNDS if k[0] == template.key]:
+            del _PREVIEW_BACKGROUNDS[stale]
+        cached = _PREVIEW_BACKGROUNDS[key] = (image, png.getvalue())
+    return cached
+
+
+def _preview_icon_image(path: Path, box: Tuple[int, int]) -> Image.Image:
+    key = (str(path), file_version(path), box)
+    image = _PREVIEW_IMAGES.get(key)
+    if image is None:
+        if len(_PREVIEW_IMAGES) > 1024:
+            _PREVIEW_IMAGES.clear()
+        image = _PREVIEW_IMAGES[key] = fit_icon(ICONS.get(path).image, box)
+    return image
+
+
+def _preview_icon_href(path: Path) -> str:
+    if "manifest" not in _PREVIEW_ICONS:
+        _PREVIEW_ICONS["manifest"] = icon_thumbnails(PREVIEW_THUMBS_DIR, PREVIEW_THUMB_SIZE)
+    return _icon_url(path, _PREVIEW_ICONS["manifest"])
+
+
+def reload_assets(changed: List[Path]) -> None:
+    """Bring the catalogs and caches up to date with files changed under static/.
+
+    Changed sign directories are rescanned into new catalogs, which replace
+    the old ones in a single assignment each: a request sees either. Only
+    the templates, icons, previews and sheets drawn from a changed file are
+    dropped; everything else stays warm.
+    """
+    global OBLIGATIONS, PROHIBITIONS, VECTOR_SOURCES  # pylint: disable=global-statement
+    directories = {path.parent for path in changed}
+    if OBLIGATION_DIR in directories:
+        OBLIGATIONS = scan_signs(OBLIGATION_DIR)
+    if PROHIBITION_DIR in directories:
+        PROHIBITIONS = scan_signs(PROHIBITION_DIR)
+    if HAZARD_DIR in directories:
+        for hazard in HAZARDS.values():
+            hazard["vector_path"] = vector_source(hazard["icon_path"])
+    VECTOR_SOURCES = index_vector_sources()
+
+    templates = {entry["template_path"]: key for key, entry in RISK_TEMPLATES.items()}
+    for path in changed:
+        ICONS.invalidate(path)
+        VECTORS.invalidate(path)
+        _VECTOR_FAILED.discard(path)
+        risk_key = templates.get(path)
+        if risk_key is not None:
+            TEMPLATES.invalidate(risk_key)
+            for stale in [k for k in list(_PREVIEW_BACKGROUNDS) if k[0] == risk_key]:
+                _PREVIEW_BACKGROUNDS.pop(stale, None)
+        for stale in [k for k in list(_PREVIEW_IMAGES) if k[0] == str(path)]:
+            _PREVIEW_IMAGES.pop(stale, None)
+    # Sheets list the PNG of a pictogram drawn from its vector version.
+    discarded = PDF_CACHE.discard_dependents(
+        set(changed) | {path.with_suffix(".png") for path in changed}
+    )
+    _PREVIEW_ICONS.clear()
+    invalidate_index_page()
+    ASSET_RELOADS.inc()
+    app.logger.info(
+        "Reloaded %d changed files under static/, discarded %d cached sheets",
+        len(changed),
+        discarded,
+    )
+
+
+# Files under static/ are polled for changes every DOOR_SHEET_RELOAD_INTERVAL
+# seconds (0 disables it), so signs and templates can be replaced live.
+ASSET_WATCHER = DirectoryWatcher(
+    [HAZARD_DIR, OBLIGATION_DIR, PROHIBITION_DIR, RISK_DIR],
+    reload_assets,
+    interval=float(os.environ.get("DOOR_SHEET_RELOAD_INTERVAL", "2")),
+)
+ASSET_RELOADS = METRICS.register(
+    Counter("door_sheet_asset_reloads_total", "Reloads of changed files under static/.")
+)
+
+
+@app.before_request
+def refresh_assets() -> None:
+    """Pick up files changed under static/, if a poll is due."""
+    try:
+        ASSET_WATCHER.poll()
+    except Exception:  # pylint: disable=broad-except
+        app.logger.exception("Reloading changed files under static/ failed")
+
+
+@app.route("/preview", methods=["GET", "POST"])
+def preview():
+    """Draw the layout of a selection as SVG or PNG without building a PDF."""
+    started = time.perf_counter()
+    data = request.values
+    hazard_keys, obligation_keys, prohibition_keys, risk_key = parse_selection(
+        data, data.getlist("hazards")
+    )
+    hazards, obligations, prohibitions, risk_key = normalize_selection(
+        hazard_keys, obligation_keys, prohibition_keys, risk_key
+    )
+    if risk_key not in RISK_TEMPLATES:
+        return make_response((f"Unsupported risk type: {risk_key}", 400))
+    output_format = str(data.get("format") or "svg").lower()
+    if output_format not in ("svg", "png"):
+        return make_response((f"Unsupported preview format: {output_format}", 400))
+    plan, template, _ = plan_selection(hazards, obligations, prohibitions, risk_key)
+    background, background_png = preview_background(template)
+    if output_format == "png":
+        body = render_png(plan, PREVIEW_SCALE, _preview_icon_image, background)
+        response = make_response(body)
+        response.mimetype = "image/png"
+    else:
+        background_href = None
+        if background_png:
+            background_href = f"/preview/background/{risk_key}.png?v={template.version}"
+        response = make_response(
+            render_svg(plan, PREVIEW_SCALE, _preview_icon_href, background_href)
+        )
+        response.mimetype = "image/svg+xml"
+    elapsed = time.perf_counter() - started
+    REQUEST_SECONDS.observe(elapsed, endpoint="preview")
+    REQUESTS.inc(endpoint="preview", status=response.status_code)
+    response.headers["Server-Timing"] = f"total;dur={elapsed * 1000:.2f}"
+    return response
+
+
+@app.route("/preview/background/<risk_key>.png")
+def preview_background_png(risk_key: str):
+    if risk_key not in RISK_TEMPLATES:
+        return make_response((f"Unsupported risk type: {risk_key}", 404))
+    _, png = preview_background(TEMPLATES.entry(risk_key))
+    if not png:
+        return make_response(("Template previews are not available", 404))
+    response = make_response(png)
+    response.mimetype = "image/png"
+    # The URL carries the template version, so a changed template gets a new URL.
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+def _batch_entry_name(index: int, room: Mapping, download_name: str) -> str:
+    label = str(room.get("room") or Path(download_name).stem)
+    label = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in label)
+    return f"{index + 1:04d}_{label}.pdf"
+
+
+def stream_batch_pdf(selections: List[tuple]) -> Iterator[bytes]:
+    """Yield one multi-page PDF, writing each room's page as soon as it is planned.
+
+    Templates and icons are embedded once and shared by every page using them.
+    """
+    from pdf_assembly import SheetAssembler
+
+    assembler = SheetAssembler(optimize=PDF_OUTPUT_MODE == "optimized")
+    for selection in selections:
+        plan, template, _ = plan_selection(*selection)
+        yield b"".join(assembler.add_page(template, plan, icon_variant))
+    yield b"".join(assembler.close())
+
+
+def stream_batch_zip(rooms: List[Mapping], selections: List[tuple]) -> Iterator[bytes]:
+    """Yield a ZIP archive with one PDF per room, one entry at a time."""
+    import zipfile
+
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, (room, selection) in enumerate(zip(rooms, selections)):
+            pdf_bytes, download_name = render_door_sheet(*selection)
+            archive.writestr(_batch_entry_name(index, room, download_name), pdf_bytes)
+            yield sink.drain()
+    yield sink.drain()
+
+
+class _ChunkSink:
+    """Write-only, unseekable file object that zipfile can stream into."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+@app.route("/generate/batch", methods=["POST"])
+def generate_batch():
+    """Render many rooms at once, as one multi-page PDF or a ZIP of PDFs.
+
+    The body is either a JSON list of room selections (same fields as the
+    /generate form, plus an optional "room" label) or an object with "rooms"
+    and "format". The format can also be given as ?format=pdf|zip.
+    """
+    payload = request.get_json(silent=True)
+    output_format = request.args.get("format", "pdf")
+    if isinstance(payload, dict):
+        output_format = str(payload.get("format") or output_format)
+        payload = payload.get("rooms")
+    if output_format not in ("pdf", "zip"):
+        return f"Unsupported batch format: {output_format}", 400
+    try:
+        rooms, selections = parse_rooms(payload, BATCH_MAX_ROOMS)
+    except ValueError as exc:
+        return str(exc), 400
+
+    if output_format == "zip":
+        body = stream_batch_zip(rooms, selections)
+        mimetype = "application/zip"
+    else:
+        body = stream_batch_pdf(selections)
+        mimetype = "application/pdf"
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename=door_sheets.{output_format}"
+    )
+    return response
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """Queue a background job rendering many rooms into one ZIP archive.
+
+    The body is the same as for /generate/batch: a JSON list of room
+    selections or an object with "rooms". Poll the returned status URL and
+    download the archive once the job is complete.
+    """
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get("rooms")
+    try:
+        rooms, selections = parse_rooms(payload, JOB_MAX_ROOMS)
+    except ValueError as exc:
+        return str(exc), 400
+    job_id = JOBS.submit(
+        [
+            {
+                "name": _batch_entry_name(index, room, f"{selection[0][0]}.pdf"),
+                "selection": selection,
+            }
+            for index, (room, selection) in enumerate(zip(rooms, selections))
+        ]
+    )
+    response = jsonify(
+        {
+            "id": job_id,
+            "total": len(rooms),
+            "status_url": f"/jobs/{job_id}",
+            "archive_url": f"/jobs/{job_id}/archive",
+        }
+    )
+    response.status_code = 202
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return response
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id: str):
+    status = JOBS.status(job_id)
+    if status is None:
+        return f"Unknown job: {job_id}", 404
+    if status["state"] == "complete":
+        status["archive_url"] = f"/jobs/{job_id}/archive"
+    return jsonify(status)
+
+
+@app.route("/jobs/<job_id>/archive")
+def job_archive(job_id: str):
+    status = JOBS.status(job_id)
+    if status is None:
+        return f"Unknown job: {job_id}", 404
+    if status["state"] != "complete":
+        return make_response(
+            (f"Job {job_id} is {status['state']}", 409, {"Retry-After": "5"})
+        )
+    return send_file(
+        JOBS.store.archive_path(job_id),
+        mimetype="application/zip",
+        as_attachment=True,
+        download_name=f"door_sheets_{job_id[:8]}.zip",
+    )
+
+
+@app.cli.command("run-jobs")
+def run_jobs_command() -> None:
+    """Run the background job workers in the foreground until interrupted."""
+    workers = JOB_WORKERS or 2
+    queue = JobQueue(
+        JOB_DIR, JOBS.target, workers, initializer=JOBS.initializer, max_age=JOBS.max_age
+    )
+    queue.start()
+    if queue.owner:
+        click.echo(f"{workers} job workers processing {queue.store.db_path}")
+    else:
+        click.echo(f"Another process runs the workers of {JOB_DIR}; waiting to take over")
+    try:
+        while True:
+            time.sleep(5)
+            queue.ensure_workers()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.close()
+
+
+@app.route("/profiles")
+def list_profiles():
+    if not _profile_admin():
+        return "Not found", 404
+    return jsonify(PROFILER.store.list())
+
+
+@app.route("/profiles/<name>")
+def download_profile(name: str):
+    path = PROFILER.store.path(name) if _profile_admin() else None
+    if path is None:
+        return f"Unknown profile: {name}", 404
+    return send_file(
+        path,
+        mimetype="application/octet-stream",
+        as_attachment=True,
+        download_name=f"{name}.prof",
+    )
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+
+def _cache_metric_lines() -> List[str]:
+    lines = []
+    for prefix, values in (("pdf_cache", PDF_CACHE.stats()), ("icon_cache", ICONS.stats())):
+        for name, value in values.items():
+            metric = f"door_sheet_{prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+    return lines
+
+
+METRICS.add_collector(_cache_metric_lines)
+
+
+@app.route("/stats")
+def stats():
+    return jsonify(
+        {
+            "pdf_cache": PDF_CACHE.stats(),
+            "icon_cache": ICONS.stats(),
+            "vector_icons": VECTORS.stats(),
+            "render_pool": RENDER_POOL.stats() if RENDER_POOL is not None else None,
+            "jobs": JOBS.stats(),
+            "single_flight": RENDERS_IN_FLIGHT.stats(),
+            "selection_log": SELECTION_LOG.stats() if SELECTION_LOG is not None else None,
+            "asset_watcher": ASSET_WATCHER.stats(),
+        }
     )
 
 
@@ -0,0 +1,204 @@
+import math
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import Image
+
+from icon_variants import EncodedImage, VariantStore, encode_image, load_encoded, source_digest
+from pdf_cache import file_version, read_file
+
+# Modes drawn as they are; anything else is converted to RGBA.
+_DIRECT_MODES = ("RGB", "RGBA", "L", "LA")
+# Pixel sizes are rounded up to this step so nearby draw sizes share a variant.
+SIZE_STEP = 64
+
+
+class IconAsset:
+    """An icon file, read into memory, and the encoded variants drawn from it so far.
+
+    Only the header is read up front; the pixels are decoded the first time
+    a variant has to be encoded or a preview drawn. With the variants built
+    ahead (`flask build-icons`) a worker never decodes an icon at all.
+    """
+
+    def __init__(self, path: Path, mtime_ns: int) -> None:
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.source, _ = read_file(path)
+        self.digest = source_digest(self.source)
+        self._decode_lock = threading.Lock()
+        self._image: Optional[Image.Image] = None
+        with Image.open(BytesIO(self.source)) as img:
+            self.width, self.height = img.size
+            mode = img.mode
+        self.variants: Dict[int, EncodedImage] = {}
+        # Counted as decoded, which it is as soon as anything needs the pixels.
+        self.nbytes = self.width * self.height * (len(mode) if mode in _DIRECT_MODES else 4)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def image(self) -> Image.Image:
+        with self._decode_lock:
+            if self._image is None:
+                with Image.open(BytesIO(self.source)) as img:
+                    img.load()
+                    self._image = img if img.mode in _DIRECT_MODES else img.convert("RGBA")
+            return self._image
+
+    def resized(self, longest_px: int) -> Image.Image:
+        if longest_px >= max(self.width, self.height):
+            return self.image
+        scale = longest_px / float(max(self.width, self.height))
+        return self.image.resize(
+            (max(1, round(self.width * scale)), max(1, round(self.height * scale))),
+            Image.LANCZOS,
+        )
+
+    def encode_variant(self, longest_px: int, store: VariantStore) -> EncodedImage:
+        """Return the encoded variant for `longest_px`, from `store` if it has it.
+
+        Otherwise it is resampled and encoded here and written back to
+        `store` for other processes.
+        """
+        encoded = store.get(self.path, self.digest, longest_px)
+        if encoded is None:
+            color, alpha = encode_image(self.resized(longest_px))
+            store.put(self.path, self.digest, longest_px, color, alpha)
+            encoded = load_encoded(color, alpha)
+        return encoded
+
+
+class IconCache:
+    """In-process LRU of decoded pictograms keyed by path and mtime.
+
+    Variants are resampled for the drawn size at `dpi` (never upscaled),
+    encoded for embedding and kept on disk in `store`; the whole cache is kept
+    under `max_bytes` by evicting least recently used icons.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 128 * 1024 * 1024,
+        dpi: int = 300,
+        store: Optional[VariantStore] = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.dpi = dpi
+        self.store = store or VariantStore(None)
+        self._assets: "OrderedDict[Tuple[str, int], IconAsset]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Pixel sizes known without decoding: path -> (file version, size).
+        self._known_sizes: Dict[str, Tuple[str, Tuple[int, int]]] = {}
+
+    def seed_sizes(self, sizes: Dict[str, Tuple[str, Tuple[int, int]]]) -> None:
+        """Record pixel sizes (e.g. from the catalog) so `size` needn't decode."""
+        self._known_sizes.update(sizes)
+
+    def get(self, path: Path) -> IconAsset:
+        if not path.exists():
+            raise FileNotFoundError(f"Icon not found at: {path}")
+        key = (str(path), path.stat().st_mtime_ns)
+        with self._lock:
+            asset = self._assets.get(key)
+            if asset is not None:
+                self._assets.move_to_end(key)
+                self.hits += 1
+                return asset
+        asset = IconAsset(path, key[1])
+        with self._lock:
+            existing = self._assets.get(key)
+            if existing is not None:
+                self.hits += 1
+                return existing
+            self.misses += 1
+            self._drop_stale(key[0])
+            self._assets[key] = asset
+            self.nbytes += asset.nbytes
+            self._evict(keep=key)
+        return asset
+
+    def size(self, path: Path) -> Tuple[int, int]:
+        known = self._known_sizes.get(str(path))
+        if known is not None and known[0] == file_version(path):
+            return known[1]
+        return self.get(path).size
+
+    def variant(self, path: Path, width_pt: float, height_pt: float) -> EncodedImage:
+        """Return the encoded variant for drawing at width_pt x height_pt."""
+        asset = self.get(path)
+        longest_px = self.longest_px(asset, width_pt, height_pt)
+        with self._lock:
+            encoded = asset.variants.get(longest_px)
+        if encoded is not None:
+            return encoded
+        # Encoding can take a while; don't hold up other icons meanwhile.
+        encoded = asset.encode_variant(longest_px, self.store)
+        with self._lock:
+            existing = asset.variants.get(longest_px)
+            if existing is not None:
+                return existing
+            asset.variants[longest_px] = encoded
+            asset.nbytes += encoded.nbytes
+            key = (str(asset.path), asset.mtime_ns)
+            if key in self._assets:
+                self.nbytes += encoded.nbytes
+                self._evict(keep=key)
+        return encoded
+
+    def longest_px(self, asset: IconAsset, width_pt: float, height_pt: float) -> int:
+        return min(self.pixels_for(max(width_pt, height_pt)), max(asset.width, asset.height))
+
+    def pixels_for(self, points: float) -> int:
+        pixels = math.ceil(points * self.dpi / 72.0)
+        return int(math.ceil(pixels / float(SIZE_STEP)) * SIZE_STEP)
+
+    def warm(self, sized_paths: Iterable[Tuple[Path, float]]) -> int:
+        """Load icons and the variant for their usual draw size (in points)."""
+        count = 0
+        for path, points in sized_paths:
+            if not path.exists():
+                continue
+            self.variant(path, points, points)
+            count += 1
+        return count
+
+    def invalidate(self, path: Optional[Path] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._assets.clear()
+                self.nbytes = 0
+            else:
+                self._drop_stale(str(path))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "icons": len(self._assets),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _drop_stale(self, path_str: str) -> None:
+        for key in [k for k in self._assets if k[0] == path_str]:
+            self.nbytes -= self._assets.pop(key).nbytes
+
+    def _evict(self, keep: Tuple[str, int]) -> None:
+        while self.nbytes > self.max_bytes and len(self._assets) > 1:
+            key = next(iter(self._assets))
+            if key == keep:
+                self._assets.move_to_end(key)
+                key = next(iter(self._assets))
+            self.nbytes -= self._assets.pop(key).nbytes
+            self.evictions += 1
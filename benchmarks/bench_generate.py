@@ -0,0 +1,138 @@
+"""Benchmark generate_hazard_pdf across every layout branch and risk template.
+
+Usage:
+    python benchmarks/bench_generate.py --output baseline.json
+    python benchmarks/bench_generate.py --compare baseline.json --threshold 0.10
+
+Each case records the median wall time over --repeat runs, the peak traced
+memory of one extra run (tracemalloc), and the size of the produced PDF.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+# Benchmarks call the renderer directly; keep the result cache off disk.
+os.environ.setdefault("DOOR_SHEET_PDF_CACHE_DIR", "")
+
+import app  # noqa: E402  pylint: disable=wrong-import-position
+
+HAZARD_SETS = {
+    "1_hazard": ["electrical"],
+    "2_hazards": ["electrical", "hot_surface"],
+    "2_hazards_multiline": ["electrical", "toxic_cmr"],
+    "3_hazards": ["electrical", "hot_surface", "low_temperature"],
+    "4_hazards_grid": ["electrical", "hot_surface", "low_temperature", "toxic_cmr"],
+    "multiline_caption": ["toxic_cmr"],
+}
+
+
+def build_cases() -> List[Tuple[str, List[str], List[str], List[str], str]]:
+    obligations = sorted(app.OBLIGATIONS)
+    prohibitions = sorted(app.PROHIBITIONS)
+    cases = []
+    for risk_key in app.RISK_TEMPLATES:
+        for name, hazards in HAZARD_SETS.items():
+            cases.append((f"{risk_key}/{name}", hazards, [], [], risk_key))
+        for count in range(7):
+            # Alternate obligations and prohibitions so both kinds are drawn.
+            signs_o = obligations[: (count + 1) // 2]
+            signs_p = prohibitions[: count // 2]
+            cases.append((f"{risk_key}/{count}_signs", ["electrical"], signs_o, signs_p, risk_key))
+    return cases
+
+
+def run_case(case, repeat: int, output_mode: str) -> Dict[str, float]:
+    _, hazards, obligations, prohibitions, risk_key = case
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pdf_buffer, _ = app.generate_hazard_pdf(
+            hazards, obligations, prohibitions, risk_key, output_mode=output_mode
+        )
+        timings.append(time.perf_counter() - started)
+        size = len(pdf_buffer.getvalue())
+    tracemalloc.start()
+    app.generate_hazard_pdf(hazards, obligations, prohibitions, risk_key, output_mode=output_mode)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "peak_bytes": peak,
+        "output_bytes": size,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Return a line for every metric that grew by more than `threshold`."""
+    regressions = []
+    for name, result in current["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        for metric in ("seconds", "peak_bytes", "output_bytes"):
+            old, new = before[metric], result[metric]
+            if old and (new - old) / old > threshold:
+                regressions.append(
+                    f"{name}: {metric} {old:.4g} -> {new:.4g} (+{(new - old) / old:.0%})"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+    parser.add_argument("--filter", default="", help="only run cases containing this text")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="allowed relative growth (0.10 = 10%%)"
+    )
+    parser.add_argument(
+        "--output-mode", default=app.PDF_OUTPUT_MODE, choices=["rewrite", "incremental", "optimized"]
+    )
+    args = parser.parse_args()
+
+    app.warm_caches()
+    results = {}
+    for case in build_cases():
+        if args.filter not in case[0]:
+            continue
+        results[case[0]] = run_case(case, args.repeat, args.output_mode)
+        row = results[case[0]]
+        print(
+            f"{case[0]:<36} {row['seconds'] * 1000:9.1f} ms "
+            f"{row['peak_bytes'] / 1024:9.0f} KiB peak {row['output_bytes'] / 1024:9.0f} KiB out"
+        )
+    current = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "output_mode": args.output_mode,
+        "repeat": args.repeat,
+        "cases": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(current, indent=2, sort_keys=True))
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(current, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Compare the peak memory of the server with and without streamed /generate responses.
+
+Usage:
+    python benchmarks/bench_memory.py
+    python benchmarks/bench_memory.py --concurrency 50 --rounds 4 --output memory.json
+
+For each mode a fresh server process (werkzeug, one thread per request) is
+started with an empty sheet cache and sent `--rounds` waves of
+`--concurrency` simultaneous requests, every one for a different selection.
+Peak RSS is the kernel's high-water mark of the server process (Linux only),
+reported with the RSS it had after its first sheet.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVER = """
+import json, sys
+from werkzeug.serving import make_server
+import app
+server = make_server("127.0.0.1", 0, app.app, threaded=True)
+print(json.dumps({
+    "port": server.server_port,
+    "hazards": list(app.HAZARDS),
+    "signs": [list(app.OBLIGATIONS), list(app.PROHIBITIONS)],
+    "risks": list(app.RISK_TEMPLATES),
+}), flush=True)
+server.serve_forever()
+"""
+
+MODES = {
+    "buffered": {"DOOR_SHEET_STREAM_RESPONSES": "0"},
+    # Without the in-memory sheet cache, which buffered mode also fills.
+    "buffered, no memory cache": {
+        "DOOR_SHEET_STREAM_RESPONSES": "0",
+        "DOOR_SHEET_PDF_CACHE_MB": "0",
+    },
+    "streamed": {"DOOR_SHEET_STREAM_RESPONSES": "1"},
+}
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    values = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            name, _, rest = line.partition(":")
+            if name in ("VmRSS", "VmHWM"):
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def selections(info: Dict, count: int, seed: int = 7) -> List[Dict[str, str]]:
+    """`count` different selections of one to four hazards and up to six signs."""
+    rnd = random.Random(seed)
+    obligations, prohibitions = info["signs"]
+    seen = set()
+    result = []
+    while len(result) < count:
+        fields = {
+            "hazards_order": ",".join(rnd.sample(info["hazards"], rnd.randint(1, 4))),
+            "obligations_order": ",".join(rnd.sample(obligations, rnd.randint(0, 3))),
+            "prohibitions_order": ",".join(rnd.sample(prohibitions, rnd.randint(0, 3))),
+            "risk": rnd.choice(info["risks"]),
+        }
+        key = tuple(sorted(fields.items()))
+        if key not in seen:
+            seen.add(key)
+            result.append(fields)
+    return result
+
+
+def post(port: int, fields: Dict[str, str]) -> int:
+    body = urllib.parse.urlencode(fields).encode()
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/generate", body, timeout=120) as response:
+        return len(response.read())
+
+
+def measure(env: Dict[str, str], concurrency: int, rounds: int) -> Dict[str, object]:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = subprocess.Popen(
+            [sys.executable, "-c", SERVER],
+            cwd=ROOT,
+            env={
+                **os.environ,
+                "DOOR_SHEET_WARM_CACHES": "1",
+                "DOOR_SHEET_JOB_WORKERS": "0",
+                "DOOR_SHEET_PDF_CACHE_DIR": cache_dir,
+                **env,
+            },
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        try:
+            info = json.loads(server.stdout.readline())
+            port = info["port"]
+            requests = selections(info, concurrency * rounds + 1)
+            post(port, requests.pop())
+            baseline = memory_kb(server.pid)["VmRSS"]
+            started = time.perf_counter()
+            sizes: List[int] = []
+            for wave in range(rounds):
+                batch = requests[wave * concurrency : (wave + 1) * concurrency]
+                barrier = threading.Barrier(len(batch))
+
+                def send(fields: Dict[str, str]) -> int:
+                    barrier.wait()
+                    return post(port, fields)
+
+                with ThreadPoolExecutor(concurrency) as pool:
+                    sizes.extend(pool.map(send, batch))
+            elapsed = time.perf_counter() - started
+            peak = memory_kb(server.pid)["VmHWM"]
+        finally:
+            server.terminate()
+            server.wait()
+    return {
+        "requests": len(sizes),
+        "seconds": elapsed,
+        "mean_output_bytes": sum(sizes) / len(sizes),
+        "rss_after_first_sheet_mb": baseline / 1024,
+        "peak_rss_mb": peak / 1024,
+        "peak_growth_mb": (peak - baseline) / 1024,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=50, help="simultaneous requests")
+    parser.add_argument("--rounds", type=int, default=4, help="waves of simultaneous requests")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = {name: measure(env, args.concurrency, args.rounds) for name, env in MODES.items()}
+    for name, result in results.items():
+        print(
+            f"{name:26s} {result['requests']} requests in {result['seconds']:.2f} s  "
+            f"RSS after first sheet {result['rss_after_first_sheet_mb']:6.1f} MB  "
+            f"peak {result['peak_rss_mb']:6.1f} MB (+{result['peak_growth_mb']:.1f} MB)"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Check that optimized output is smaller than rewrite output for every case and risk level.
+
+Usage:
+    python benchmarks/bench_output_size.py
+    python benchmarks/bench_output_size.py --batch-rooms 30 --output sizes.json
+
+Every case of bench_generate.py is rendered in both modes, and so is a
+batch PDF that cycles through all risk templates. The script prints the
+sizes per risk level and exits with status 1 if an optimized sheet is not
+smaller than the same sheet in rewrite mode.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+from bench_generate import app, build_cases  # sets up the path and cache settings
+
+from pdf_assembly import SheetAssembler
+
+
+def batch_size(selections: List[tuple], optimize: bool) -> int:
+    assembler = SheetAssembler(optimize=optimize)
+    size = 0
+    for selection in selections:
+        plan, template, _ = app.plan_selection(*selection)
+        size += sum(len(chunk) for chunk in assembler.add_page(template, plan, app.icon_variant))
+    return size + sum(len(chunk) for chunk in assembler.close())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-rooms", type=int, default=12, help="pages of the batch PDF")
+    parser.add_argument("--output", help="write the sizes as JSON to this file")
+    args = parser.parse_args()
+
+    app.warm_caches()
+    cases: Dict[str, Dict[str, int]] = {}
+    failures = []
+    for name, hazards, obligations, prohibitions, risk_key in build_cases():
+        sizes = {
+            mode: sum(
+                len(chunk)
+                for chunk in app.sheet_chunks(hazards, obligations, prohibitions, risk_key, mode)[0]
+            )
+            for mode in ("rewrite", "optimized")
+        }
+        cases[name] = sizes
+        if sizes["optimized"] >= sizes["rewrite"]:
+            failures.append(name)
+
+    per_risk = {}
+    for risk_key in app.RISK_TEMPLATES:
+        rows = [sizes for name, sizes in cases.items() if name.startswith(f"{risk_key}/")]
+        rewrite = sum(row["rewrite"] for row in rows)
+        optimized = sum(row["optimized"] for row in rows)
+        per_risk[risk_key] = {"cases": len(rows), "rewrite": rewrite, "optimized": optimized}
+        print(
+            f"{risk_key:<12} {len(rows):3d} sheets  rewrite {rewrite / 1024:8.0f} KiB  "
+            f"optimized {optimized / 1024:8.0f} KiB  ({optimized / rewrite - 1:+.1%})"
+        )
+
+    risks = list(app.RISK_TEMPLATES)
+    selections = [
+        (["electrical"], [], [], risks[index % len(risks)]) for index in range(args.batch_rooms)
+    ]
+    batch = {mode: batch_size(selections, mode == "optimized") for mode in ("rewrite", "optimized")}
+    print(
+        f"{'batch':<12} {args.batch_rooms:3d} pages   rewrite {batch['rewrite'] / 1024:8.0f} KiB  "
+        f"optimized {batch['optimized'] / 1024:8.0f} KiB  ({batch['optimized'] / batch['rewrite'] - 1:+.1%})"
+    )
+    if batch["optimized"] >= batch["rewrite"]:
+        failures.append("batch")
+
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps({"risks": per_risk, "batch": batch, "cases": cases}, indent=2, sort_keys=True)
+        )
+    for name in failures:
+        print(f"NOT SMALLER {name}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
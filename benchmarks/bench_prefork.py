@@ -0,0 +1,165 @@
+"""Measure the unique memory of each worker of a prefork server, with and without preloading.
+
+Usage:
+    python benchmarks/bench_prefork.py
+    python benchmarks/bench_prefork.py --workers 8 --sheets 40 --output prefork.json
+
+For each mode a fresh interpreter imports the app and forks `--workers`
+processes the way gunicorn does. Every worker renders `--sheets` sheets and
+the preview backgrounds, then runs a full garbage collection, as any
+long-lived worker eventually does. The master then reads each worker's
+memory from /proc/<pid>/smaps_rollup (Linux only):
+
+- USS: pages only that worker has (private clean + private dirty), i.e.
+  what every additional worker costs.
+- PSS: its proportional share of everything it maps.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODES = {
+    "load in each worker": "lazy",
+    "preload, no gc.freeze": "preload-nofreeze",
+    "preload_for_fork": "preload",
+}
+
+
+def read_memory(pid: int) -> Dict[str, float]:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                fields[name] = int(rest.split()[0])
+    return {
+        "uss_mb": (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024,
+        "pss_mb": fields["Pss"] / 1024,
+        "rss_mb": fields["Rss"] / 1024,
+    }
+
+
+def master(mode: str, workers: int, sheets: int) -> List[Dict[str, float]]:
+    """Run in the child interpreter: load the app, fork the workers, measure them."""
+    import gc
+    import random
+
+    import app
+
+    if mode == "preload-nofreeze":
+        gc.freeze = lambda: None
+    if mode != "lazy":
+        app.preload_for_fork()
+
+    rnd = random.Random(11)
+    hazards, obligations = list(app.HAZARDS), list(app.OBLIGATIONS)
+    risks = list(app.RISK_TEMPLATES)
+    selections = [
+        (
+            rnd.sample(hazards, rnd.randint(1, 4)),
+            rnd.sample(obligations, rnd.randint(0, 6)),
+            [],
+            rnd.choice(risks),
+        )
+        for _ in range(sheets)
+    ]
+
+    children = []
+    for _ in range(workers):
+        ready_read, ready_write = os.pipe()
+        stop_read, stop_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            os.close(stop_write)
+            for selection in selections:
+                app.sheet_chunks(*selection)
+            for key in risks:
+                app.preview_background(app.TEMPLATES.entry(key))
+            gc.collect()
+            os.write(ready_write, b"1")
+            os.read(stop_read, 1)
+            os._exit(0)
+        os.close(ready_write)
+        os.close(stop_read)
+        children.append((pid, ready_read, stop_write))
+
+    results = []
+    for _, ready_read, _ in children:
+        os.read(ready_read, 1)
+    for pid, _, _ in children:
+        results.append(read_memory(pid))
+    # Later workers inherited the earlier ones' pipes: close them all first.
+    for _, _, stop_write in children:
+        os.close(stop_write)
+    for pid, _, _ in children:
+        os.waitpid(pid, 0)
+    return results
+
+
+def measure(mode: str, workers: int, sheets: int) -> Dict[str, object]:
+    out = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            "--master",
+            mode,
+            "--workers",
+            str(workers),
+            "--sheets",
+            str(sheets),
+        ],
+        cwd=ROOT,
+        env={
+            **os.environ,
+            "DOOR_SHEET_WARM_CACHES": "0",
+            "DOOR_SHEET_JOB_WORKERS": "0",
+            "DOOR_SHEET_PDF_CACHE_DIR": "",
+        },
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    per_worker = json.loads(out.strip().splitlines()[-1])
+    return {
+        "workers": per_worker,
+        "median_uss_mb": statistics.median(worker["uss_mb"] for worker in per_worker),
+        "median_pss_mb": statistics.median(worker["pss_mb"] for worker in per_worker),
+        "median_rss_mb": statistics.median(worker["rss_mb"] for worker in per_worker),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="forked worker processes")
+    parser.add_argument("--sheets", type=int, default=20, help="sheets rendered by each worker")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--master", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.master:
+        sys.path.insert(0, str(ROOT))
+        print(json.dumps(master(args.master, args.workers, args.sheets)))
+        return 0
+
+    results = {name: measure(mode, args.workers, args.sheets) for name, mode in MODES.items()}
+    for name, result in results.items():
+        print(
+            f"{name:22s} per worker: USS {result['median_uss_mb']:6.1f} MB  "
+            f"PSS {result['median_pss_mb']:6.1f} MB  RSS {result['median_rss_mb']:6.1f} MB"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
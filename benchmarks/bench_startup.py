@@ -0,0 +1,97 @@
+"""Measure how long a fresh process takes to import the app and render its first sheet.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --output startup.json
+
+Every run is a new interpreter, like a freshly started gunicorn worker or
+container. For each configuration it records the median time to import `app`,
+the median time from process start until the first sheet is rendered, and
+which heavy libraries were already loaded when the import returned.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+loaded = [name for name in ("PyPDF2", "reportlab", "pypdfium2") if name in sys.modules]
+app.generate_hazard_pdf(["electrical", "toxic_cmr"], [], [], "moderate")
+rendered = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - started,
+    "first_render_s": rendered - imported,
+    "loaded": loaded,
+}))
+"""
+
+CONFIGS = {
+    "catalog, warm in background": {"DOOR_SHEET_WARM_CACHES": "background"},
+    "catalog, warm on import": {"DOOR_SHEET_WARM_CACHES": "1"},
+    "catalog, no warming": {"DOOR_SHEET_WARM_CACHES": "0"},
+    "no catalog, no warming": {"DOOR_SHEET_WARM_CACHES": "0", "DOOR_SHEET_CATALOG": os.devnull},
+}
+
+
+def run_once(env: Dict[str, str]) -> Dict[str, float]:
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=ROOT,
+        env={**os.environ, "DOOR_SHEET_PDF_CACHE_DIR": "", **env},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - started
+    return result
+
+
+def measure(env: Dict[str, str], repeat: int) -> Dict[str, object]:
+    runs: List[Dict] = [run_once(env) for _ in range(repeat)]
+    return {
+        "import_ms": statistics.median(run["import_s"] for run in runs) * 1000,
+        "import_to_first_sheet_ms": statistics.median(
+            (run["import_s"] + run["first_render_s"]) for run in runs
+        ) * 1000,
+        "process_ms": statistics.median(run["process_s"] for run in runs) * 1000,
+        "loaded_after_import": runs[-1]["loaded"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per configuration")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    args = parser.parse_args()
+
+    if not (ROOT / "catalog.json").exists():
+        print("catalog.json not found; run `flask --app app build-catalog` first", file=sys.stderr)
+    results = {name: measure(env, args.repeat) for name, env in CONFIGS.items()}
+    for name, result in results.items():
+        print(
+            f"{name:30s} import {result['import_ms']:7.1f} ms  "
+            f"first sheet {result['import_to_first_sheet_ms']:7.1f} ms  "
+            f"process {result['process_ms']:7.1f} ms  "
+            f"loaded: {', '.join(result['loaded_after_import']) or '-'}"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
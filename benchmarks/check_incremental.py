@@ -0,0 +1,180 @@
+"""Check the incremental updates the "incremental" output mode appends to templates.
+
+Usage:
+    python benchmarks/check_incremental.py
+    python benchmarks/check_incremental.py --max-problems 50
+
+Every case of bench_generate.py is rendered with output_mode="incremental"
+and the result parsed again, without the reader the renderer uses. Each sheet
+must start with the template's bytes unchanged, and its last cross-reference
+section (a table or a stream) must:
+
+- point back to the template's own section with /Prev,
+- give every object it lists an offset where "<number> <generation> obj"
+  starts,
+- keep the first half of the template's /ID (a digest of the template when
+  it has none), so readers still see the same document.
+
+The script prints what it found and exits with status 1 if any sheet has a
+problem.
+"""
+
+import argparse
+import hashlib
+import re
+import sys
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+from PyPDF2.errors import PdfReadError
+from PyPDF2.generic import DictionaryObject, StreamObject, read_object
+
+from bench_generate import app, build_cases
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)\s+%%EOF\s*$")
+_OBJECT = re.compile(rb"(\d+)\s+(\d+)\s+obj\b\s*")
+_TRAILER = re.compile(rb"trailer\s*")
+_SUBSECTION = re.compile(rb"(\d+)\s+(\d+)\s*$")
+
+# Object number -> (offset, generation) of the objects a section lists in use.
+Entries = Dict[int, Tuple[int, int]]
+
+
+def last_startxref(data: bytes) -> int:
+    match = _STARTXREF.search(data[-64:])
+    if match is None:
+        raise ValueError("no trailing startxref")
+    return int(match.group(1))
+
+
+def read_section(data: bytes, offset: int) -> Tuple[Entries, DictionaryObject]:
+    """Parse the cross-reference section at `offset`; return its entries and trailer."""
+    if data[offset : offset + 4] == b"xref":
+        return _read_table(data, offset)
+    match = _OBJECT.match(data, offset)
+    if match is None:
+        raise ValueError(f"startxref {offset} points at neither a table nor an object")
+    stream = BytesIO(data)
+    stream.seek(match.end())
+    xref = read_object(stream, None)
+    if not isinstance(xref, StreamObject) or xref.get("/Type") != "/XRef":
+        raise ValueError(f"object at startxref {offset} is not an xref stream")
+    return _read_stream(xref), xref
+
+
+def _read_table(data: bytes, offset: int) -> Tuple[Entries, DictionaryObject]:
+    entries: Entries = {}
+    lines = BytesIO(data)
+    lines.seek(offset)
+    lines.readline()
+    number = 0
+    while True:
+        position = lines.tell()
+        line = lines.readline()
+        if not line:
+            raise ValueError(f"xref table at {offset} has no trailer")
+        if line.startswith(b"trailer"):
+            break
+        subsection = _SUBSECTION.match(line.strip())
+        if subsection:
+            number = int(subsection.group(1))
+            continue
+        fields = line.split()
+        if len(fields) != 3:
+            raise ValueError(f"bad xref table line {line!r} at {position}")
+        if fields[2] == b"n":
+            entries[number] = (int(fields[0]), int(fields[1]))
+        number += 1
+    lines.seek(_TRAILER.match(data, position).end())
+    return entries, read_object(lines, None)
+
+
+def _read_stream(xref: StreamObject) -> Entries:
+    widths = [int(width) for width in xref["/W"]]
+    index = [int(value) for value in xref.get("/Index", [0, xref["/Size"]])]
+    rows = xref.get_data()
+    if len(rows) < sum(widths) * sum(index[1::2]):
+        raise ValueError("xref stream is shorter than its /Index")
+    entries: Entries = {}
+    position = 0
+    for first, count in zip(index[::2], index[1::2]):
+        for number in range(first, first + count):
+            fields = []
+            for width in widths:
+                fields.append(int.from_bytes(rows[position : position + width], "big"))
+                position += width
+            kind = fields[0] if widths[0] else 1
+            if kind == 1:
+                entries[number] = (fields[1], fields[2])
+    return entries
+
+
+def id_bytes(value) -> bytes:
+    # The parser decodes strings that happen to be valid text; undo that.
+    return bytes(getattr(value, "original_bytes", value))
+
+
+def check_sheet(template: bytes, sheet: bytes) -> List[str]:
+    if not sheet.startswith(template):
+        return ["does not start with the template's bytes"]
+    problems = []
+    base_offset = last_startxref(template)
+    _, base_trailer = read_section(template, base_offset)
+    entries, trailer = read_section(sheet, last_startxref(sheet))
+
+    prev = trailer.get("/Prev")
+    if prev != base_offset:
+        problems.append(f"/Prev is {prev}, the template's section is at {base_offset}")
+    if not entries:
+        problems.append("the update lists no objects")
+    for number, (offset, generation) in sorted(entries.items()):
+        if offset < len(template):
+            problems.append(f"object {number} points into the template at {offset}")
+            continue
+        match = _OBJECT.match(sheet, offset)
+        if match is None or (int(match.group(1)), int(match.group(2))) != (number, generation):
+            found = sheet[offset : offset + 16]
+            problems.append(f"object {number} {generation}: offset {offset} starts with {found!r}")
+
+    base_id = base_trailer.get("/ID")
+    expected = id_bytes(base_id[0]) if base_id else hashlib.md5(template).digest()
+    sheet_id = trailer.get("/ID")
+    if not sheet_id or len(sheet_id) != 2:
+        problems.append("the update has no two-part /ID")
+    elif id_bytes(sheet_id[0]) != expected:
+        problems.append("/ID[0] differs from the template's")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--max-problems", type=int, default=20, help="problems to print before stopping"
+    )
+    args = parser.parse_args()
+
+    checked = 0
+    problems: List[str] = []
+    templates: Dict[str, bytes] = {}
+    for name, hazards, obligations, prohibitions, risk_key in build_cases():
+        if risk_key not in templates:
+            templates[risk_key] = app.RISK_TEMPLATES[risk_key]["template_path"].read_bytes()
+        pdf_buffer, _ = app.generate_hazard_pdf(
+            hazards, obligations, prohibitions, risk_key, output_mode="incremental"
+        )
+        checked += 1
+        try:
+            found = check_sheet(templates[risk_key], pdf_buffer.getvalue())
+        except (PdfReadError, ValueError, KeyError) as exc:
+            found = [f"cannot parse: {exc}"]
+        problems.extend(f"{name}: {problem}" for problem in found)
+        if len(problems) >= args.max_problems:
+            break
+    for problem in problems:
+        print(problem)
+    print(f"{checked} sheets checked, {len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
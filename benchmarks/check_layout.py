@@ -0,0 +1,84 @@
+"""Check the layout rules: no placement leaves its box or overlaps another one.
+
+Usage:
+    python benchmarks/check_layout.py
+    python benchmarks/check_layout.py --max-problems 50
+
+Every combination of hazards for each count with a layout rule is planned
+with a full set of signs, and every mix of obligations and prohibitions up
+to MAX_SIGNS with each hazard count, on every risk template. Each plan is
+checked with layout.validate_plan; the script prints what it found and
+exits with status 1 if any plan has a problem.
+"""
+
+import argparse
+import sys
+from itertools import combinations
+from typing import Iterator, List, Tuple
+
+from bench_generate import app  # sets up the path and cache settings
+
+from layout import LAYOUTS, MAX_SIGNS, validate_plan
+
+Selection = Tuple[List[str], List[str], List[str]]
+
+
+def sign_mixes(obligations: List[str], prohibitions: List[str]) -> Iterator[Tuple[List[str], List[str]]]:
+    """Every split of 0..MAX_SIGNS signs, with each sign showing up in some mix."""
+    for count in range(MAX_SIGNS + 1):
+        for obligation_count in range(count + 1):
+            prohibition_count = count - obligation_count
+            if obligation_count > len(obligations) or prohibition_count > len(prohibitions):
+                continue
+            # Slide a window over each list so every icon's size gets planned.
+            for start in range(max(len(obligations), len(prohibitions))):
+                yield (
+                    _window(obligations, start, obligation_count),
+                    _window(prohibitions, start, prohibition_count),
+                )
+
+
+def _window(keys: List[str], start: int, count: int) -> List[str]:
+    return [keys[(start + offset) % len(keys)] for offset in range(count)] if count else []
+
+
+def selections() -> Iterator[Selection]:
+    hazards = list(app.HAZARDS)
+    obligations, prohibitions = sorted(app.OBLIGATIONS), sorted(app.PROHIBITIONS)
+    full_signs = (obligations[: MAX_SIGNS // 2], prohibitions[: MAX_SIGNS - MAX_SIGNS // 2])
+    for count in sorted(LAYOUTS):
+        for combination in combinations(hazards, count):
+            yield list(combination), *full_signs
+    for count in sorted(LAYOUTS):
+        for signs in sign_mixes(obligations, prohibitions):
+            yield hazards[:count], *signs
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--max-problems", type=int, default=20, help="problems to print before stopping"
+    )
+    args = parser.parse_args()
+
+    checked = 0
+    problems: List[str] = []
+    for risk_key in app.RISK_TEMPLATES:
+        for hazards, obligations, prohibitions in selections():
+            plan, _, _ = app.plan_selection(hazards, obligations, prohibitions, risk_key)
+            checked += 1
+            for problem in validate_plan(plan):
+                query = app.canonical_query(hazards, obligations, prohibitions, risk_key)
+                problems.append(f"{query}: {problem}")
+            if len(problems) >= args.max_problems:
+                break
+        if len(problems) >= args.max_problems:
+            break
+    for problem in problems:
+        print(problem)
+    print(f"{checked} plans checked, {len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Check that the gunicorn master runs no thread but its own when it forks.
+
+Usage:
+    python benchmarks/check_prefork.py
+
+A thread running in the master when gunicorn forks its workers is not copied
+into them, and any lock it holds stays locked there for good. Each case
+imports the app in a fresh interpreter, calls preload_for_fork as
+gunicorn.conf.py does, and lists the threads left at that point: once with
+gunicorn.conf.py applied first, where no thread may even start on import,
+and once per DOOR_SHEET_WARM_CACHES value without it. The script exits with
+status 1 if any case has extra threads.
+"""
+
+import argparse
+import json
+import os
+import runpy
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CASES = {
+    "gunicorn.conf.py, DOOR_SHEET_WARM_CACHES=background": ("background", True),
+    "DOOR_SHEET_WARM_CACHES=0": ("0", False),
+    "DOOR_SHEET_WARM_CACHES=1": ("1", False),
+    "DOOR_SHEET_WARM_CACHES=background": ("background", False),
+}
+
+
+def master(with_config: bool) -> Dict[str, object]:
+    """Run in the child interpreter: load the app as the master would, then list its threads."""
+    import threading
+
+    if with_config:
+        runpy.run_path(str(ROOT / "gunicorn.conf.py"))
+    sys.path.insert(0, str(ROOT))
+    import app
+
+    imported = [thread.name for thread in threading.enumerate()]
+    app.preload_for_fork()
+    tasks: Optional[int] = None
+    if os.path.isdir("/proc/self/task"):
+        tasks = len(os.listdir("/proc/self/task"))
+    return {
+        "imported": imported,
+        "threads": [thread.name for thread in threading.enumerate()],
+        "tasks": tasks,
+    }
+
+
+def run_case(warm: str, with_config: bool) -> Dict[str, object]:
+    command = [sys.executable, __file__, "--master"]
+    if with_config:
+        command.append("--with-config")
+    out = subprocess.run(
+        command,
+        cwd=ROOT,
+        env={
+            **os.environ,
+            "DOOR_SHEET_WARM_CACHES": warm,
+            "DOOR_SHEET_PDF_CACHE_DIR": "",
+            "DOOR_SHEET_SELECTION_LOG": "",
+        },
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--master", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--with-config", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.master:
+        print(json.dumps(master(args.with_config)))
+        return 0
+
+    problems: List[str] = []
+    for name, (warm, with_config) in CASES.items():
+        result = run_case(warm, with_config)
+        started = [thread for thread in result["imported"] if thread != "MainThread"]
+        extra = [thread for thread in result["threads"] if thread != "MainThread"]
+        if with_config and started:
+            problems.append(f"{name}: threads started on import: {', '.join(started)}")
+        if extra:
+            problems.append(f"{name}: threads running at fork: {', '.join(extra)}")
+        elif result["tasks"] not in (None, 1):
+            problems.append(f"{name}: {result['tasks']} OS threads at fork")
+        print(f"{name}: {len(result['threads'])} Python threads, {result['tasks']} OS threads")
+    for problem in problems:
+        print(problem)
+    print(f"{len(CASES)} cases checked, {len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
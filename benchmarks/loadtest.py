@@ -0,0 +1,408 @@
+"""Load-test the app under a local WSGI server over a sweep of concurrency levels.
+
+Usage:
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --concurrency 1,8,32,64 --duration 20 --output load.json
+    python benchmarks/loadtest.py --server gunicorn --workers 4 --threads 2 \\
+        --env DOOR_SHEET_STREAM_RESPONSES=0 --output buffered.json
+
+The server runs in its own process with a fresh sheet cache and the
+DOOR_SHEET_* settings of the environment plus any --env overrides. Each
+level runs `--concurrency` clients for `--warmup` seconds (not counted) and
+then `--duration` seconds, every client sending its next request as soon as
+the previous one finished. Requests are a mix of index page loads
+(`--index-share`) and /generate form posts. The posts are drawn, skewed
+towards the popular ones, from `--distinct` selections of one to four
+hazards, up to six obligations and prohibitions in any order, and all risk
+levels.
+
+For every level the results report throughput, latency percentiles
+(overall and per endpoint), the error rate, and the server's RSS (summed
+over all of its processes; Linux only). --output writes them as JSON
+('-' for stdout), so runs with other settings or releases can be compared.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CATALOG = """
+import json
+import app
+print(json.dumps({
+    "hazards": list(app.HAZARDS),
+    "obligations": list(app.OBLIGATIONS),
+    "prohibitions": list(app.PROHIBITIONS),
+    "risks": list(app.RISK_TEMPLATES),
+}))
+"""
+
+WERKZEUG = """
+import sys
+from werkzeug.serving import run_simple
+import app
+run_simple("127.0.0.1", int(sys.argv[1]), app.app, threaded=True)
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(args: argparse.Namespace, port: int) -> List[str]:
+    if args.server == "werkzeug":
+        return [sys.executable, "-c", WERKZEUG, str(port)]
+    return [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "-c",
+        "gunicorn.conf.py",
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--workers",
+        str(args.workers),
+        "--threads",
+        str(args.threads),
+        "app:app",
+    ]
+
+
+def process_tree_rss_kb(pid: int) -> int:
+    """RSS of a process and all of its descendants."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as children:
+                    pending.extend(int(child) for child in children.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.2) -> None:
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self.last_kb = 0
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.is_set():
+            self.sample()
+            self._done.wait(self.interval)
+
+    def sample(self) -> int:
+        self.last_kb = process_tree_rss_kb(self.pid)
+        self.peak_kb = max(self.peak_kb, self.last_kb)
+        return self.last_kb
+
+    def reset_peak(self) -> None:
+        self.peak_kb = self.sample()
+
+    def stop(self) -> None:
+        self._done.set()
+
+
+def build_selections(catalog: Dict[str, List[str]], count: int, seed: int) -> List[Dict[str, str]]:
+    """`count` different /generate form posts, spread over all risk levels."""
+    rnd = random.Random(seed)
+    signs = [("obligations_order", key) for key in catalog["obligations"]]
+    signs += [("prohibitions_order", key) for key in catalog["prohibitions"]]
+    seen = set()
+    result: List[Dict[str, str]] = []
+    attempts = 0
+    while len(result) < count and attempts < count * 100:
+        attempts += 1
+        fields = {
+            "hazards_order": ",".join(rnd.sample(catalog["hazards"], rnd.randint(1, 4))),
+            "obligations_order": "",
+            "prohibitions_order": "",
+            "risk": catalog["risks"][len(result) % len(catalog["risks"])],
+        }
+        for name, key in rnd.sample(signs, rnd.randint(0, min(6, len(signs)))):
+            fields[name] = f"{fields[name]},{key}" if fields[name] else key
+        identity = tuple(sorted(fields.items()))
+        if identity not in seen:
+            seen.add(identity)
+            result.append(fields)
+    return result
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None, "mean": None}
+    ordered = sorted(values)
+
+    def rank(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+    return {
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "max": ordered[-1],
+        "mean": sum(ordered) / len(ordered),
+    }
+
+
+def send(port: int, request: Tuple[str, str, Optional[bytes]], timeout: float) -> Tuple[str, int]:
+    method, path, body = request
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        headers = {"Content-Type": "application/x-www-form-urlencoded"} if body else {}
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        response.read()
+        return "generate" if path == "/generate" else "index", response.status
+    finally:
+        conn.close()
+
+
+def run_level(
+    port: int,
+    concurrency: int,
+    warmup: float,
+    duration: float,
+    requests: List[Tuple[str, str, Optional[bytes]]],
+    weights: List[float],
+    sampler: RssSampler,
+    timeout: float,
+    seed: int,
+) -> Dict[str, object]:
+    # (endpoint, status, seconds, finished at); status 0 is a failed connection.
+    results: List[Tuple[str, int, float, float]] = []
+    lock = threading.Lock()
+    cum_weights = list(itertools.accumulate(weights))
+    warm_until = time.perf_counter() + warmup
+    stop_at = warm_until + duration
+
+    def client(index: int) -> None:
+        rnd = random.Random(seed * 1000 + index)
+        local = []
+        while True:
+            request = rnd.choices(requests, cum_weights=cum_weights)[0]
+            started = time.perf_counter()
+            if started >= stop_at:
+                break
+            try:
+                endpoint, status = send(port, request, timeout)
+            except (OSError, http.client.HTTPException):
+                endpoint, status = ("generate" if request[1] == "/generate" else "index"), 0
+            finished = time.perf_counter()
+            if started >= warm_until:
+                local.append((endpoint, status, finished - started, finished))
+        with lock:
+            results.extend(local)
+
+    clients = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    time.sleep(max(0.0, warm_until - time.perf_counter()))
+    rss_start = sampler.sample()
+    sampler.reset_peak()
+    for thread in clients:
+        thread.join()
+    rss_end = sampler.sample()
+    # Requests still running at the end are counted: the level lasted until they finished.
+    elapsed = max([duration] + [finished - warm_until for *_, finished in results])
+
+    def summary(rows: List[Tuple[str, int, float, float]]) -> Dict[str, object]:
+        errors = sum(1 for _, status, _, _ in rows if status == 0 or status >= 400)
+        ok = [seconds * 1000 for _, status, seconds, _ in rows if 0 < status < 400]
+        return {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "throughput_rps": len(rows) / elapsed,
+            "latency_ms": percentiles(ok),
+        }
+
+    statuses: Dict[str, int] = {}
+    for _, status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        **summary(results),
+        "statuses": statuses,
+        "endpoints": {
+            endpoint: summary([row for row in results if row[0] == endpoint])
+            for endpoint in ("generate", "index")
+        },
+        "server_rss_mb": {
+            "start": rss_start / 1024,
+            "peak": sampler.peak_kb / 1024,
+            "end": rss_end / 1024,
+        },
+    }
+
+
+def wait_for_port(port: int, server: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The server exited with status {server.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("The server did not start listening in time")
+
+
+def parse_env(values: List[str]) -> Dict[str, str]:
+    env = {}
+    for value in values:
+        name, sep, setting = value.partition("=")
+        if not sep:
+            raise SystemExit(f"--env expects NAME=VALUE, got {value!r}")
+        env[name] = setting
+    return env
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=["werkzeug", "gunicorn"], default="werkzeug")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument(
+        "--concurrency", default="1,4,16,32", help="comma separated client counts to sweep"
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds per level")
+    parser.add_argument("--distinct", type=int, default=500, help="different selections posted")
+    parser.add_argument(
+        "--index-share", type=float, default=0.1, help="fraction of requests for the index page"
+    )
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds per request")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument(
+        "--env", action="append", default=[], metavar="NAME=VALUE", help="server setting"
+    )
+    parser.add_argument("--output", help="write the results as JSON ('-' for stdout)")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(",") if level]
+    log = sys.stderr if args.output == "-" else sys.stdout
+
+    with tempfile.TemporaryDirectory() as scratch:
+        env = {
+            **os.environ,
+            "DOOR_SHEET_JOB_WORKERS": "0",
+            "DOOR_SHEET_PDF_CACHE_DIR": str(Path(scratch) / "pdf"),
+            "DOOR_SHEET_SELECTION_LOG": str(Path(scratch) / "selections.log"),
+            **parse_env(args.env),
+        }
+        catalog = json.loads(
+            subprocess.run(
+                [sys.executable, "-c", CATALOG],
+                cwd=ROOT,
+                env={**env, "DOOR_SHEET_WARM_CACHES": "0"},
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.strip().splitlines()[-1]
+        )
+        selections = build_selections(catalog, args.distinct, args.seed)
+        generate_share = 1.0 - args.index_share
+        # Zipf-like popularity: a few sheets are requested often, most rarely.
+        popularity = [1.0 / (rank + 1) for rank in range(len(selections))]
+        scale = generate_share / sum(popularity)
+        requests: List[Tuple[str, str, Optional[bytes]]] = [("GET", "/", None)]
+        weights = [args.index_share]
+        for fields, weight in zip(selections, popularity):
+            requests.append(("POST", "/generate", urllib.parse.urlencode(fields).encode()))
+            weights.append(weight * scale)
+
+        port = free_port()
+        server = subprocess.Popen(
+            server_command(args, port),
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        sampler = RssSampler(server.pid)
+        try:
+            wait_for_port(port, server)
+            sampler.start()
+            results = []
+            for concurrency in levels:
+                result = run_level(
+                    port,
+                    concurrency,
+                    args.warmup,
+                    args.duration,
+                    requests,
+                    weights,
+                    sampler,
+                    args.timeout,
+                    args.seed,
+                )
+                results.append(result)
+                latency = result["latency_ms"]
+                print(
+                    f"{concurrency:4d} clients  {result['throughput_rps']:8.1f} req/s  "
+                    f"p50 {latency['p50'] or 0:7.1f} ms  p95 {latency['p95'] or 0:7.1f} ms  "
+                    f"p99 {latency['p99'] or 0:7.1f} ms  errors {result['error_rate']:6.2%}  "
+                    f"RSS peak {result['server_rss_mb']['peak']:7.1f} MB",
+                    file=log,
+                )
+        finally:
+            sampler.stop()
+            try:
+                os.killpg(server.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+            server.wait()
+
+    report = {
+        "config": {
+            "server": args.server,
+            "workers": args.workers if args.server == "gunicorn" else None,
+            "threads": args.threads if args.server == "gunicorn" else None,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "distinct_selections": len(selections),
+            "index_share": args.index_share,
+            "seed": args.seed,
+            "settings": {name: value for name, value in env.items() if name.startswith("DOOR_SHEET_")},
+        },
+        "levels": results,
+    }
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    elif args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+from pdf_cache import file_version
+from vector_icons import vector_source
+
+CATALOG_VERSION = 2
+
+
+def sign_label(stem: str) -> str:
+    return stem.replace("_", " ").replace("-", " ").replace("  ", " ").title()
+
+
+def scan_signs(directory: Path) -> Dict[str, dict]:
+    """Build sign entries (key, label, caption, icon path) from the PNGs in `directory`.
+
+    A PDF or SVG with the same name next to a PNG is recorded as its vector path.
+    """
+    signs: Dict[str, dict] = {}
+    if not directory.exists():
+        return signs
+    for path in sorted(directory.glob("*.png")):
+        label = sign_label(path.stem)
+        signs[path.stem.lower().replace("-", "_")] = {
+            "label": label,
+            "caption": label,
+            "icon_path": path,
+            "vector_path": vector_source(path),
+        }
+    return signs
+
+
+def _dir_version(directory: Path) -> str:
+    # A directory's mtime changes when entries are added, removed or renamed.
+    return file_version(directory)
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _icon_record(entry: Mapping, base_dir: Path) -> dict:
+    from PIL import Image
+
+    path = entry["icon_path"]
+    vector = entry.get("vector_path")
+    with Image.open(path) as img:
+        size = list(img.size)
+    return {
+        "label": entry["label"],
+        "caption": entry.get("caption", entry["label"]),
+        "icon": path.relative_to(base_dir).as_posix(),
+        "vector": vector.relative_to(base_dir).as_posix() if vector is not None else None,
+        "size": size,
+        "sha256": _sha256(path),
+        "version": file_version(path),
+    }
+
+
+def _template_record(entry: Mapping, base_dir: Path) -> dict:
+    from PyPDF2 import PdfReader
+
+    path = entry["template_path"]
+    box = PdfReader(str(path)).pages[0].mediabox
+    return {
+        "label": entry["label"],
+        "template": path.relative_to(base_dir).as_posix(),
+        "size": [float(box.width), float(box.height)],
+        "sha256": _sha256(path),
+        "version": file_version(path),
+    }
+
+
+def build_catalog(
+    base_dir: Path,
+    hazards: Mapping[str, dict],
+    risk_templates: Mapping[str, dict],
+    sign_dirs: Mapping[str, Path],
+) -> dict:
+    """Describe every pictogram and risk template the app serves.
+
+    `sign_dirs` maps a section name ("obligations", "prohibitions") to the
+    directory its signs are scanned from. Missing hazard icons are skipped;
+    the app reports them when a sheet that uses them is rendered.
+    """
+    catalog: dict = {
+        "version": CATALOG_VERSION,
+        "dirs": {
+            directory.relative_to(base_dir).as_posix(): _dir_version(directory)
+            for directory in sign_dirs.values()
+        },
+        "hazards": {
+            key: _icon_record(entry, base_dir)
+            for key, entry in hazards.items()
+            if entry["icon_path"].exists()
+        },
+        "risks": {
+            key: _template_record(entry, base_dir)
+            for key, entry in risk_templates.items()
+            if entry["template_path"].exists()
+        },
+    }
+    for section, directory in sign_dirs.items():
+        catalog[section] = {
+            key: _icon_record(entry, base_dir) for key, entry in scan_signs(directory).items()
+        }
+    return catalog
+
+
+def write_catalog(path: Path, catalog: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as handle:
+        json.dump(catalog, handle, indent=2, sort_keys=True)
+    os.replace(tmp_name, path)
+
+
+def load_catalog(path: Path, base_dir: Path) -> Optional[dict]:
+    """Return the catalog at `path`, or None if it is missing or out of date.
+
+    Only the sign directories are checked here (one stat each); an icon file
+    that changed since is noticed when its size is looked up.
+    """
+    try:
+        catalog = json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    if catalog.get("version") != CATALOG_VERSION:
+        return None
+    for rel, version in catalog.get("dirs", {}).items():
+        if _dir_version(base_dir / rel) != version:
+            return None
+    return catalog
+
+
+def signs_from_catalog(catalog: dict, section: str, base_dir: Path) -> Dict[str, dict]:
+    return {
+        key: {
+            "label": record["label"],
+            "caption": record["caption"],
+            "icon_path": base_dir / record["icon"],
+            "vector_path": base_dir / record["vector"] if record.get("vector") else None,
+        }
+        for key, record in catalog.get(section, {}).items()
+    }
+
+
+def icon_sizes(catalog: dict, base_dir: Path) -> Dict[str, Tuple[str, Tuple[int, int]]]:
+    """Map icon path -> (file version, pixel size) for every icon in the catalog."""
+    sizes: Dict[str, Tuple[str, Tuple[int, int]]] = {}
+    for section in ("hazards", "obligations", "prohibitions"):
+        for record in catalog.get(section, {}).values():
+            sizes[str(base_dir / record["icon"])] = (record["version"], tuple(record["size"]))
+    return sizes
+
@@ -0,0 +1,23 @@
+"""gunicorn settings: `gunicorn -c gunicorn.conf.py app:app`.
+
+The app is imported once in the master and fully loaded there before the
+workers are forked, so they share its templates, icons and caches instead
+of each loading a copy (see `preload_for_fork` in app.py).
+"""
+
+import os
+
+# Loading is done by preload_for_fork below; a warm-up thread must not be
+# running in the master when it forks, whatever the environment asks for.
+os.environ["DOOR_SHEET_WARM_CACHES"] = "0"
+
+bind = os.environ.get("DOOR_SHEET_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+preload_app = True
+
+
+def when_ready(server):
+    import app
+
+    app.preload_for_fork()
+    server.log.info("Preloaded templates and icons for the workers")
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+# Bump when the encoding changes so variants written by older code are rebuilt.
+VARIANT_FORMAT = 1
+# A 256-colour palette is used when it stays this close to the original
+# (per-channel error over visible pixels); pictograms almost always do.
+PALETTE_MAX_MEAN_ERROR = 3.0
+PALETTE_MAX_P99_ERROR = 16
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class EncodedImage(NamedTuple):
+    """An icon variant in the form PDF image XObjects take it.
+
+    `data` (and `alpha`, the soft mask) are zlib streams with PNG row
+    predictors, i.e. FlateDecode with /Predictor 15. Indexed images carry
+    their RGB `palette`; `colors` is the number of components per pixel.
+    """
+
+    width: int
+    height: int
+    colors: int
+    bits: int
+    palette: Optional[bytes]
+    data: bytes
+    alpha: Optional[bytes]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + len(self.alpha or b"") + len(self.palette or b"")
+
+
+def _png(image: Image.Image) -> bytes:
+    out = BytesIO()
+    image.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def _chunks(png: bytes) -> Iterable[Tuple[bytes, bytes]]:
+    if not png.startswith(_PNG_SIGNATURE):
+        raise ValueError("Not a PNG file")
+    pos = len(_PNG_SIGNATURE)
+    while pos < len(png):
+        length = int.from_bytes(png[pos : pos + 4], "big")
+        yield png[pos + 4 : pos + 8], png[pos + 8 : pos + 8 + length]
+        pos += 12 + length
+
+
+def _parse_png(png: bytes) -> Tuple[int, int, int, int, Optional[bytes], bytes]:
+    """Return width, height, colors, bit depth, palette and the IDAT stream."""
+    header = b""
+    palette = None
+    data: List[bytes] = []
+    for kind, body in _chunks(png):
+        if kind == b"IHDR":
+            header = body
+        elif kind == b"PLTE":
+            palette = body
+        elif kind == b"IDAT":
+            data.append(body)
+    width = int.from_bytes(header[0:4], "big")
+    height = int.from_bytes(header[4:8], "big")
+    bits, color_type, interlace = header[8], header[9], header[12]
+    if interlace or color_type not in (0, 2, 3):
+        raise ValueError("Only non-interlaced grey, RGB or palette PNGs can be embedded")
+    colors = 3 if color_type == 2 else 1
+    return width, height, colors, bits, palette, b"".join(data)
+
+
+def _palette_error(rgb: Image.Image, indexed: Image.Image, visible: Image.Image) -> Tuple[float, int]:
+    """Mean and 99th percentile of the largest channel error over visible pixels."""
+    diff = ImageChops.difference(rgb, indexed.convert("RGB")).split()
+    worst = ImageChops.lighter(ImageChops.lighter(diff[0], diff[1]), diff[2])
+    histogram = worst.histogram(mask=visible)
+    total = sum(histogram)
+    if not total:
+        return 0.0, 0
+    mean = sum(value * count for value, count in enumerate(histogram)) / total
+    seen = 0
+    for value, count in enumerate(histogram):
+        seen += count
+        if seen >= total * 0.99:
+            return mean, value
+    return mean, 255
+
+
+def encode_image(image: Image.Image) -> Tuple[bytes, Optional[bytes]]:
+    """Encode an image as the smallest suitable colour PNG plus an alpha PNG.
+
+    The alpha PNG is None for opaque images. Colour under fully transparent
+    pixels is never seen, so it is flattened to white before compressing.
+    """
+    rgba = image.convert("RGBA")
+    alpha = rgba.getchannel("A")
+    opaque = alpha.getextrema() == (255, 255)
+    visible = alpha.point(lambda value: 255 if value else 0)
+    rgb = Image.new("RGB", rgba.size, "white")
+    rgb.paste(rgba.convert("RGB"), mask=visible)
+
+    candidates = [_png(rgb)]
+    r, g, b = rgb.split()
+    if ImageChops.difference(r, g).getbbox() is None and ImageChops.difference(g, b).getbbox() is None:
+        candidates.append(_png(r))
+    # Octree palettes keep flat areas flat and compress far better; median cut
+    # is kept as a fallback for icons with smooth gradients.
+    for method in (Image.Quantize.FASTOCTREE, Image.Quantize.MEDIANCUT):
+        indexed = rgb.quantize(256, method=method, dither=Image.Dither.NONE)
+        mean, p99 = _palette_error(rgb, indexed, visible)
+        if mean <= PALETTE_MAX_MEAN_ERROR and p99 <= PALETTE_MAX_P99_ERROR:
+            candidates.append(_png(indexed))
+    return min(candidates, key=len), None if opaque else _png(alpha)
+
+
+def load_encoded(color_png: bytes, alpha_png: Optional[bytes]) -> EncodedImage:
+    width, height, colors, bits, palette, data = _parse_png(color_png)
+    alpha = None
+    if alpha_png is not None:
+        alpha_width, alpha_height, _, alpha_bits, _, alpha = _parse_png(alpha_png)
+        if (alpha_width, alpha_height, alpha_bits) != (width, height, 8):
+            raise ValueError("Alpha plane does not match the colour image")
+    return EncodedImage(width, height, colors, bits, palette, data, alpha)
+
+
+def variant_name(source: Path, digest: str, longest_px: int) -> str:
+    return f"{source.stem}.{digest[:12]}.{longest_px}px.v{VARIANT_FORMAT}"
+
+
+class VariantStore:
+    """Encoded icon variants on disk, shared by every worker process.
+
+    Variants are named after the source's content hash and pixel size, so a
+    replaced icon never picks up an old variant. Without a directory nothing
+    is written and every variant is encoded in memory.
+    """
+
+    def __init__(self, directory: Optional[Path]) -> None:
+        self.directory = directory
+
+    def get(self, source: Path, digest: str, longest_px: int) -> Optional[EncodedImage]:
+        if self.directory is None:
+            return None
+        base = self.directory / variant_name(source, digest, longest_px)
+        try:
+            color = (base.parent / (base.name + ".png")).read_bytes()
+        except FileNotFoundError:
+            return None
+        alpha_path = base.parent / (base.name + ".alpha.png")
+        alpha = alpha_path.read_bytes() if alpha_path.exists() else None
+        return load_encoded(color, alpha)
+
+    def put(
+        self, source: Path, digest: str, longest_px: int, color: bytes, alpha: Optional[bytes]
+    ) -> None:
+        if self.directory is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        base = variant_name(source, digest, longest_px)
+        # Alpha first: a reader that sees the colour file also finds its mask.
+        if alpha is not None:
+            self._write(self.directory / (base + ".alpha.png"), alpha)
+        self._write(self.directory / (base + ".png"), color)
+
+    def prune(self, keep: Iterable[str]) -> int:
+        """Delete variant files whose base name is not in `keep`; return how many."""
+        if self.directory is None or not self.directory.exists():
+            return 0
+        keep = set(keep)
+        removed = 0
+        for path in self.directory.glob("*.png"):
+            name = path.name[: -len(".png")]
+            if name.endswith(".alpha"):
+                name = name[: -len(".alpha")]
+            if name not in keep:
+                path.unlink()
+                removed += 1
+        return removed
+
+    def _write(self, path: Path, data: bytes) -> None:
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_name, path)
+
+
+def source_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
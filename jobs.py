@@ -0,0 +1,586 @@
+import atexit
+import fcntl
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from render_pool import _resolve
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    finished REAL,
+    state TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    worker INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS rooms (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    selection TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker INTEGER,
+    claimed REAL,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS rooms_by_state ON rooms (state, job_id);
+CREATE TABLE IF NOT EXISTS workers (
+    pid INTEGER PRIMARY KEY,
+    seen REAL NOT NULL
+);
+"""
+
+# Room states: pending -> running -> done | failed.
+# Job states: queued -> running -> archiving -> complete | failed.
+UNFINISHED_ROOM = ("pending", "running")
+# Workers record a heartbeat between rooms; work held by a worker that has
+# not been seen for longer than `stale_after` seconds is handed to another.
+LIVE_WORKERS = "SELECT pid FROM workers WHERE seen > ?"
+# What JobStore.counts reports.
+COUNTS = (
+    "jobs_queued",
+    "jobs_running",
+    "jobs_complete",
+    "jobs_failed",
+    "rooms_pending",
+    "rooms_running",
+)
+# Idle workers delete expired jobs at most this often (seconds).
+PRUNE_INTERVAL = 300.0
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+class JobStore:
+    """Jobs, their rooms and the rendered files, in one directory.
+
+    `jobs.sqlite3` is the durable queue; every room row is claimed by one
+    worker at a time inside an IMMEDIATE transaction, so any number of
+    worker processes (also from several app processes) can share it. A room
+    or archive left behind by a worker that died is picked up again once the
+    worker stops sending heartbeats, or at once by recover().
+    Rendered rooms are kept as `<job>/<index>.pdf` until the job's archive
+    `<job>.zip` is written; `prune` deletes finished jobs and their archives.
+    """
+
+    def __init__(self, directory: Path, max_attempts: int = 3, stale_after: float = 60.0) -> None:
+        self.directory = directory
+        self.db_path = directory / "jobs.sqlite3"
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+        directory.mkdir(parents=True, exist_ok=True)
+        conn = _connect(self.db_path)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def archive_path(self, job_id: str) -> Path:
+        return self.directory / f"{job_id}.zip"
+
+    def _part_path(self, job_id: str, index: int) -> Path:
+        return self.directory / job_id / f"{index:06d}.pdf"
+
+    def submit(self, rooms: Sequence[Dict[str, Any]]) -> str:
+        """Queue rooms ({"name": archive entry, "selection": render args}); return the job id."""
+        job_id = uuid.uuid4().hex
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO jobs (id, created, state, total) VALUES (?, ?, 'queued', ?)",
+                (job_id, time.time(), len(rooms)),
+            )
+            conn.executemany(
+                "INSERT INTO rooms (job_id, idx, name, selection) VALUES (?, ?, ?, ?)",
+                [
+                    (job_id, index, room["name"], json.dumps(list(room["selection"])))
+                    for index, room in enumerate(rooms)
+                ],
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return job_id
+
+    def status(self, job_id: str, max_errors: int = 20) -> Optional[Dict[str, Any]]:
+        conn = _connect(self.db_path)
+        try:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(
+                conn.execute(
+                    "SELECT state, COUNT(*) FROM rooms WHERE job_id = ? GROUP BY state", (job_id,)
+                ).fetchall()
+            )
+            errors = conn.execute(
+                "SELECT idx, name, error FROM rooms WHERE job_id = ? AND state = 'failed' "
+                "ORDER BY idx LIMIT ?",
+                (job_id, max_errors),
+            ).fetchall()
+        finally:
+            conn.close()
+        done = counts.get("done", 0)
+        failed = counts.get("failed", 0)
+        return {
+            "id": job_id,
+            "state": job["state"],
+            "total": job["total"],
+            "done": done,
+            "failed": failed,
+            "pending": job["total"] - done - failed,
+            "progress": (done + failed) / job["total"] if job["total"] else 1.0,
+            "created": job["created"],
+            "finished": job["finished"],
+            "error": job["error"],
+            "errors": [
+                {"index": row["idx"], "name": row["name"], "error": row["error"]} for row in errors
+            ],
+        }
+
+    def recover(self) -> int:
+        """Requeue rooms and archives whose worker process is gone; return how many."""
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            recovered = 0
+            for (pid,) in conn.execute(
+                "SELECT DISTINCT worker FROM rooms WHERE state = 'running'"
+            ).fetchall():
+                if not _pid_alive(pid):
+                    recovered += conn.execute(
+                        "UPDATE rooms SET state = 'pending', worker = NULL "
+                        "WHERE state = 'running' AND worker IS ?",
+                        (pid,),
+                    ).rowcount
+            for row in conn.execute(
+                "SELECT id, worker FROM jobs WHERE state = 'archiving'"
+            ).fetchall():
+                if not _pid_alive(row["worker"]):
+                    conn.execute(
+                        "UPDATE jobs SET state = 'running', worker = NULL WHERE id = ?", (row["id"],)
+                    )
+                    recovered += 1
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return recovered
+
+    def release_own(self, conn: sqlite3.Connection) -> None:
+        """Requeue work recorded under our pid; it belonged to an earlier process."""
+        pid = os.getpid()
+        conn.execute(
+            "UPDATE rooms SET state = 'pending', worker = NULL WHERE state = 'running' AND worker = ?",
+            (pid,),
+        )
+        conn.execute(
+            "UPDATE jobs SET state = 'running', worker = NULL WHERE state = 'archiving' AND worker = ?",
+            (pid,),
+        )
+
+    def heartbeat(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO workers (pid, seen) VALUES (?, ?)", (os.getpid(), time.time())
+        )
+
+    def claim(self, conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+        """Mark the oldest runnable room as ours and return it (None when idle)."""
+        pid = os.getpid()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                room = conn.execute(
+                    "SELECT rowid, job_id, idx, name, selection, attempts FROM rooms "
+                    "WHERE state = 'pending' OR (state = 'running' AND worker NOT IN ("
+                    + LIVE_WORKERS
+                    + ")) ORDER BY rowid LIMIT 1",
+                    (now - self.stale_after,),
+                ).fetchone()
+                if room is None:
+                    conn.execute("COMMIT")
+                    return None
+                if room["attempts"] >= self.max_attempts:
+                    # It already took down or outlasted its earlier workers.
+                    conn.execute(
+                        "UPDATE rooms SET state = 'failed', error = ? WHERE rowid = ?",
+                        (f"Gave up after {room['attempts']} attempts", room["rowid"]),
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE rooms SET state = 'running', attempts = attempts + 1, worker = ?, "
+                    "claimed = ? WHERE rowid = ?",
+                    (pid, now, room["rowid"]),
+                )
+                conn.execute(
+                    "UPDATE jobs SET state = 'running' WHERE id = ? AND state = 'queued'",
+                    (room["job_id"],),
+                )
+                conn.execute("COMMIT")
+                return room
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def store_result(self, conn: sqlite3.Connection, room: sqlite3.Row, data: bytes) -> None:
+        path = self._part_path(room["job_id"], room["idx"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(path, data)
+        conn.execute(
+            "UPDATE rooms SET state = 'done', error = NULL WHERE job_id = ? AND idx = ?",
+            (room["job_id"], room["idx"]),
+        )
+
+    def store_error(self, conn: sqlite3.Connection, room: sqlite3.Row, error: str) -> None:
+        conn.execute(
+            "UPDATE rooms SET state = 'failed', error = ? WHERE job_id = ? AND idx = ?",
+            (error, room["job_id"], room["idx"]),
+        )
+
+    def finish_ready_jobs(self, conn: sqlite3.Connection) -> List[str]:
+        """Write the archive of every job whose rooms are all done or failed."""
+        finished = []
+        # Jobs left half-archived by a dead worker are taken over as well.
+        claimable = (
+            "(state IN ('queued', 'running') OR (state = 'archiving' AND worker NOT IN ("
+            + LIVE_WORKERS
+            + ")))"
+        )
+        stale = time.time() - self.stale_after
+        ready = conn.execute(
+            "SELECT id FROM jobs WHERE " + claimable + " AND NOT EXISTS ("
+            "SELECT 1 FROM rooms WHERE rooms.job_id = jobs.id AND rooms.state IN (?, ?))",
+            (stale,) + UNFINISHED_ROOM,
+        ).fetchall()
+        for (job_id,) in ready:
+            taken = conn.execute(
+                "UPDATE jobs SET state = 'archiving', worker = ? WHERE id = ? AND " + claimable,
+                (os.getpid(), job_id, stale),
+            ).rowcount
+            if taken:
+                self._write_archive(conn, job_id)
+                finished.append(job_id)
+        return finished
+
+    def _write_archive(self, conn: sqlite3.Connection, job_id: str) -> None:
+        import zipfile
+
+        rooms = conn.execute(
+            "SELECT idx, name FROM rooms WHERE job_id = ? AND state = 'done' ORDER BY idx", (job_id,)
+        ).fetchall()
+        if not rooms:
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', finished = ?, error = ? WHERE id = ?",
+                (time.time(), "No room could be rendered", job_id),
+            )
+            return
+        target = self.archive_path(job_id)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".zip.tmp")
+        os.close(fd)
+        try:
+            # The PDFs are already compressed; storing them keeps archiving cheap.
+            with zipfile.ZipFile(tmp_name, "w", compression=zipfile.ZIP_STORED) as archive:
+                for row in rooms:
+                    archive.write(self._part_path(job_id, row["idx"]), row["name"])
+            os.replace(tmp_name, target)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        conn.execute(
+            "UPDATE jobs SET state = 'complete', finished = ? WHERE id = ?", (time.time(), job_id)
+        )
+        shutil.rmtree(self.directory / job_id, ignore_errors=True)
+
+    def prune(self, max_age: float) -> int:
+        """Delete jobs that finished more than `max_age` seconds ago; return how many."""
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = [
+                job_id
+                for (job_id,) in conn.execute(
+                    "SELECT id FROM jobs WHERE finished IS NOT NULL AND finished < ?",
+                    (time.time() - max_age,),
+                ).fetchall()
+            ]
+            for job_id in expired:
+                conn.execute("DELETE FROM rooms WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        for job_id in expired:
+            try:
+                self.archive_path(job_id).unlink()
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(self.directory / job_id, ignore_errors=True)
+        return len(expired)
+
+    def counts(self) -> Dict[str, int]:
+        conn = _connect(self.db_path)
+        try:
+            jobs = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            rooms = dict(
+                conn.execute(
+                    "SELECT state, COUNT(*) FROM rooms WHERE state IN (?, ?) GROUP BY state",
+                    UNFINISHED_ROOM,
+                ).fetchall()
+            )
+        finally:
+            conn.close()
+        return {
+            "jobs_queued": jobs.get("queued", 0),
+            "jobs_running": jobs.get("running", 0) + jobs.get("archiving", 0),
+            "jobs_complete": jobs.get("complete", 0),
+            "jobs_failed": jobs.get("failed", 0),
+            "rooms_pending": rooms.get("pending", 0),
+            "rooms_running": rooms.get("running", 0),
+        }
+
+
+def run_worker(
+    directory: str,
+    target: str,
+    initializer: Optional[str],
+    poll_interval: float,
+    max_attempts: int,
+    stale_after: float,
+    max_age: Optional[float] = None,
+    stop=None,
+) -> None:
+    """Claim and render rooms until `stop` (an Event) is set.
+
+    While idle, jobs finished more than `max_age` seconds ago are deleted.
+    """
+    store = JobStore(Path(directory), max_attempts=max_attempts, stale_after=stale_after)
+    last_prune = float("-inf")
+    func = _resolve(target)
+    if initializer:
+        _resolve(initializer)()
+    conn = _connect(store.db_path)
+    try:
+        store.release_own(conn)
+        while stop is None or not stop.is_set():
+            store.heartbeat(conn)
+            room = store.claim(conn)
+            if room is None:
+                store.finish_ready_jobs(conn)
+                if max_age and time.monotonic() - last_prune > PRUNE_INTERVAL:
+                    last_prune = time.monotonic()
+                    store.prune(max_age)
+                time.sleep(poll_interval)
+                continue
+            try:
+                data, _ = func(*json.loads(room["selection"]))
+            except Exception as exc:  # pylint: disable=broad-except
+                store.store_error(conn, room, f"{type(exc).__name__}: {exc}")
+            else:
+                store.store_result(conn, room, data)
+            store.finish_ready_jobs(conn)
+    finally:
+        conn.close()
+
+
+class JobQueue:
+    """Background rendering of large batches by dedicated worker processes.
+
+    `target` and `initializer` are "module:function" strings, as for
+    RenderPool; `target(*selection)` must return (pdf_bytes, name). Work
+    survives restarts: rooms left running by a dead process are requeued
+    when the queue starts or checks on its workers, or once that process
+    misses its heartbeats. A single room must render within `stale_after`.
+
+    Nothing is created on disk until the queue is first used. Only one
+    process per directory runs workers: the first to take the lock on
+    `workers.lock`; in the others `start` does nothing until the owner
+    exits and one of them takes the lock over. Finished jobs and their
+    archives are deleted `max_age` seconds after they finish (None keeps
+    them).
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        target: str,
+        workers: int,
+        initializer: Optional[str] = None,
+        poll_interval: float = 0.5,
+        max_attempts: int = 3,
+        stale_after: float = 60.0,
+        max_age: Optional[float] = 7 * 86400,
+        start_method: str = "spawn",
+    ) -> None:
+        self.directory = directory
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+        self.max_age = max_age
+        self._store: Optional[JobStore] = None
+        self._owner_fd: Optional[int] = None
+        self.target = target
+        self.size = workers
+        self.initializer = initializer
+        self.poll_interval = poll_interval
+        self._ctx = multiprocessing.get_context(start_method)
+        # Created on start: a multiprocessing Event launches the resource tracker.
+        self._stop: Optional[Any] = None
+        self._processes: List[Any] = []
+        self._lock = threading.RLock()
+        self._started = False
+        self._close_at_exit = False
+        self.restarts = 0
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = JobStore(
+                        self.directory, max_attempts=self.max_attempts, stale_after=self.stale_after
+                    )
+        return self._store
+
+    @property
+    def owner(self) -> bool:
+        """Whether this process runs the workers of the directory."""
+        return self._owner_fd is not None
+
+    def _take_ownership(self) -> bool:
+        if self._owner_fd is None:
+            # The store creates the directory.
+            fd = os.open(self.store.directory / "workers.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            self._owner_fd = fd
+        return True
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started or self.size <= 0 or not self._take_ownership():
+                return
+            self.store.recover()
+            if self._stop is None:
+                self._stop = self._ctx.Event()
+            self._stop.clear()
+            self._processes = [self._spawn() for _ in range(self.size)]
+            self._started = True
+            if not self._close_at_exit:
+                atexit.register(self.close)
+                self._close_at_exit = True
+
+    def _spawn(self):
+        process = self._ctx.Process(
+            target=run_worker,
+            args=(
+                str(self.store.directory),
+                self.target,
+                self.initializer,
+                self.poll_interval,
+                self.store.max_attempts,
+                self.store.stale_after,
+                self.max_age,
+                self._stop,
+            ),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def ensure_workers(self) -> None:
+        """Start the workers, or replace any that died and requeue their rooms."""
+        if not self._started:
+            self.start()
+            return
+        with self._lock:
+            dead = [process for process in self._processes if not process.is_alive()]
+            if not dead:
+                return
+            self.store.recover()
+            for process in dead:
+                self._processes.remove(process)
+                self._processes.append(self._spawn())
+                self.restarts += 1
+
+    def submit(self, rooms: Sequence[Dict[str, Any]]) -> str:
+        job_id = self.store.submit(rooms)
+        self.ensure_workers()
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self.ensure_workers()
+        return self.store.status(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        if self._store is None and not (self.directory / "jobs.sqlite3").exists():
+            # No job was ever queued here: don't create the store just to count.
+            stats = dict.fromkeys(COUNTS, 0)
+        else:
+            stats = self.store.counts()
+        stats["workers"] = sum(1 for process in self._processes if process.is_alive())
+        stats["restarts"] = self.restarts
+        stats["owner"] = int(self.owner)
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            processes, self._processes = self._processes, []
+            self._started = False
+        if self._stop is not None:
+            self._stop.set()
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+        with self._lock:
+            if self._owner_fd is not None:
+                # Closing the file releases the lock for another process.
+                os.close(self._owner_fd)
+                self._owner_fd = None
@@ -0,0 +1,417 @@
+"""Where hazard icons, captions and signs go on a door sheet.
+
+Hazard layouts are described as data in LAYOUTS (keyed by hazard count) and
+turned into coordinates by a small engine. The geometry only depends on the
+page size, the icons' pixel sizes and the number of caption lines, so it is
+memoized on exactly those inputs and shared by every selection that matches.
+"""
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+CAPTION_FONT = "Helvetica-Bold"
+CAPTION_FONT_SIZE = 10.4
+CAPTION_LINE_HEIGHT = 10.4  # 20% smaller
+CAPTION_GAP = 12  # between an icon and its caption
+CAPTION_HEIGHT = 14
+MAX_SIGNS = 6
+# Space kept between a row of icons and the captions of the row above it.
+ROW_CLEARANCE = 4.0
+
+# Ruled areas of the risk templates (540 x 780 pt) that the hazards and the
+# signs have to stay inside. Placements are computed from page_boxes(); these
+# frames are what a plan is checked against.
+HAZARD_FRAME = (19.0, 132.0, 252.0, 322.0)
+SIGN_FRAME = (271.0, 132.0, 254.0, 322.0)
+
+
+class Box(NamedTuple):
+    x: float
+    y: float
+    width: float
+    height: float
+
+    @property
+    def top(self) -> float:
+        return self.y + self.height
+
+    @property
+    def right(self) -> float:
+        return self.x + self.width
+
+    def contains(self, other: "Box", tolerance: float = 0.01) -> bool:
+        return (
+            other.x >= self.x - tolerance
+            and other.y >= self.y - tolerance
+            and other.right <= self.right + tolerance
+            and other.top <= self.top + tolerance
+        )
+
+    def overlaps(self, other: "Box") -> bool:
+        return (
+            self.x < other.right
+            and other.x < self.right
+            and self.y < other.top
+            and other.y < self.top
+        )
+
+
+class IconPlacement(NamedTuple):
+    path: Path
+    x: float
+    y: float
+    width: float
+    height: float
+
+    @property
+    def box(self) -> Box:
+        return Box(self.x, self.y, self.width, self.height)
+
+
+class CaptionPlacement(NamedTuple):
+    """Caption lines centred on x; the first line's baseline is at y."""
+
+    x: float
+    y: float
+    lines: Tuple[str, ...]
+
+    @property
+    def box(self) -> Box:
+        """Approximate ink box of the caption text."""
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+
+        width = max(stringWidth(line, CAPTION_FONT, CAPTION_FONT_SIZE) for line in self.lines)
+        bottom = _caption_bottom(self.y, len(self.lines))
+        top = self.y + 0.72 * CAPTION_FONT_SIZE
+        return Box(self.x - width / 2, bottom, width, top - bottom)
+
+
+Placement = Union[IconPlacement, CaptionPlacement]
+
+
+class LayoutPlan(NamedTuple):
+    """Everything drawn over a risk template, in drawing order (PDF points).
+
+    `hazard_frame` and `sign_frame` are the template areas the placements
+    must stay inside.
+    """
+
+    page_width: float
+    page_height: float
+    hazard_frame: Box
+    sign_frame: Box
+    hazards: Tuple[Placement, ...]
+    signs: Tuple[IconPlacement, ...]
+
+    @property
+    def items(self) -> Tuple[Placement, ...]:
+        return self.hazards + self.signs
+
+    @property
+    def icons(self) -> List[IconPlacement]:
+        return [item for item in self.items if isinstance(item, IconPlacement)]
+
+    @property
+    def captions(self) -> List[CaptionPlacement]:
+        return [item for item in self.items if isinstance(item, CaptionPlacement)]
+
+
+class RowRule(NamedTuple):
+    """A row of hazard icons fitted into the same bounds.
+
+    Icon centres sit at `offsets` (fractions of the box width from its centre,
+    pushed `extra_offset` points further out). The icons' top edge is at
+    `top` = (fraction of the box height, points) above the box bottom, plus
+    the tallest icon's height when `top_follows_height` is set, but never
+    closer than ROW_CLEARANCE to the captions of the row above. Fitting
+    bounds are `max_width` = (fraction of the box width, points subtracted,
+    cap) and `max_height` = (fraction of the box height, points subtracted);
+    fitted sizes are then multiplied by `scale`.
+    """
+
+    offsets: Tuple[float, ...]
+    top: Tuple[float, float]
+    max_width: Tuple[float, float, float]
+    max_height: Tuple[float, float]
+    scale: float = 1.0
+    extra_offset: float = 0.0
+    top_follows_height: bool = False
+    caption_floor: float = 10.0
+
+
+class GridRule(NamedTuple):
+    """Fixed rows; hazards fill them in order, left to right."""
+
+    rows: Tuple[RowRule, ...]
+
+
+class StackRule(NamedTuple):
+    """A centred column of icons, each followed by its caption.
+
+    `raise_first` lifts the first icon (kept below the box top),
+    `lower_rest` drops the others (kept above the box bottom) and those are
+    lifted again by `multiline_lift` when any caption wraps.
+    """
+
+    spacing: float = 0.0
+    scale: float = 1.0
+    raise_first: Optional[float] = None
+    lower_rest: Optional[float] = None
+    multiline_lift: float = 0.0
+
+
+LayoutRule = Union[GridRule, StackRule]
+
+LAYOUTS: Dict[int, LayoutRule] = {
+    1: StackRule(raise_first=30),
+    2: StackRule(spacing=-10, scale=0.9, raise_first=40, lower_rest=30, multiline_lift=10),
+    # One large icon on top, two smaller side by side below it.
+    3: GridRule(
+        rows=(
+            RowRule(
+                offsets=(0.0,),
+                top=(1.0, -10.0),
+                max_width=(1.0, 40.0, 220.0),
+                max_height=(0.45, 0.0),
+                caption_floor=14.0,
+            ),
+            RowRule(
+                offsets=(-0.22, 0.22),
+                extra_offset=7.0,
+                top=(0.0, 90.0),
+                top_follows_height=True,
+                max_width=(0.5, 30.0, 150.0),
+                max_height=(0.22, 0.0),
+                scale=0.9,
+            ),
+        )
+    ),
+    # 2x2 grid.
+    4: GridRule(
+        rows=(
+            RowRule(
+                offsets=(-0.25, 0.25),
+                top=(1.0, -40.0),
+                max_width=(0.5, 40.0, 180.0),
+                max_height=(0.5, 50.0),
+                scale=1.3,
+                caption_floor=0.0,
+            ),
+            RowRule(
+                offsets=(-0.25, 0.25),
+                top=(0.5, 10.0),
+                max_width=(0.5, 40.0, 180.0),
+                max_height=(0.5, 50.0),
+                scale=1.3,
+                caption_floor=0.0,
+            ),
+        )
+    ),
+}
+DEFAULT_LAYOUT: LayoutRule = StackRule()
+
+# (icon x, y, width, height, caption x, caption first baseline) for one hazard.
+HazardGeometry = Tuple[float, float, float, float, float, float]
+# (pixel width, pixel height, caption line count) for one hazard.
+HazardInput = Tuple[int, int, int]
+
+
+def page_boxes(page_width: float, page_height: float) -> Tuple[Box, Box]:
+    """The hazard box on the left and the sign box on the right of the template."""
+    # Tune these values if the MAIN Hazards box changes position/size in the template.
+    hazard_box = Box(40, 80, page_width * 0.45, page_height * 0.45)
+    sign_x = min(page_width - hazard_box.width - 20, hazard_box.right + 20)
+    return hazard_box, Box(sign_x, hazard_box.y, hazard_box.width, hazard_box.height)
+
+
+def _fit(img_w: int, img_h: int, max_w: float, max_h: float) -> Tuple[float, float]:
+    """Scale to max_w wide, or to max_h tall if that would be too tall."""
+    scale = max_w / float(img_w)
+    target_h = img_h * scale
+    if target_h > max_h:
+        return img_w * (max_h / float(img_h)), max_h
+    return max_w, target_h
+
+
+def _caption_y(box: Box, base_y: float, line_count: int) -> float:
+    """First baseline of a caption, kept above the bottom of the hazard box."""
+    return max(base_y, box.y + 10 + (line_count - 1) * CAPTION_LINE_HEIGHT)
+
+
+def _caption_bottom(first_baseline: float, line_count: int) -> float:
+    """Lowest ink of a caption (baseline of its last line minus the descent)."""
+    return first_baseline - (line_count - 1) * CAPTION_LINE_HEIGHT - 0.22 * CAPTION_FONT_SIZE
+
+
+def _grid(rule: GridRule, box: Box, center_x: float, icons: Tuple[HazardInput, ...]) -> List[HazardGeometry]:
+    placed: List[HazardGeometry] = []
+    remaining = list(icons)
+    ceiling = box.top
+    for row in rule.rows:
+        cells, remaining = remaining[: len(row.offsets)], remaining[len(row.offsets) :]
+        if not cells:
+            break
+        max_w = min(row.max_width[2], box.width * row.max_width[0] - row.max_width[1])
+        max_h = box.height * row.max_height[0] - row.max_height[1]
+        sizes = []
+        for img_w, img_h, _ in cells:
+            w, h = _fit(img_w, img_h, max_w, max_h)
+            sizes.append((w * row.scale, h * row.scale))
+        top = box.y + box.height * row.top[0] + row.top[1]
+        if row.top_follows_height:
+            top += max(h for _, h in sizes)
+        top = min(top, ceiling)
+        for offset, (w, h), (_, _, lines) in zip(row.offsets, sizes, cells):
+            shift = box.width * abs(offset) + row.extra_offset
+            column_x = center_x + (shift if offset > 0 else -shift if offset < 0 else 0.0)
+            icon_y = top - h
+            base_y = max(icon_y - CAPTION_GAP, box.y + row.caption_floor)
+            caption_y = _caption_y(box, base_y, lines)
+            placed.append((column_x - w / 2, icon_y, w, h, column_x, caption_y))
+            ceiling = min(ceiling, _caption_bottom(caption_y, lines) - ROW_CLEARANCE)
+    return placed
+
+
+def _stack(rule: StackRule, box: Box, center_x: float, icons: Tuple[HazardInput, ...]) -> List[HazardGeometry]:
+    count = len(icons)
+    slot_height = max(60, (box.height - 40 - (count - 1) * rule.spacing) / count)
+    sizes = []
+    for img_w, img_h, _ in icons:
+        w, h = _fit(
+            img_w,
+            img_h,
+            min(160.0, box.width - 36.0),
+            max(50.0, slot_height - CAPTION_GAP - CAPTION_HEIGHT),
+        )
+        sizes.append((w * rule.scale, h * rule.scale))
+
+    total_height = sum(h + CAPTION_GAP + CAPTION_HEIGHT for _, h in sizes) + (count - 1) * rule.spacing
+    current_y = box.y + (box.height - total_height) / 2 + total_height
+    has_multiline = any(lines > 1 for _, _, lines in icons)
+
+    placed: List[HazardGeometry] = []
+    for index, ((w, h), (_, _, lines)) in enumerate(zip(sizes, icons)):
+        icon_y = current_y - h
+        if index == 0 and rule.raise_first is not None:
+            icon_y = min(icon_y + rule.raise_first, box.top - h - 4)
+        elif index > 0 and rule.lower_rest is not None:
+            icon_y = max(box.y + 4, icon_y - rule.lower_rest)
+            if has_multiline and rule.multiline_lift:
+                icon_y = min(icon_y + rule.multiline_lift, box.top - h - 4)
+        caption_y = _caption_y(box, max(icon_y - CAPTION_GAP, box.y + 10), lines)
+        placed.append((center_x - w / 2, icon_y, w, h, center_x, caption_y))
+        current_y = caption_y - (lines - 1) * CAPTION_LINE_HEIGHT - rule.spacing
+    return placed
+
+
+@lru_cache(maxsize=1024)
+def hazard_geometry(
+    page_width: float, page_height: float, icons: Tuple[HazardInput, ...]
+) -> Tuple[HazardGeometry, ...]:
+    """Icon and caption positions for hazards of the given sizes (memoized)."""
+    box, _ = page_boxes(page_width, page_height)
+    center_x = box.x + (box.width / 2) - 15  # slight left shift for alignment
+    rule = LAYOUTS.get(len(icons), DEFAULT_LAYOUT)
+    if isinstance(rule, GridRule):
+        return tuple(_grid(rule, box, center_x, icons))
+    return tuple(_stack(rule, box, center_x, icons))
+
+
+@lru_cache(maxsize=1024)
+def sign_geometry(
+    page_width: float, page_height: float, sizes: Tuple[Optional[Tuple[int, int]], ...]
+) -> Tuple[Optional[Tuple[float, float, float, float]], ...]:
+    """(x, y, width, height) of each sign in the 2-column grid of the sign box.
+
+    A missing icon (None) keeps its cell empty. Sizes beyond MAX_SIGNS are ignored.
+    """
+    _, box = page_boxes(page_width, page_height)
+    sizes = sizes[:MAX_SIGNS]
+    cols = 2
+    margin_x = 12
+    margin_y = 12
+    cell_w = (box.width - margin_x * (cols + 1)) / cols
+    target_size = min(80.0, cell_w)  # fixed size ~80pt
+    start_y = box.top - margin_y - target_size
+    placed: List[Optional[Tuple[float, float, float, float]]] = []
+    for index, size in enumerate(sizes):
+        if size is None:
+            placed.append(None)
+            continue
+        row, col = divmod(index, cols)
+        scale = target_size / max(size)
+        draw_w = size[0] * scale
+        draw_h = size[1] * scale
+        x = box.x + margin_x + col * (cell_w + margin_x) + (cell_w - draw_w) / 2
+        placed.append((x, start_y - row * (target_size + margin_y), draw_w, draw_h))
+    return tuple(placed)
+
+
+def caption_lines(entry: dict) -> Tuple[str, ...]:
+    return tuple(entry.get("lines") or [entry["caption"]])
+
+
+def plan_layout(
+    hazards: List[dict],
+    signs: List[dict],
+    page_width: float,
+    page_height: float,
+    icon_size: Callable[[Path], Tuple[int, int]],
+) -> LayoutPlan:
+    """Place the hazard icons with their captions and up to six signs.
+
+    `hazards` and `signs` are catalog entries (at least one hazard);
+    `icon_size` returns the pixel size of an icon file.
+    """
+    hazard_inputs = []
+    for hazard in hazards:
+        icon_path = hazard["icon_path"]
+        if not icon_path.exists():
+            raise FileNotFoundError(f"Hazard icon not found at: {icon_path}")
+        hazard_inputs.append(icon_size(icon_path) + (len(caption_lines(hazard)),))
+    hazard_items: List[Placement] = []
+    for hazard, (x, y, w, h, caption_x, caption_y) in zip(
+        hazards, hazard_geometry(page_width, page_height, tuple(hazard_inputs))
+    ):
+        hazard_items.append(IconPlacement(hazard["icon_path"], x, y, w, h))
+        hazard_items.append(CaptionPlacement(caption_x, caption_y, caption_lines(hazard)))
+
+    signs = signs[:MAX_SIGNS]
+    sign_sizes = tuple(
+        icon_size(sign["icon_path"]) if sign["icon_path"].exists() else None for sign in signs
+    )
+    sign_items = tuple(
+        IconPlacement(sign["icon_path"], *geometry)
+        for sign, geometry in zip(signs, sign_geometry(page_width, page_height, sign_sizes))
+        if geometry is not None
+    )
+    return LayoutPlan(
+        page_width,
+        page_height,
+        Box(*HAZARD_FRAME),
+        Box(*SIGN_FRAME),
+        tuple(hazard_items),
+        sign_items,
+    )
+
+
+def validate_plan(plan: LayoutPlan) -> List[str]:
+    """Describe every placement that leaves its box or overlaps another one."""
+    problems = []
+    page = Box(0, 0, plan.page_width, plan.page_height)
+    for group, box, items in (
+        ("hazard", plan.hazard_frame, plan.hazards),
+        ("sign", plan.sign_frame, plan.signs),
+    ):
+        for index, item in enumerate(items):
+            if not page.contains(item.box):
+                problems.append(f"{group} item {index} leaves the page: {item.box}")
+            elif not box.contains(item.box):
+                problems.append(f"{group} item {index} leaves the {group} box: {item.box}")
+    boxes = [item.box for item in plan.items]
+    for first in range(len(boxes)):
+        for second in range(first + 1, len(boxes)):
+            if boxes[first].overlaps(boxes[second]):
+                problems.append(f"items {first} and {second} overlap")
+    return problems
@@ -0,0 +1,572 @@
+import hashlib
+import re
+import zlib
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple, Union
+
+from PyPDF2.generic import (
+    ArrayObject,
+    ByteStringObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    FloatObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    StreamObject,
+    TextStringObject,
+)
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from icon_variants import EncodedImage
+from layout import (
+    CAPTION_FONT,
+    CAPTION_FONT_SIZE,
+    CAPTION_LINE_HEIGHT,
+    CaptionPlacement,
+    LayoutPlan,
+)
+from pdf_incremental import _content_as_form, document_id
+from template_registry import TemplateEntry
+from vector_icons import VectorIcon
+
+FONT_NAME = "/F1"
+# Fixed document information: no dates, so the same sheets give the same bytes.
+PRODUCER = "Door Sheet PDF Generator"
+# Page attributes the assembled page sets itself; every other one of the
+# template's page is copied. /StructParents indexes the structure tree in the
+# template's catalog, which is not copied, and pages made from the same
+# template would all claim the same entry in it.
+_OWN_PAGE_KEYS = frozenset(
+    ("/Type", "/Parent", "/MediaBox", "/Resources", "/Contents", "/StructParents")
+)
+# Page attributes whose objects belong to one page and point back to it (/P):
+# they are copied again for every page, with those references moved over.
+_PER_PAGE_KEYS = frozenset(("/Annots", "/B"))
+# Non-stream objects per object stream in optimized output.
+_OBJECTS_PER_STREAM = 200
+_NAME_TOKEN = re.compile(rb"/([^\x00\t\n\x0c\r /\[\]()<>{}%]*)")
+_NAME_ESCAPE = re.compile(rb"#([0-9A-Fa-f]{2})")
+
+
+def _num(value: float) -> str:
+    text = f"{value:.4f}".rstrip("0").rstrip(".")
+    return text if text not in ("", "-0") else "0"
+
+
+def _pdf_string(text: str) -> bytes:
+    data = text.encode("cp1252", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _flate(data: bytes, level: int = -1) -> EncodedStreamObject:
+    stream = EncodedStreamObject()
+    stream[NameObject("/Filter")] = NameObject("/FlateDecode")
+    stream._data = zlib.compress(data, level)
+    return stream
+
+
+def _recompressed(stream: StreamObject) -> Tuple[Optional[str], bytes]:
+    """The filter and data of a stream Flate-compressed at level 9, if that is smaller.
+
+    Streams with other filters or with predictors are returned as they are.
+    """
+    data = stream._data
+    flt = stream.get("/Filter")
+    if "/DecodeParms" in stream or flt not in (None, "/FlateDecode"):
+        return flt, data
+    try:
+        raw = zlib.decompress(data) if flt == "/FlateDecode" else data
+    except zlib.error:
+        return flt, data
+    packed = zlib.compress(raw, 9)
+    return (NameObject("/FlateDecode"), packed) if len(packed) < len(data) else (flt, data)
+
+
+def used_names(content: bytes) -> FrozenSet[str]:
+    """Every name token in a content stream: a superset of the resources it uses."""
+    return frozenset(
+        "/" + _NAME_ESCAPE.sub(lambda match: bytes([int(match.group(1), 16)]), token).decode("latin-1")
+        for token in _NAME_TOKEN.findall(content)
+    )
+
+
+def _image_stream(data: bytes, width: int, height: int, colors: int, bits: int) -> EncodedStreamObject:
+    """An image XObject around an already compressed stream with PNG predictors."""
+    stream = EncodedStreamObject()
+    stream[NameObject("/Type")] = NameObject("/XObject")
+    stream[NameObject("/Subtype")] = NameObject("/Image")
+    stream[NameObject("/Width")] = NumberObject(width)
+    stream[NameObject("/Height")] = NumberObject(height)
+    stream[NameObject("/BitsPerComponent")] = NumberObject(bits)
+    stream[NameObject("/Filter")] = NameObject("/FlateDecode")
+    parms = DictionaryObject()
+    parms[NameObject("/Predictor")] = NumberObject(15)
+    parms[NameObject("/Colors")] = NumberObject(colors)
+    parms[NameObject("/BitsPerComponent")] = NumberObject(bits)
+    parms[NameObject("/Columns")] = NumberObject(width)
+    stream[NameObject("/DecodeParms")] = parms
+    stream._data = data
+    return stream
+
+
+def _object_digest(obj) -> bytes:
+    """Identity of an object's serialized form, for writing identical objects once."""
+    digest = hashlib.sha256()
+    if isinstance(obj, StreamObject):
+        entries = DictionaryObject(obj)
+        entries.pop(NameObject("/Length"), None)
+        body = BytesIO()
+        entries.write_to_stream(body, None)
+        digest.update(b"stream")
+        digest.update(body.getvalue())
+        digest.update(obj._data)
+    else:
+        body = BytesIO()
+        obj.write_to_stream(body, None)
+        digest.update(body.getvalue())
+    return digest.digest()
+
+
+class SheetAssembler:
+    """Write a multi-page PDF of door sheets, embedding every shared asset once.
+
+    Each risk template page becomes one form XObject and each icon variant one
+    image XObject (with its alpha channel as a soft mask); pages only hold a
+    small content stream that places them. All pages share one resource
+    dictionary, so a page costs a few hundred bytes however many icons it
+    draws. Objects are emitted as soon as they are complete: `add_page`
+    returns the chunks for a page and any asset it uses for the first time,
+    and `close` the shared dictionaries, page tree and cross-reference table.
+    Stream data is passed on as its own chunk, not copied, so a sheet's
+    template and icon data stay shared with the caches they came from.
+
+    The output depends only on the pages added: there are no timestamps, and
+    the document ID is the MD5 of everything written before the trailer.
+
+    With `optimize`, the output is a PDF 1.5 file written for size instead:
+    all non-stream objects are packed into compressed object streams with a
+    cross-reference stream, identical objects (such as the fonts every risk
+    template embeds) are written once, template streams and page contents are
+    compressed at the highest level, and template resources the page never
+    names are left out. Streams are still written as they come; only the
+    small objects wait for `close`.
+    """
+
+    def __init__(self, optimize: bool = False) -> None:
+        self.optimize = optimize
+        self._position = 0
+        self._md5 = hashlib.md5()
+        self._offsets: Dict[int, int] = {}
+        self._next_number = 1
+        self._catalog_ref = self._reserve()
+        self._pages_ref = self._reserve()
+        self._resources_ref = self._reserve()
+        self._font_ref = self._reserve()
+        self._kids: List[IndirectObject] = []
+        self._xobjects = DictionaryObject()
+        self._templates: Dict[Tuple[str, str], str] = {}
+        self._images: Dict[Tuple[str, Tuple[int, int]], str] = {}
+        # Per template version: object number in the template -> number in this file.
+        self._imported: Dict[Tuple[str, str], Dict[int, int]] = {}
+        self._importing: Set[Tuple[str, str, int]] = set()
+        # Optimized output: numbers of written objects by content, objects to pack.
+        self._shared: Dict[bytes, int] = {}
+        self._packed: List[Tuple[int, bytes]] = []
+        # Packed object number -> (object stream number, index in it).
+        self._locations: Dict[int, Tuple[int, int]] = {}
+        self._started = False
+
+    @property
+    def asset_count(self) -> int:
+        """Distinct templates and images written so far."""
+        return len(self._xobjects)
+
+    def add_page(
+        self,
+        template: TemplateEntry,
+        plan: LayoutPlan,
+        icon_image: Callable[[Path, float, float], Union[EncodedImage, VectorIcon]],
+        background: bool = True,
+    ) -> List[bytes]:
+        """Add one sheet and return the chunks that can be sent for it now.
+
+        `icon_image(path, width_pt, height_pt)` returns the encoded variant
+        drawn for an icon, as `IconCache.variant` does, or a vector icon,
+        which is embedded once as a form XObject and scaled to each box.
+        Without `background` the page has the template's size but not its
+        content.
+        """
+        out: List[bytes] = []
+        self._start(out)
+
+        ops: List[bytes] = []
+        if background:
+            ops.append(f"q /{self._template_name(out, template)} Do Q".encode())
+        for item in plan.items:
+            if isinstance(item, CaptionPlacement):
+                for index, line in enumerate(item.lines):
+                    # Centred like reportlab's drawCentredString.
+                    x = item.x - stringWidth(line, CAPTION_FONT, CAPTION_FONT_SIZE) / 2
+                    y = item.y - index * CAPTION_LINE_HEIGHT
+                    ops.append(
+                        f"BT {FONT_NAME} {_num(CAPTION_FONT_SIZE)} Tf "
+                        f"1 0 0 1 {_num(x)} {_num(y)} Tm ".encode()
+                        + _pdf_string(line)
+                        + b" Tj ET"
+                    )
+                continue
+            image = icon_image(item.path, item.width, item.height)
+            # Fit and centre in the box like drawImage(preserveAspectRatio=True).
+            scale = min(item.width / image.width, item.height / image.height)
+            width, height = scale * image.width, scale * image.height
+            x = item.x + (item.width - width) / 2
+            y = item.y + (item.height - height) / 2
+            if isinstance(image, VectorIcon):
+                # The form is in the icon's page space: scale it and move its origin.
+                name = self._template_name(out, image, prefix="Fm")
+                x -= image.origin[0] * scale
+                y -= image.origin[1] * scale
+                ops.append(
+                    f"q {_num(scale)} 0 0 {_num(scale)} {_num(x)} {_num(y)} cm /{name} Do Q".encode()
+                )
+                continue
+            name = self._image_name(out, item.path, image)
+            ops.append(
+                f"q {_num(width)} 0 0 {_num(height)} {_num(x)} {_num(y)} cm /{name} Do Q".encode()
+            )
+
+        contents_ref = self._add(
+            out, _flate(b"\n".join(ops), 9 if self.optimize else -1), shared=True
+        )
+        page_ref = self._reserve()
+        page = DictionaryObject()
+        page[NameObject("/Type")] = NameObject("/Page")
+        page[NameObject("/Parent")] = self._pages_ref
+        page[NameObject("/MediaBox")] = ArrayObject(
+            FloatObject(value) for value in template.page.mediabox
+        )
+        for key in sorted(template.page.keys() - _OWN_PAGE_KEYS):
+            numbers = None
+            if key in _PER_PAGE_KEYS:
+                numbers = {template.page.indirect_reference.idnum: page_ref.idnum}
+            page[NameObject(key)] = self._import(
+                out, template, template.page.raw_get(key), numbers
+            )
+        page[NameObject("/Resources")] = self._resources_ref
+        page[NameObject("/Contents")] = contents_ref
+        self._write_object(out, page_ref, page)
+        self._kids.append(page_ref)
+        return out
+
+    def close(self) -> List[bytes]:
+        """Write the shared resources, page tree, catalog and cross-reference table."""
+        out: List[bytes] = []
+        self._start(out)
+
+        font = DictionaryObject()
+        font[NameObject("/Type")] = NameObject("/Font")
+        font[NameObject("/Subtype")] = NameObject("/Type1")
+        font[NameObject("/BaseFont")] = NameObject("/" + CAPTION_FONT)
+        font[NameObject("/Encoding")] = NameObject("/WinAnsiEncoding")
+        self._write_object(out, self._font_ref, font)
+
+        fonts = DictionaryObject()
+        fonts[NameObject(FONT_NAME)] = self._font_ref
+        resources = DictionaryObject()
+        resources[NameObject("/Font")] = fonts
+        resources[NameObject("/XObject")] = self._xobjects
+        self._write_object(out, self._resources_ref, resources)
+
+        pages = DictionaryObject()
+        pages[NameObject("/Type")] = NameObject("/Pages")
+        pages[NameObject("/Kids")] = ArrayObject(self._kids)
+        pages[NameObject("/Count")] = NumberObject(len(self._kids))
+        self._write_object(out, self._pages_ref, pages)
+
+        catalog = DictionaryObject()
+        catalog[NameObject("/Type")] = NameObject("/Catalog")
+        catalog[NameObject("/Pages")] = self._pages_ref
+        self._write_object(out, self._catalog_ref, catalog)
+
+        info = DictionaryObject()
+        info[NameObject("/Producer")] = TextStringObject(PRODUCER)
+        info_ref = self._add(out, info)
+        if self.optimize:
+            self._write_object_streams(out)
+            self._write_xref_stream(out, info_ref)
+            return out
+
+        xref_position = self._position
+        size = self._next_number
+        lines = [f"xref\n0 {size}\n".encode(), b"0000000000 65535 f \n"]
+        for number in range(1, size):
+            lines.append(f"{self._offsets[number]:010d} 00000 n \n".encode())
+        self._write(out, b"".join(lines))
+        trailer = DictionaryObject()
+        trailer[NameObject("/Size")] = NumberObject(size)
+        trailer[NameObject("/Root")] = self._catalog_ref
+        trailer[NameObject("/Info")] = info_ref
+        trailer[NameObject("/ID")] = document_id(None, self._md5.digest())
+        tail = BytesIO()
+        tail.write(b"trailer\n")
+        trailer.write_to_stream(tail, None)
+        tail.write(f"\nstartxref\n{xref_position}\n%%EOF\n".encode())
+        self._write(out, tail.getvalue())
+        return out
+
+    def _start(self, out: List[bytes]) -> None:
+        if not self._started:
+            version = b"1.5" if self.optimize else b"1.4"
+            self._write(out, b"%PDF-" + version + b"\n%\xe2\xe3\xcf\xd3\n")
+            self._started = True
+
+    def _write_object_streams(self, out: List[bytes]) -> None:
+        packed, self._packed = self._packed, []
+        for first in range(0, len(packed), _OBJECTS_PER_STREAM):
+            group = packed[first : first + _OBJECTS_PER_STREAM]
+            ref = self._reserve()
+            header: List[bytes] = []
+            bodies: List[bytes] = []
+            offset = 0
+            for number, body in group:
+                header.append(f"{number} {offset}".encode())
+                bodies.append(body)
+                offset += len(body) + 1
+            head = b" ".join(header) + b"\n"
+            stream = _flate(head + b"\n".join(bodies), 9)
+            stream[NameObject("/Type")] = NameObject("/ObjStm")
+            stream[NameObject("/N")] = NumberObject(len(group))
+            stream[NameObject("/First")] = NumberObject(len(head))
+            self._write_object(out, ref, stream)
+            for index, (number, _) in enumerate(group):
+                self._locations[number] = (ref.idnum, index)
+
+    def _write_xref_stream(self, out: List[bytes], info_ref: IndirectObject) -> None:
+        ref = self._reserve()
+        size = self._next_number
+        self._offsets[ref.idnum] = self._position
+        rows = [(0, 0, 65535)]
+        for number in range(1, size):
+            location = self._locations.get(number)
+            rows.append((2, *location) if location is not None else (1, self._offsets[number], 0))
+        widths = [1] + [
+            max(1, (max(row[column] for row in rows).bit_length() + 7) // 8) for column in (1, 2)
+        ]
+        data = b"".join(
+            b"".join(value.to_bytes(width, "big") for value, width in zip(row, widths))
+            for row in rows
+        )
+        xref = _flate(data, 9)
+        xref[NameObject("/Type")] = NameObject("/XRef")
+        xref[NameObject("/Size")] = NumberObject(size)
+        xref[NameObject("/W")] = ArrayObject(NumberObject(width) for width in widths)
+        xref[NameObject("/Root")] = self._catalog_ref
+        xref[NameObject("/Info")] = info_ref
+        xref[NameObject("/ID")] = document_id(None, self._md5.digest())
+        position = self._position
+        self._write_object(out, ref, xref)
+        self._write(out, f"startxref\n{position}\n%%EOF\n".encode())
+
+    def _template_name(self, out: List[bytes], template: TemplateEntry, prefix: str = "Tpl") -> str:
+        key = (template.key, template.version)
+        name = self._templates.get(key)
+        if name is None:
+            form = _content_as_form(template.page)
+            if self.optimize:
+                if 0 not in template.recompressed:
+                    template.recompressed[0] = _recompressed(form)
+                flt, form._data = template.recompressed[0]
+                if flt is not None:
+                    form[NameObject("/Filter")] = flt
+            form[NameObject("/Type")] = NameObject("/XObject")
+            form[NameObject("/Subtype")] = NameObject("/Form")
+            form[NameObject("/BBox")] = ArrayObject(
+                FloatObject(value) for value in template.page.mediabox
+            )
+            resources = template.page.raw_get("/Resources") if "/Resources" in template.page else None
+            if resources is not None and self.optimize:
+                resources = self._used_resources(template, form, resources.get_object())
+            form[NameObject("/Resources")] = (
+                self._import(out, template, resources) if resources is not None else DictionaryObject()
+            )
+            name = self._templates[key] = f"{prefix}{len(self._templates)}"
+            self._xobjects[NameObject("/" + name)] = self._add(out, form, shared=True)
+        return name
+
+    def _used_resources(
+        self, template: TemplateEntry, form: StreamObject, resources: DictionaryObject
+    ) -> DictionaryObject:
+        """The template's resources without the named ones its content never uses."""
+        used = template.content_names
+        if used is None:
+            flt = form.get("/Filter")
+            if flt not in (None, "/FlateDecode"):
+                return resources
+            content = zlib.decompress(form._data) if flt == "/FlateDecode" else form._data
+            used = template.content_names = used_names(content)
+        pruned = DictionaryObject()
+        for category, value in resources.items():
+            if category == "/ProcSet":
+                continue  # ignored by readers since PDF 1.4
+            entries = value.get_object()
+            if not isinstance(entries, DictionaryObject):
+                pruned[category] = value
+                continue
+            kept = DictionaryObject()
+            for name, entry in entries.items():
+                if name in used:
+                    kept[name] = entry
+            if kept:
+                pruned[category] = kept
+        return pruned
+
+    def _image_name(self, out: List[bytes], path: Path, image: EncodedImage) -> str:
+        key = (str(path), (image.width, image.height))
+        name = self._images.get(key)
+        if name is None:
+            if image.palette is not None:
+                color_space = ArrayObject(
+                    [
+                        NameObject("/Indexed"),
+                        NameObject("/DeviceRGB"),
+                        NumberObject(len(image.palette) // 3 - 1),
+                        ByteStringObject(image.palette),
+                    ]
+                )
+            else:
+                color_space = NameObject("/DeviceRGB" if image.colors == 3 else "/DeviceGray")
+            xobject = _image_stream(image.data, image.width, image.height, image.colors, image.bits)
+            xobject[NameObject("/ColorSpace")] = color_space
+            if image.alpha is not None:
+                mask = _image_stream(image.alpha, image.width, image.height, 1, 8)
+                mask[NameObject("/ColorSpace")] = NameObject("/DeviceGray")
+                xobject[NameObject("/SMask")] = self._add(out, mask, shared=True)
+            name = self._images[key] = f"Im{len(self._images)}"
+            self._xobjects[NameObject("/" + name)] = self._add(out, xobject, shared=True)
+        return name
+
+    def _import(
+        self,
+        out: List[bytes],
+        template: TemplateEntry,
+        obj,
+        numbers: Optional[Dict[int, int]] = None,
+    ):
+        """Copy an object of the template's file into this one, renumbering references.
+
+        Objects are copied once per template version, unless `numbers` (the
+        template's object numbers -> this file's) is passed for a fresh copy.
+        """
+        if isinstance(obj, IndirectObject):
+            if numbers is None:
+                numbers = self._imported.setdefault((template.key, template.version), {})
+            number = numbers.get(obj.idnum)
+            if number is None:
+                if self.optimize:
+                    return self._import_shared(out, template, obj, numbers)
+                ref = self._reserve()
+                number = numbers[obj.idnum] = ref.idnum
+                self._write_object(
+                    out, ref, self._import(out, template, obj.get_object(), numbers)
+                )
+            return IndirectObject(number, 0, None)
+        if isinstance(obj, StreamObject):
+            copy = EncodedStreamObject() if isinstance(obj, EncodedStreamObject) else DecodedStreamObject()
+            for name, value in obj.items():
+                copy[name] = self._import(out, template, value, numbers)
+            copy._data = obj._data
+            return copy
+        if isinstance(obj, DictionaryObject):
+            copy = DictionaryObject()
+            for name, value in obj.items():
+                copy[name] = self._import(out, template, value, numbers)
+            return copy
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._import(out, template, value, numbers) for value in obj)
+        return obj
+
+    def _import_shared(
+        self,
+        out: List[bytes],
+        template: TemplateEntry,
+        ref: IndirectObject,
+        numbers: Dict[int, int],
+    ) -> IndirectObject:
+        """Import an object after what it references, so identical ones are written once.
+
+        An object reached again while its own references are being imported
+        (a reference cycle) is given its number at once and not shared.
+        """
+        key = (template.key, template.version, ref.idnum)
+        if key in self._importing:
+            reserved = self._reserve()
+            numbers[ref.idnum] = reserved.idnum
+            return reserved
+        self._importing.add(key)
+        try:
+            copy = self._import(out, template, ref.get_object(), numbers)
+        finally:
+            self._importing.discard(key)
+        if isinstance(copy, StreamObject):
+            if ref.idnum not in template.recompressed:
+                template.recompressed[ref.idnum] = _recompressed(copy)
+            flt, copy._data = template.recompressed[ref.idnum]
+            if flt is not None:
+                copy[NameObject("/Filter")] = flt
+        number = numbers.get(ref.idnum)
+        if number is not None:
+            self._write_object(out, IndirectObject(number, 0, None), copy)
+        else:
+            number = numbers[ref.idnum] = self._add(out, copy, shared=True).idnum
+        return IndirectObject(number, 0, None)
+
+    def _reserve(self) -> IndirectObject:
+        number = self._next_number
+        self._next_number += 1
+        return IndirectObject(number, 0, None)
+
+    def _add(self, out: List[bytes], obj, shared: bool = False) -> IndirectObject:
+        """Write a new object; with `shared`, reuse an identical one in optimized output."""
+        digest = b""
+        if self.optimize and shared:
+            digest = _object_digest(obj)
+            number = self._shared.get(digest)
+            if number is not None:
+                return IndirectObject(number, 0, None)
+        ref = self._reserve()
+        self._write_object(out, ref, obj)
+        if digest:
+            self._shared[digest] = ref.idnum
+        return ref
+
+    def _write_object(self, out: List[bytes], ref: IndirectObject, obj) -> None:
+        if self.optimize and not isinstance(obj, StreamObject):
+            # Packed into an object stream by close().
+            body = BytesIO()
+            obj.write_to_stream(body, None)
+            self._packed.append((ref.idnum, body.getvalue()))
+            return
+        self._offsets[ref.idnum] = self._position
+        header = BytesIO()
+        header.write(f"{ref.idnum} 0 obj\n".encode())
+        if isinstance(obj, StreamObject):
+            # Written like StreamObject.write_to_stream, minus the copy of its data.
+            entries = DictionaryObject(obj)
+            entries[NameObject("/Length")] = NumberObject(len(obj._data))
+            entries.write_to_stream(header, None)
+            header.write(b"\nstream\n")
+            self._write(out, header.getvalue())
+            self._write(out, obj._data)
+            self._write(out, b"\nendstream\nendobj\n")
+            return
+        obj.write_to_stream(header, None)
+        header.write(b"\nendobj\n")
+        self._write(out, header.getvalue())
+
+    def _write(self, out: List[bytes], data: bytes) -> None:
+        out.append(data)
+        self._md5.update(data)
+        self._position += len(data)
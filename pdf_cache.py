@@ -0,0 +1,308 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+
+def make_key(parts: dict) -> str:
+    """Stable content hash of a (JSON-serialisable) description of a sheet."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_version(path: Path) -> str:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return "missing"
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def read_file(path: Path) -> Tuple[bytes, os.stat_result]:
+    """Read a whole file, with the stat of the file that was read.
+
+    Assets are read into memory rather than mapped: a file copied over in
+    place would change (or fault, if truncated) under a mapping.
+    """
+    with path.open("rb") as handle:
+        return handle.read(), os.fstat(handle.fileno())
+
+
+class PdfCache:
+    """Generated PDFs by content key: an in-memory LRU over a shared disk store.
+
+    The disk store is written with a temporary file and an atomic rename, so
+    several worker processes can read and fill the same directory safely.
+    Sheets put with their source files can be discarded when one of those
+    changes: on disk the sources are listed in a `<key>.src` file next to the
+    sheet, whichever process wrote it, and the last `max_tracked` are also
+    remembered in memory for the copies this process holds.
+
+    The disk store is kept under `max_disk_bytes` by deleting the sheets
+    least recently written or read, and sheets unused for `max_disk_age`
+    seconds are deleted (None: no limit). `prune_disk` does that; each
+    process runs it after every `prune_every` sheets it writes.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int,
+        directory: Optional[Path] = None,
+        max_tracked: int = 100000,
+        max_disk_bytes: Optional[int] = None,
+        max_disk_age: Optional[float] = None,
+        prune_every: int = 256,
+    ) -> None:
+        self.max_memory_bytes = max_memory_bytes
+        self.directory = directory
+        self.max_tracked = max_tracked
+        self.max_disk_bytes = max_disk_bytes
+        self.max_disk_age = max_disk_age
+        self.prune_every = prune_every
+        self._writes_since_prune = 0
+        self.disk_pruned = 0
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._sources: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+        data = self._read_disk(key)
+        if data is not None:
+            self._remember(key, data)
+            with self._lock:
+                self.disk_hits += 1
+            return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def open(self, key: str) -> Optional[Union[bytes, BinaryIO]]:
+        """Like `get`, but return a disk hit as an open file instead of reading it."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+        path = self._path(key)
+        if path is not None:
+            try:
+                handle = path.open("rb")
+            except FileNotFoundError:
+                pass
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                _touch(path)
+                return handle
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes, sources: Iterable[Path] = ()) -> None:
+        self._remember(key, data)
+        self._track(key, sources)
+        self._write_disk(key, [data])
+
+    def put_chunks(self, key: str, chunks: List[bytes], sources: Iterable[Path] = ()) -> None:
+        """Store a sheet given as chunks without joining them, if there is a disk store.
+
+        It is then only written to disk; `open` serves it from there.
+        """
+        self._track(key, sources)
+        if self.directory is None:
+            self._remember(key, b"".join(chunks))
+        else:
+            self._write_disk(key, chunks)
+
+    def on_disk(self, key: str) -> bool:
+        path = self._path(key)
+        return path is not None and path.exists()
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            data = self._memory.pop(key, None)
+            if data is not None:
+                self.memory_bytes -= len(data)
+        path = self._path(key)
+        if path is not None:
+            for stale in (path, path.with_suffix(".src")):
+                _unlink(stale)
+
+    def discard_dependents(self, paths: Iterable[Path]) -> int:
+        """Discard the sheets put with any of `paths` among their sources; return how many."""
+        changed = {str(path) for path in paths}
+        with self._lock:
+            keys = {key for key, sources in self._sources.items() if sources & changed}
+            for key in keys:
+                del self._sources[key]
+        if self.directory is not None:
+            for listing in self.directory.glob("*/*.src"):
+                try:
+                    sources = set(listing.read_text(encoding="utf-8").splitlines())
+                except FileNotFoundError:
+                    continue  # discarded by another process meanwhile
+                if sources & changed:
+                    keys.add(listing.stem)
+        for key in keys:
+            self.discard(key)
+        return len(keys)
+
+    def prune_disk(self) -> Dict[str, int]:
+        """Delete disk entries over the size and age limits; return what was removed and kept."""
+        removed = removed_bytes = 0
+        if self.directory is None:
+            return {"removed": 0, "removed_bytes": 0, "kept": 0, "kept_bytes": 0}
+        now = time.time()
+        sheets = []
+        for path in self.directory.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.suffix == ".pdf":
+                sheets.append((stat.st_mtime, stat.st_size, path))
+            elif path.suffix == ".tmp" and now - stat.st_mtime > 3600:
+                # Left behind by a process that died while writing.
+                _unlink(path)
+            elif path.suffix == ".src" and not path.with_suffix(".pdf").exists():
+                if now - stat.st_mtime > 3600:  # not a sheet being written
+                    _unlink(path)
+        sheets.sort()
+        total = sum(size for _, size, _ in sheets)
+        for mtime, size, path in sheets:
+            too_old = self.max_disk_age is not None and now - mtime > self.max_disk_age
+            too_big = self.max_disk_bytes is not None and total > self.max_disk_bytes
+            if not (too_old or too_big):
+                break
+            self.discard(path.stem)
+            total -= size
+            removed += 1
+            removed_bytes += size
+        with self._lock:
+            self.disk_pruned += removed
+        return {
+            "removed": removed,
+            "removed_bytes": removed_bytes,
+            "kept": len(sheets) - removed,
+            "kept_bytes": total,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hits": self.memory_hits + self.disk_hits,
+                "misses": self.misses,
+                "tracked": len(self._sources),
+                "disk_pruned": self.disk_pruned,
+            }
+
+    def _track(self, key: str, sources: Iterable[Path]) -> None:
+        sources = frozenset(str(path) for path in sources)
+        if not sources:
+            return
+        path = self._path(key)
+        if path is not None:
+            # Written before the sheet, so no sheet on disk lacks its listing.
+            text = "".join(f"{source}\n" for source in sorted(sources))
+            self._write_file(path.with_suffix(".src"), [text.encode("utf-8")])
+        with self._lock:
+            self._sources[key] = sources
+            self._sources.move_to_end(key)
+            while len(self._sources) > self.max_tracked:
+                self._sources.popitem(last=False)
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self.memory_bytes -= len(previous)
+            self._memory[key] = data
+            self.memory_bytes += len(data)
+            while self.memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+
+    def _path(self, key: str) -> Optional[Path]:
+        if self.directory is None:
+            return None
+        return self.directory / key[:2] / f"{key}.pdf"
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        _touch(path)
+        return data
+
+    def _write_disk(self, key: str, chunks: Iterable[bytes]) -> None:
+        path = self._path(key)
+        if path is None:
+            return
+        self._write_file(path, chunks)
+        if self.max_disk_bytes is None and self.max_disk_age is None:
+            return
+        with self._lock:
+            self._writes_since_prune += 1
+            due = self._writes_since_prune >= self.prune_every
+            if due:
+                self._writes_since_prune = 0
+        if due:
+            self.prune_disk()
+
+    def _write_file(self, path: Path, chunks: Iterable[bytes]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.writelines(chunks)
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+
+
+def _touch(path: Path) -> None:
+    """Mark a disk entry as used, so pruning deletes it last."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass  # gone, or a read-only store
+
+
+def _unlink(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,282 @@
+import hashlib
+import re
+import zlib
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from PyPDF2._page import PageObject
+from PyPDF2.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    ByteStringObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    StreamObject,
+)
+
+OVERLAY_NAME = "/DoorSheetOverlay"
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)\s+%%EOF\s*$")
+_SIZE = re.compile(rb"/Size\s+(\d+)")
+
+
+class IncrementalBase:
+    """What an incremental update needs to know about the original file."""
+
+    def __init__(self, data: bytes, page: PageObject, trailer: DictionaryObject) -> None:
+        match = _STARTXREF.search(data[-64:])
+        if match is None:
+            raise ValueError("Template PDF has no trailing startxref")
+        self.data = data
+        self.startxref = int(match.group(1))
+        # Classic "xref" tables get a classic update, xref streams a stream.
+        self.classic = data[self.startxref : self.startxref + 4] == b"xref"
+        size_from = data.find(b"trailer", self.startxref) if self.classic else self.startxref
+        size = _SIZE.search(data, size_from, size_from + 1024)
+        if size is None:
+            raise ValueError("Template PDF cross-reference section has no /Size")
+        self.size = int(size.group(1))
+        self.page = page
+        self.page_ref = page.indirect_reference
+        self.root = trailer.raw_get("/Root")
+        self.info = trailer.raw_get("/Info") if "/Info" in trailer else None
+        # The permanent half of the /ID every update keeps; a template without
+        # one gets a digest of its bytes, so it is the same for all its sheets.
+        document_id = trailer.get("/ID")
+        self.id = (
+            bytes(getattr(document_id[0], "original_bytes", document_id[0]))
+            if document_id
+            else hashlib.md5(data).digest()
+        )
+        self.mediabox = ArrayObject(page.mediabox)
+        self.separator = b"" if data.endswith(b"\n") else b"\n"
+        self.contents = self._contents_refs()
+        resources = page.get("/Resources")
+        self.resources = resources.get_object() if resources is not None else DictionaryObject()
+        xobjects = self.resources.get("/XObject")
+        self.xobjects = xobjects.get_object() if xobjects is not None else DictionaryObject()
+
+    def _contents_refs(self) -> List[IndirectObject]:
+        contents = self.page.raw_get("/Contents") if "/Contents" in self.page else None
+        if contents is None:
+            return []
+        resolved = contents.get_object()
+        if isinstance(resolved, ArrayObject):
+            return list(resolved)
+        return [contents]
+
+
+class _Update:
+    """Objects appended after the original file, numbered from its /Size."""
+
+    def __init__(self, base: IncrementalBase) -> None:
+        self.base = base
+        self.next_number = base.size
+        self.objects: List[Tuple[int, object]] = []
+        self._numbers: Dict[int, int] = {}
+
+    def add(self, obj) -> IndirectObject:
+        number = self.next_number
+        self.next_number += 1
+        self.objects.append((number, obj))
+        return IndirectObject(number, 0, None)
+
+    def import_object(self, obj):
+        """Copy an object from the overlay PDF, renumbering its references."""
+        if isinstance(obj, IndirectObject):
+            key = obj.idnum
+            if key not in self._numbers:
+                number = self.next_number
+                self.next_number += 1
+                self._numbers[key] = number
+                slot = len(self.objects)
+                self.objects.append((number, None))
+                self.objects[slot] = (number, self.import_object(obj.get_object()))
+            return IndirectObject(self._numbers[key], 0, None)
+        if isinstance(obj, StreamObject):
+            copy = EncodedStreamObject() if isinstance(obj, EncodedStreamObject) else DecodedStreamObject()
+            for name, value in obj.items():
+                copy[name] = self.import_object(value)
+            copy._data = obj._data
+            return copy
+        if isinstance(obj, DictionaryObject):
+            copy = DictionaryObject()
+            for name, value in obj.items():
+                copy[name] = self.import_object(value)
+            return copy
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self.import_object(value) for value in obj)
+        return obj
+
+
+def _stream(data: bytes, **entries) -> StreamObject:
+    stream = EncodedStreamObject()
+    stream[NameObject("/Filter")] = NameObject("/FlateDecode")
+    for name, value in entries.items():
+        stream[NameObject("/" + name)] = value
+    stream._data = zlib.compress(data)
+    return stream
+
+
+def document_id(permanent: Optional[bytes], digest: bytes) -> ArrayObject:
+    """A trailer /ID whose changing half is a digest of the file's content.
+
+    Identical output therefore has an identical /ID, unlike the random IDs
+    PDF writers usually generate. Without a `permanent` half (a new file)
+    both halves are the digest.
+    """
+    return ArrayObject([ByteStringObject(permanent or digest), ByteStringObject(digest)])
+
+
+def _content_as_form(page: PageObject) -> StreamObject:
+    """Reuse a page's single (already encoded) content stream as a form body."""
+    contents = page.get("/Contents")
+    contents = contents.get_object() if contents is not None else None
+    if isinstance(contents, EncodedStreamObject) and "/DecodeParms" not in contents:
+        form = EncodedStreamObject()
+        if "/Filter" in contents:
+            form[NameObject("/Filter")] = contents["/Filter"]
+        form._data = contents._data
+        return form
+    if isinstance(contents, StreamObject):
+        return _stream(contents.get_data())
+    if isinstance(contents, ArrayObject):
+        return _stream(b"\n".join(part.get_object().get_data() for part in contents))
+    return _stream(b"")
+
+
+def append_overlay(base: IncrementalBase, overlay_page: PageObject) -> List[bytes]:
+    """Return the original file followed by an incremental update that draws
+    `overlay_page` on top of its page, as chunks.
+
+    The first chunk is the template's own bytes, shared rather than copied.
+
+    The overlay is wrapped in a form XObject with its own resources, so none of
+    its resource names can clash with the template's. Only the page dictionary
+    of the template is rewritten; every other original object is left as is.
+    """
+    update = _Update(base)
+
+    overlay_resources = overlay_page.get("/Resources")
+    form = _content_as_form(overlay_page)
+    form[NameObject("/Type")] = NameObject("/XObject")
+    form[NameObject("/Subtype")] = NameObject("/Form")
+    form[NameObject("/BBox")] = base.mediabox
+    form[NameObject("/Resources")] = (
+        update.import_object(overlay_resources.get_object())
+        if overlay_resources is not None
+        else DictionaryObject()
+    )
+    form_ref = update.add(form)
+    save_ref = update.add(_stream(b"q\n"))
+    draw_ref = update.add(_stream(f"Q\nq {OVERLAY_NAME} Do Q\n".encode()))
+
+    xobjects = DictionaryObject(base.xobjects)
+    xobjects[NameObject(OVERLAY_NAME)] = form_ref
+    resources = DictionaryObject(base.resources)
+    resources[NameObject("/XObject")] = xobjects
+
+    page = DictionaryObject()
+    for name in base.page:
+        page[NameObject(name)] = base.page.raw_get(name)
+    page[NameObject("/Contents")] = ArrayObject([save_ref] + base.contents + [draw_ref])
+    page[NameObject("/Resources")] = resources
+
+    # Only the update is written here; offsets count the original bytes too.
+    start = len(base.data) + len(base.separator)
+    out = BytesIO()
+    offsets: Dict[int, int] = {}
+    entries = [(base.page_ref.idnum, base.page_ref.generation, page)]
+    entries += [(number, 0, obj) for number, obj in update.objects]
+    for number, generation, obj in entries:
+        offsets[number] = start + out.tell()
+        out.write(f"{number} {generation} obj\n".encode())
+        obj.write_to_stream(out, None)
+        out.write(b"\nendobj\n")
+
+    generations = {base.page_ref.idnum: base.page_ref.generation}
+    # The first half stays the template's own ID, as for any incremental update.
+    ids = document_id(base.id, hashlib.md5(out.getvalue()).digest())
+    if base.classic:
+        _write_xref_table(out, start, base, offsets, generations, update.next_number, ids)
+    else:
+        _write_xref_stream(out, start, base, offsets, generations, update.next_number, ids)
+    return [base.data, base.separator, out.getvalue()]
+
+
+def _runs(numbers: List[int]) -> List[Tuple[int, int]]:
+    """Group sorted object numbers into (first, count) subsections."""
+    runs: List[Tuple[int, int]] = []
+    for number in numbers:
+        if runs and runs[-1][0] + runs[-1][1] == number:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((number, 1))
+    return runs
+
+
+def _write_xref_table(
+    out: BytesIO,
+    start: int,
+    base: IncrementalBase,
+    offsets: Dict[int, int],
+    generations: Dict[int, int],
+    size: int,
+    ids: ArrayObject,
+) -> None:
+    xref_offset = start + out.tell()
+    out.write(b"xref\n")
+    for first, count in _runs(sorted(offsets)):
+        out.write(f"{first} {count}\n".encode())
+        for number in range(first, first + count):
+            out.write(f"{offsets[number]:010d} {generations.get(number, 0):05d} n \n".encode())
+    trailer = DictionaryObject()
+    trailer[NameObject("/Size")] = NumberObject(size)
+    trailer[NameObject("/Root")] = base.root
+    if base.info is not None:
+        trailer[NameObject("/Info")] = base.info
+    trailer[NameObject("/ID")] = ids
+    trailer[NameObject("/Prev")] = NumberObject(base.startxref)
+    out.write(b"trailer\n")
+    trailer.write_to_stream(out, None)
+    out.write(f"\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+
+def _write_xref_stream(
+    out: BytesIO,
+    start: int,
+    base: IncrementalBase,
+    offsets: Dict[int, int],
+    generations: Dict[int, int],
+    xref_number: int,
+    ids: ArrayObject,
+) -> None:
+    xref_offset = start + out.tell()
+    offsets = dict(offsets)
+    offsets[xref_number] = xref_offset
+    numbers = sorted(offsets)
+    rows = [
+        b"\x01" + offsets[number].to_bytes(4, "big") + generations.get(number, 0).to_bytes(2, "big")
+        for number in numbers
+    ]
+    index = ArrayObject()
+    for first, count in _runs(numbers):
+        index.extend([NumberObject(first), NumberObject(count)])
+    xref = _stream(
+        b"".join(rows),
+        Type=NameObject("/XRef"),
+        Size=NumberObject(xref_number + 1),
+        Index=index,
+        W=ArrayObject([NumberObject(1), NumberObject(4), NumberObject(2)]),
+        Prev=NumberObject(base.startxref),
+        Root=base.root,
+        ID=ids,
+    )
+    if base.info is not None:
+        xref[NameObject("/Info")] = base.info
+    out.write(f"{xref_number} 0 obj\n".encode())
+    xref.write_to_stream(out, None)
+    out.write(f"\nendobj\nstartxref\n{xref_offset}\n%%EOF\n".encode())
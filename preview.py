@@ -0,0 +1,110 @@
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from PIL import Image, ImageDraw, ImageFont
+
+from layout import CAPTION_FONT_SIZE, CAPTION_LINE_HEIGHT, CaptionPlacement, LayoutPlan
+
+
+def rasterize_pdf(data: bytes, scale: float) -> Optional[Image.Image]:
+    """Render the first page of a PDF at `scale` pixels per point, if possible."""
+    try:  # Optional, and slow to import: without it previews have a plain white background.
+        import pypdfium2
+    except ImportError:  # pragma: no cover - depends on the environment
+        return None
+    document = pypdfium2.PdfDocument(data)
+    try:
+        bitmap = document[0].render(scale=scale)
+        return bitmap.to_pil().convert("RGB")
+    finally:
+        document.close()
+
+
+def _font(size_px: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", size_px)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_svg(
+    plan: LayoutPlan,
+    scale: float,
+    icon_href: Callable[[Path], str],
+    background_href: Optional[str] = None,
+) -> str:
+    """Draw a plan as SVG; images are referenced by URL, not embedded."""
+    width = plan.page_width * scale
+    height = plan.page_height * scale
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+        f'viewBox="0 0 {plan.page_width:g} {plan.page_height:g}">',
+    ]
+    if background_href:
+        parts.append(
+            f'<image href={quoteattr(background_href)} x="0" y="0" '
+            f'width="{plan.page_width:g}" height="{plan.page_height:g}"/>'
+        )
+    else:
+        parts.append(f'<rect width="{plan.page_width:g}" height="{plan.page_height:g}" fill="#fff"/>')
+    for item in plan.items:
+        if isinstance(item, CaptionPlacement):
+            parts.append(
+                f'<text x="{item.x:.1f}" text-anchor="middle" font-family="Helvetica, Arial, sans-serif" '
+                f'font-weight="bold" font-size="{CAPTION_FONT_SIZE:g}">'
+            )
+            for index, line in enumerate(item.lines):
+                y = plan.page_height - (item.y - index * CAPTION_LINE_HEIGHT)
+                parts.append(f'<tspan x="{item.x:.1f}" y="{y:.1f}">{escape(line)}</tspan>')
+            parts.append("</text>")
+        else:
+            # PDF y grows upwards from the bottom edge, SVG y downwards from the top.
+            y = plan.page_height - item.y - item.height
+            parts.append(
+                f'<image href={quoteattr(icon_href(item.path))} x="{item.x:.1f}" y="{y:.1f}" '
+                f'width="{item.width:.1f}" height="{item.height:.1f}"/>'
+            )
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def fit_icon(image: Image.Image, box: Tuple[int, int]) -> Image.Image:
+    icon = image.convert("RGBA")
+    icon.thumbnail(box, Image.BILINEAR)
+    return icon
+
+
+def render_png(
+    plan: LayoutPlan,
+    scale: float,
+    icon_image: Callable[[Path, Tuple[int, int]], Image.Image],
+    background: Optional[Image.Image] = None,
+) -> bytes:
+    """Draw a plan as a low-resolution PNG over an optional pre-rasterized page.
+
+    `icon_image(path, box)` returns the RGBA icon already fitted into `box` pixels.
+    """
+    size = (round(plan.page_width * scale), round(plan.page_height * scale))
+    if background is not None and background.size == size:
+        canvas = background.copy()
+    else:
+        canvas = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(canvas)
+    font = _font(max(6, round(CAPTION_FONT_SIZE * scale)))
+    for item in plan.items:
+        if isinstance(item, CaptionPlacement):
+            for index, line in enumerate(item.lines):
+                baseline = (plan.page_height - item.y + index * CAPTION_LINE_HEIGHT) * scale
+                left = item.x * scale - draw.textlength(line, font=font) / 2
+                draw.text((left, baseline - CAPTION_FONT_SIZE * scale * 0.8), line, fill="black", font=font)
+        else:
+            box = (max(1, round(item.width * scale)), max(1, round(item.height * scale)))
+            icon = icon_image(item.path, box)
+            left = round(item.x * scale + (box[0] - icon.width) / 2)
+            top = round((plan.page_height - item.y - item.height) * scale + (box[1] - icon.height) / 2)
+            canvas.paste(icon, (left, top), icon)
+    out = BytesIO()
+    canvas.save(out, format="PNG", optimize=False, compress_level=1)
+    return out.getvalue()
@@ -0,0 +1,133 @@
+import cProfile
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# <UTC time>-<reason>-<pid>-<sequence>; anything else is not a profile name.
+_NAME = re.compile(r"^\d{8}T\d{6}Z-[a-z]+-\d+-\d+$")
+
+
+class ProfileStore:
+    """cProfile dumps of single renders, keeping only the newest `keep`.
+
+    Each profile is a `<name>.prof` file in the format `pstats` and tools like
+    snakeviz read, next to `<name>.json` with what was rendered and why.
+    """
+
+    def __init__(self, directory: Path, keep: int = 50) -> None:
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def save(self, profile: cProfile.Profile, reason: str, info: Dict[str, object]) -> str:
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        created = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(created))
+        name = f"{stamp}-{reason}-{os.getpid()}-{sequence}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        profile.dump_stats(tmp_name)
+        os.replace(tmp_name, self.directory / f"{name}.prof")
+        meta = {"name": name, "created": created, "reason": reason, **info}
+        self._write_json(self.directory / f"{name}.json", meta)
+        self._rotate()
+        return name
+
+    def list(self) -> List[Dict[str, object]]:
+        """Metadata of the stored profiles, newest first."""
+        profiles = []
+        for path in self.directory.glob("*.json"):
+            try:
+                meta = json.loads(path.read_text())
+                meta["bytes"] = (path.with_suffix(".prof")).stat().st_size
+            except (FileNotFoundError, ValueError):
+                continue  # rotated away or still being written
+            profiles.append(meta)
+        profiles.sort(key=lambda meta: meta["created"], reverse=True)
+        return profiles
+
+    def path(self, name: str) -> Optional[Path]:
+        """The .prof file of a stored profile, or None for unknown names."""
+        if not _NAME.match(name):
+            return None
+        path = self.directory / f"{name}.prof"
+        return path if path.exists() else None
+
+    def _rotate(self) -> None:
+        stored = sorted(self.directory.glob("*.prof"), key=lambda path: path.stat().st_mtime)
+        for path in stored[: max(0, len(stored) - self.keep)]:
+            for stale in (path, path.with_suffix(".json")):
+                try:
+                    stale.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _write_json(self, path: Path, data: Dict[str, object]) -> None:
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as handle:
+            json.dump(data, handle, indent=2)
+        os.replace(tmp_name, path)
+
+
+class Profiler:
+    """Decide when to profile a render and run it under cProfile.
+
+    Renders are profiled on request, or automatically when one took longer
+    than `slow_seconds` (at most once per `min_interval` seconds per
+    process). Only one profile runs at a time. When neither is configured
+    the only cost per request is the `due` check.
+    """
+
+    def __init__(
+        self, store: ProfileStore, slow_seconds: Optional[float], min_interval: float = 60.0
+    ) -> None:
+        self.store = store
+        self.slow_seconds = slow_seconds
+        self.min_interval = min_interval
+        self._running = threading.Lock()
+        self._last_automatic = float("-inf")
+
+    def due(self, elapsed: float) -> bool:
+        """Whether a request that took `elapsed` seconds should be profiled again."""
+        if self.slow_seconds is None or elapsed < self.slow_seconds:
+            return False
+        now = time.monotonic()
+        if now - self._last_automatic < self.min_interval:
+            return False
+        self._last_automatic = now
+        return True
+
+    def run(
+        self,
+        reason: str,
+        info: Dict[str, object],
+        func: Callable[..., T],
+        *args: object,
+        wait: bool = True,
+    ) -> Tuple[Optional[T], Optional[str]]:
+        """Call `func(*args)` under the profiler and store the result.
+
+        Returns func's result and the profile name, or (None, None) when
+        `wait` is false and another profile is already running.
+        """
+        if not self._running.acquire(blocking=wait):
+            return None, None
+        try:
+            profile = cProfile.Profile()
+            started = time.perf_counter()
+            result = profile.runcall(func, *args)
+            info = {**info, "profiled_ms": (time.perf_counter() - started) * 1000}
+            return result, self.store.save(profile, reason, info)
+        finally:
+            self._running.release()
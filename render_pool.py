@@ -0,0 +1,195 @@
+import atexit
+import importlib
+import multiprocessing
+import queue
+import threading
+from typing import Any, Callable, List, Optional
+
+
+class PoolBusy(Exception):
+    """All workers are busy and the wait queue is full."""
+
+
+class RenderTimeout(Exception):
+    """A job ran longer than the pool's per-job timeout."""
+
+
+class WorkerCrashed(Exception):
+    """The worker process died while running a job."""
+
+
+def _resolve(target: str) -> Callable:
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _worker_main(conn, target: str, initializer: Optional[str]) -> None:
+    func = _resolve(target)
+    if initializer:
+        _resolve(initializer)()
+    conn.send(("ready", None))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        try:
+            result = func(*job)
+        except Exception as exc:  # pylint: disable=broad-except
+            try:
+                conn.send(("error", exc))
+            except Exception:  # pylint: disable=broad-except
+                conn.send(("error", RuntimeError(repr(exc))))
+        else:
+            conn.send(("ok", result))
+
+
+class _Worker:
+    def __init__(self, ctx, target: str, initializer: Optional[str]) -> None:
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, target, initializer),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: float) -> None:
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise RenderTimeout("Worker did not start in time")
+        self.conn.recv()
+        self.ready = True
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class RenderPool:
+    """A fixed set of warm worker processes that run `target(*args)` jobs.
+
+    `target` and `initializer` are "module:function" strings, imported once by
+    every worker when it starts. At most `max_queue` callers wait for a free
+    worker; beyond that `run()` raises PoolBusy at once, as it does for a
+    caller that waited `timeout` seconds without getting one. A job that
+    exceeds `timeout` seconds has its worker killed, and dead workers are
+    replaced.
+    """
+
+    def __init__(
+        self,
+        target: str,
+        size: int,
+        max_queue: int,
+        timeout: float,
+        initializer: Optional[str] = None,
+        start_method: str = "spawn",
+    ) -> None:
+        self.target = target
+        self.size = size
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.initializer = initializer
+        self._ctx = multiprocessing.get_context(start_method)
+        self._slots = threading.BoundedSemaphore(size + max_queue)
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._started = False
+        self.restarts = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                worker = _Worker(self._ctx, self.target, self.initializer)
+                self._workers.append(worker)
+                self._idle.put(worker)
+            self._started = True
+        atexit.register(self.close)
+
+    def run(self, *args: Any) -> Any:
+        if not self._started:
+            self.start()
+        if not self._slots.acquire(blocking=False):
+            self._count_rejected()
+            raise PoolBusy("All render workers are busy")
+        try:
+            try:
+                worker = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                self._count_rejected()
+                raise PoolBusy(f"No render worker was free within {self.timeout:g} s") from None
+            if not worker.process.is_alive():
+                worker = self._replace(worker)
+            try:
+                result = self._run_on(worker, args)
+            except (RenderTimeout, WorkerCrashed):
+                worker = self._replace(worker)
+                raise
+            finally:
+                self._idle.put(worker)
+        finally:
+            self._slots.release()
+        return result
+
+    def _run_on(self, worker: _Worker, args: tuple) -> Any:
+        try:
+            worker.wait_ready(self.timeout)
+            worker.conn.send(args)
+            if not worker.conn.poll(self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise RenderTimeout(f"Render exceeded {self.timeout:g} s")
+            status, payload = worker.conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError) as exc:
+            raise WorkerCrashed("Render worker exited unexpectedly") from exc
+        if status == "error":
+            raise payload
+        return payload
+
+    def _count_rejected(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.stop(kill=True)
+        fresh = _Worker(self._ctx, self.target, self.initializer)
+        with self._lock:
+            self._workers = [w for w in self._workers if w is not worker] + [fresh]
+            self.restarts += 1
+        return fresh
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.size if self._started else 0,
+                "max_queue": self.max_queue,
+                "idle": self._idle.qsize(),
+                "restarts": self.restarts,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._started = False
+        for worker in workers:
+            worker.stop()
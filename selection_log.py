@@ -0,0 +1,115 @@
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class SelectionLog:
+    """Append-only log of the selections /generate served.
+
+    Each line is `<unix time> <canonical query>`, e.g.
+    `1760781182 hazards_order=electrical&risk=minimal`. Requests only put the
+    line on a queue; a daemon thread in each process appends them in batches
+    with O_APPEND writes, so worker processes can share one file and the file
+    can be truncated or rotated at any time. When the writer falls more than
+    `max_pending` lines behind, further lines are dropped and counted.
+    """
+
+    def __init__(self, path: Path, max_pending: int = 10000) -> None:
+        self.path = path
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue[str]" = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._writer_pid: Optional[int] = None
+
+    def record(self, query: str) -> None:
+        # A worker forked from a preloaded master inherits no threads: start one per process.
+        if self._writer_pid != os.getpid():
+            self._start_writer()
+        try:
+            self._queue.put_nowait(f"{int(time.time())} {query}\n")
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait until the queued lines are written (for commands and tests)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stats(self) -> Dict[str, int]:
+        return {"written": self.written, "pending": self._queue.qsize(), "dropped": self.dropped}
+
+    def _start_writer(self) -> None:
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            if self._writer_pid is not None:
+                # The queue may hold the parent's lines and a lock held at fork time.
+                self._queue = queue.Queue(self._queue.maxsize)
+            self._writer_pid = os.getpid()
+            threading.Thread(target=self._write_loop, args=(self._queue,), daemon=True).start()
+
+    def _write_loop(self, pending: "queue.Queue[str]") -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        while True:
+            lines = [pending.get()]
+            while len(lines) < 512:
+                try:
+                    lines.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                os.write(fd, "".join(lines).encode("utf-8"))
+                self.written += len(lines)
+            except OSError:
+                self.dropped += len(lines)
+            for _ in lines:
+                pending.task_done()
+
+
+def read_log(path: Path) -> Iterator[Tuple[float, str]]:
+    """(time, query) of every well-formed line; a line cut short by a crash is skipped."""
+    with path.open("r", encoding="utf-8", errors="replace") as handle:
+        for line in handle:
+            stamp, _, query = line.rstrip("\n").partition(" ")
+            if not query or not line.endswith("\n"):
+                continue
+            try:
+                yield float(stamp), query
+            except ValueError:
+                continue
+
+
+class RankedSelection(NamedTuple):
+    query: str
+    count: int
+    last_seen: float
+    score: float
+
+
+def rank_selections(
+    entries: Iterable[Tuple[float, str]], half_life: float, now: Optional[float] = None
+) -> List[RankedSelection]:
+    """Rank queries by frequency weighted by recency, most wanted first.
+
+    Every request counts 1 when it is new and half as much every
+    `half_life` seconds after that, so last term's favourites fade out.
+    """
+    now = time.time() if now is None else now
+    counts: Dict[str, int] = {}
+    last_seen: Dict[str, float] = {}
+    scores: Dict[str, float] = {}
+    for stamp, query in entries:
+        counts[query] = counts.get(query, 0) + 1
+        last_seen[query] = max(last_seen.get(query, stamp), stamp)
+        scores[query] = scores.get(query, 0.0) + 0.5 ** (max(0.0, now - stamp) / half_life)
+    ranked = [
+        RankedSelection(query, counts[query], last_seen[query], scores[query]) for query in scores
+    ]
+    ranked.sort(key=lambda entry: (-entry.score, -entry.last_seen, entry.query))
+    return ranked
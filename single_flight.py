@@ -0,0 +1,79 @@
+import threading
+from types import TracebackType
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class WaitTimeout(Exception):
+    """A caller gave up waiting for an identical call already in progress."""
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.traceback: Optional[TracebackType] = None
+
+
+class SingleFlight:
+    """Run `func` once per key among concurrent callers and share the outcome.
+
+    The first caller for a key runs it; callers arriving while it runs wait
+    up to `timeout` seconds and receive the same result, or the same
+    exception. Nothing is remembered once the call has finished.
+    """
+
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+        self.shared_errors = 0
+        self.timeouts = 0
+
+    def run(self, key: str, func: Callable[[], T]) -> Tuple[T, bool]:
+        """Return func()'s result and whether it came from another caller's call."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+        if leader:
+            try:
+                call.result = func()
+            except BaseException as exc:
+                call.error = exc
+                call.traceback = exc.__traceback__
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result, False
+
+        if not call.done.wait(self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise WaitTimeout(f"Identical render still running after {self.timeout:g} s")
+        if call.error is not None:
+            with self._lock:
+                self.shared_errors += 1
+            # Start from the leader's traceback so waiters' frames don't pile up on it.
+            raise call.error.with_traceback(call.traceback)
+        with self._lock:
+            self.shared += 1
+        return call.result, True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "calls": self.calls,
+                "shared": self.shared,
+                "shared_errors": self.shared_errors,
+                "timeouts": self.timeouts,
+            }
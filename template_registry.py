@@ -0,0 +1,121 @@
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, Optional, Tuple
+
+from pdf_cache import read_file
+
+if TYPE_CHECKING:
+    from pdf_incremental import IncrementalBase
+
+
+class TemplateEntry:
+    """One parsed risk template: the file's bytes, reader and its first page."""
+
+    def __init__(self, key: str, path: Path, data: Optional[bytes] = None) -> None:
+        # PyPDF2 is imported on first use to keep it out of process start-up.
+        from PyPDF2 import PdfReader
+
+        # `data` is a PDF made from the file (e.g. a converted SVG), else the file itself.
+        if data is None:
+            data, stat = read_file(path)
+        else:
+            stat = path.stat()
+        self.key = key
+        self.path = path
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.data = data
+        self.reader = PdfReader(BytesIO(data))
+        if not self.reader.pages:
+            raise ValueError(f"Template PDF has no pages: {path}")
+        self.page = self.reader.pages[0]
+        self.width = float(self.page.mediabox.width)
+        self.height = float(self.page.mediabox.height)
+        # Resolve every object reachable from the page now, so later copies are
+        # served from the reader's object cache and never seek in the stream
+        # (the stream is not safe to share between threads).
+        _resolve_all(self.page, set())
+        self._incremental: Optional["IncrementalBase"] = None
+        # Derived by optimized output and dropped with the entry: streams
+        # recompressed by object number (0 for the page content) and the
+        # resource names the page content uses.
+        self.recompressed: Dict[int, Tuple[Optional[str], bytes]] = {}
+        self.content_names: Optional[FrozenSet[str]] = None
+
+    @property
+    def incremental(self) -> "IncrementalBase":
+        """Offsets and page data needed to append overlays to the raw bytes."""
+        if self._incremental is None:
+            from pdf_incremental import IncrementalBase
+
+            self._incremental = IncrementalBase(self.data, self.page, self.reader.trailer)
+        return self._incremental
+
+    @property
+    def version(self) -> str:
+        return f"{self.mtime_ns}-{self.size}"
+
+
+def _resolve_all(obj, seen: set) -> None:
+    from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject
+
+    if isinstance(obj, IndirectObject):
+        marker = (obj.idnum, obj.generation)
+        if marker in seen:
+            return
+        seen.add(marker)
+        obj = obj.get_object()
+    if isinstance(obj, DictionaryObject):
+        for value in obj.values():
+            _resolve_all(value, seen)
+    elif isinstance(obj, ArrayObject):
+        for value in obj:
+            _resolve_all(value, seen)
+
+
+class TemplateRegistry:
+    """Parse each risk template once and share the entry between requests.
+
+    Sheets only read the parsed page and the objects it references, which
+    are resolved up front, so concurrent requests can use one entry.
+    """
+
+    def __init__(self, paths: Dict[str, Path]) -> None:
+        self._paths = dict(paths)
+        self._entries: Dict[str, TemplateEntry] = {}
+        self._lock = threading.Lock()
+
+    def keys(self) -> List[str]:
+        return list(self._paths)
+
+    def entry(self, key: str) -> TemplateEntry:
+        if key not in self._paths:
+            raise ValueError(f"Unsupported risk type: {key}")
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._load(key)
+        return entry
+
+    def load_all(self) -> None:
+        for key in self._paths:
+            self.entry(key)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Forget parsed templates; the next `entry` reads the file again."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _load(self, key: str) -> TemplateEntry:
+        path = self._paths[key]
+        if not path.exists():
+            raise FileNotFoundError(f"Template PDF not found at: {path}")
+        entry = TemplateEntry(key, path)
+        self._entries[key] = entry
+        return entry
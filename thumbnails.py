@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable
+
+from PIL import Image
+
+from pdf_cache import file_version
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _thumbnail_png(source: Path, size: int) -> bytes:
+    with Image.open(source) as img:
+        img = img.convert("RGBA")
+        img.thumbnail((size, size), Image.LANCZOS)
+        # Few colours are left at this size, so a palette PNG is much smaller.
+        img = img.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        out = BytesIO()
+        img.save(out, format="PNG", optimize=True)
+        return out.getvalue()
+
+
+def load_manifest(out_dir: Path) -> Dict[str, dict]:
+    try:
+        return json.loads((out_dir / MANIFEST_NAME).read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def build_thumbnails(
+    sources: Iterable[Path], static_dir: Path, out_dir: Path, size: int = 48
+) -> Dict[str, dict]:
+    """Write content-hashed thumbnails for `sources` and return the manifest.
+
+    Manifest keys are source paths relative to `static_dir`; values hold the
+    thumbnail path (also relative to `static_dir`) and the source version it
+    was built from, so stale entries can be detected without re-reading images.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    previous = load_manifest(out_dir)
+    manifest: Dict[str, dict] = {}
+    for source in sorted(set(sources)):
+        rel = source.relative_to(static_dir).as_posix()
+        version = file_version(source)
+        entry = previous.get(rel)
+        if entry and entry["source_version"] == version and (static_dir / entry["thumb"]).exists():
+            manifest[rel] = entry
+            continue
+        data = _thumbnail_png(source, size)
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        thumb = out_dir / f"{source.stem}.{digest}.png"
+        thumb.write_bytes(data)
+        manifest[rel] = {
+            "thumb": thumb.relative_to(static_dir).as_posix(),
+            "source_version": version,
+            "bytes": len(data),
+        }
+    used = {entry["thumb"] for entry in manifest.values()}
+    for stale in out_dir.glob("*.png"):
+        if stale.relative_to(static_dir).as_posix() not in used:
+            stale.unlink()
+    fd, tmp_name = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    with os.fdopen(fd, "w") as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(tmp_name, out_dir / MANIFEST_NAME)
+    return manifest
+
+
+def is_fresh(manifest: Dict[str, dict], sources: Iterable[Path], static_dir: Path) -> bool:
+    for source in sources:
+        entry = manifest.get(source.relative_to(static_dir).as_posix())
+        if entry is None or entry["source_version"] != file_version(source):
+            return False
+    return True
@@ -0,0 +1,80 @@
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from template_registry import TemplateEntry
+
+# Vector sources looked for next to a pictogram's PNG, in order of preference.
+VECTOR_SUFFIXES = (".pdf", ".svg")
+
+
+def vector_source(icon_path: Path) -> Optional[Path]:
+    """The vector version of a raster pictogram (same name, .pdf or .svg), if there is one."""
+    for suffix in VECTOR_SUFFIXES:
+        candidate = icon_path.with_suffix(suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def svg_to_pdf(path: Path) -> bytes:
+    """Convert an SVG file to a one-page PDF with svglib (an optional dependency)."""
+    try:
+        from svglib.svglib import svg2rlg
+    except ImportError as exc:
+        raise RuntimeError(f"SVG icons need svglib (pip install svglib): {path}") from exc
+    from reportlab.graphics import renderPDF
+
+    drawing = svg2rlg(str(path))
+    if drawing is None:
+        raise ValueError(f"Could not read SVG icon: {path}")
+    return renderPDF.drawToString(drawing)
+
+
+class VectorIcon(TemplateEntry):
+    """A pictogram from a single-page PDF, or an SVG converted to one.
+
+    It is embedded like a risk template: its page becomes one form XObject
+    per document, placed at any size by the page content, so nothing is
+    decoded or resampled to draw it.
+    """
+
+    def __init__(self, path: Path) -> None:
+        data = svg_to_pdf(path) if path.suffix.lower() == ".svg" else None
+        super().__init__(str(path), path, data)
+        box = self.page.mediabox
+        self.origin: Tuple[float, float] = (float(box.left), float(box.bottom))
+
+
+class VectorIconCache:
+    """Parsed vector pictograms by path, reloaded when their file changes."""
+
+    def __init__(self) -> None:
+        self._icons: Dict[str, VectorIcon] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, path: Path) -> VectorIcon:
+        stat = path.stat()
+        icon = self._icons.get(str(path))
+        if icon is None or (icon.mtime_ns, icon.size) != (stat.st_mtime_ns, stat.st_size):
+            with self._lock:
+                icon = self._icons.get(str(path))
+                if icon is None or (icon.mtime_ns, icon.size) != (stat.st_mtime_ns, stat.st_size):
+                    icon = self._icons[str(path)] = VectorIcon(path)
+                    self.loads += 1
+        return icon
+
+    def invalidate(self, path: Optional[Path] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._icons.clear()
+            else:
+                self._icons.pop(str(path), None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "icons": len(self._icons),
+            "bytes": sum(len(icon.data) for icon in list(self._icons.values())),
+            "loads": self.loads,
+        }